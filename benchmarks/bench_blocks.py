@@ -0,0 +1,45 @@
+""" Block grid sizing: the default cube-root heuristic against blocks="auto"
+
+Usage: python benchmarks/bench_blocks.py [N]
+"""
+import sys, time
+import numpy as np
+from tess import Container
+from common import box_side
+
+def uniform(rng, N, L):
+    return rng.random((N, 3)) * L
+
+def clustered(rng, N, L, n_clusters=20):
+    centers = rng.random((n_clusters, 3)) * L
+    points = centers[rng.integers(n_clusters, size=N)] + rng.normal(scale=L / 40, size=(N, 3))
+    return points % L
+
+def slab(rng, N, L):
+    # anisotropic: all the particles within a tenth of the box along z
+    points = rng.random((N, 3)) * L
+    points[:, 2] *= 0.1
+    return points
+
+def bench(points, L, blocks, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cont = Container(points, limits=L, periodic=True, blocks=blocks, cells=False)
+        cont.arrays(fields=("volume",))
+        times.append(time.perf_counter() - t0)
+    return min(times), cont
+
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    L = box_side(N)
+    rng = np.random.default_rng(0)
+
+    print(f"N={N}")
+    print(f"{'input':>10} {'blocks':>8} {'grid':>16} {'init_mem':>8} {'time [s]':>10}")
+    for name, make in (("uniform", uniform), ("clustered", clustered), ("slab", slab)):
+        points = make(rng, N, L)
+        for blocks in (None, "auto"):
+            t, cont = bench(points, L, blocks)
+            grid = "x".join(map(str, cont.blocks))
+            print(f"{name:>10} {str(blocks):>8} {grid:>16} {cont.init_mem:>8} {t:>10.3f}")
@@ -0,0 +1,38 @@
+""" Cell memory: the list of cells as allocated by voro++ against compacted cells
+
+The resident memory is measured around the creation of the container. The cells keep the initial
+voro++ allocation (hundreds of KB each), so the full ones are only built for the first
+`FULL_MAX` points and reported per cell.
+
+Usage: python benchmarks/bench_compact.py [N]
+"""
+import os, sys, time, gc
+from tess import Container
+from common import uniform_points
+
+FULL_MAX = 5000
+
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def bench(points, L, compact):
+    gc.collect()
+    m0 = rss()
+    t0 = time.perf_counter()
+    cont = Container(points, limits=L, compact=compact)
+    t = time.perf_counter() - t0
+    m = rss() - m0
+    del cont
+    return t, m
+
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    points, L = uniform_points(N)
+
+    print(f"{'cells':>10} {'mode':>10} {'time [s]':>10} {'bytes/cell':>12}")
+    for n, compact in ((min(N, FULL_MAX), False), (N, True)):
+        # a box with the same density as the full run
+        l = L * (n / N) ** (1 / 3)
+        t, m = bench(points[:n] * (l / L), l, compact)
+        print(f"{n:>10} {'compact' if compact else 'full':>10} {t:>10.3f} {m / n:>12.0f}")
@@ -0,0 +1,42 @@
+""" File import: loading the points in Python against Container.from_file
+
+Usage: python benchmarks/bench_import.py [N]
+"""
+import os, sys, time, tempfile, tracemalloc
+import numpy as np
+from tess import Container
+from common import uniform_points
+
+def bench(load):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    cont = load()
+    t = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return t, peak, cont
+
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    points, L = uniform_points(N)
+    data = np.c_[np.arange(N), points]
+    del points
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text, npy = os.path.join(tmp, "points.dat"), os.path.join(tmp, "points.npy")
+        np.savetxt(text, data, fmt=["%d", "%.10g", "%.10g", "%.10g"])
+        np.save(npy, data[:, 1:])
+        del data
+
+        runs = (
+            ("text", "loadtxt", lambda: Container(np.loadtxt(text)[:, 1:], limits=L, cells=False)),
+            ("text", "from_file", lambda: Container.from_file(text, limits=L, cells=False)),
+            ("npy", "load", lambda: Container(np.load(npy), limits=L, cells=False)),
+            ("npy", "from_file", lambda: Container.from_file(npy, limits=L, format="npy", cells=False)),
+        )
+        print(f"N={N}")
+        print(f"{'format':>8} {'loader':>10} {'time [s]':>10} {'peak [MB]':>10}")
+        for fmt, name, load in runs:
+            t, peak, cont = bench(load)
+            assert len(cont.source_idx) == N
+            print(f"{fmt:>8} {name:>10} {t:>10.3f} {peak / 2**20:>10.1f}")
@@ -0,0 +1,51 @@
+""" Mono and poly containers: the single-threaded paths of the compute core for equal and variable radii
+
+Each operation runs on the underlying voro++ container of a filled tess.Container, the best of a few
+repeats is reported, so the two radius modes can be compared against each other and across versions.
+
+The full cells keep the initial voro++ allocation (hundreds of KB each), so keep N in the thousands.
+
+Usage: python benchmarks/bench_poly.py [N]
+"""
+import sys, time
+import numpy as np
+from tess import Container
+from common import uniform_points
+
+def best(f, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+def put_array(cont, points, radii):
+    # an empty container with the same parameters
+    box = [v for lims in zip(cont.min, cont.max) for v in lims]
+    con = type(cont._container)(*box, *cont.blocks, *cont.periodic, cont.init_mem)
+    if radii is None: con.put_array(points)
+    else: con.put_array(points, radii)
+
+def bench(points, L, radii):
+    cont = Container(points, limits=L, radii=radii, cells=False)
+    con = cont._container
+    return {
+        "put_array": best(lambda: put_array(cont, points, radii)),
+        "get_cells": best(lambda: con.get_cells()),
+        "compact": best(lambda: con.get_cells(1, True)),
+        "get_arrays": best(lambda: con.get_arrays()),
+        "iter_arrays": best(lambda: list(con.iter_arrays())),
+    }
+
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = np.random.default_rng(0)
+    points, L = uniform_points(N, rng)
+    radii = rng.random(N) * 3
+
+    mono, poly = bench(points, L, None), bench(points, L, radii)
+    print(f"N={N}")
+    print(f"{'operation':>12} {'mono [s]':>10} {'poly [s]':>10}")
+    for op in mono:
+        print(f"{op:>12} {mono[op]:>10.3f} {poly[op]:>10.3f}")
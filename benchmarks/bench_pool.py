@@ -0,0 +1,35 @@
+""" Cell allocation: the time per cell of full cells against compacted cells taken from the pool
+
+The time of computing every cell into a single reused cell (get_arrays of a single field) is
+subtracted, so only the allocation and the copy into the list of cells are compared. The full cells
+keep the initial voro++ allocation (hundreds of KB each), so keep N in the thousands.
+
+Usage: python benchmarks/bench_pool.py [N]
+"""
+import sys, time
+from tess import Container, cell_pool
+from common import uniform_points
+
+def per_cell(f, N, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - t0)
+    return best / N
+
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    points, L = uniform_points(N)
+    con = Container(points, limits=L, cells=False)._container
+    previous = cell_pool(2 * N)
+
+    compute = per_cell(lambda: con.get_arrays(("volume",)), N)
+    full = per_cell(lambda: con.get_cells(1, False), N) - compute
+    pooled = per_cell(lambda: con.get_cells(1, True), N) - compute
+    cell_pool(previous[1])
+
+    print(f"N={N}")
+    print(f"{'cells':>8} {'allocation per cell [us]':>26}")
+    print(f"{'full':>8} {full * 1e6:>26.1f}")
+    print(f"{'pooled':>8} {pooled * 1e6:>26.1f}")
@@ -0,0 +1,38 @@
+""" Scaling of the multi-threaded cell computation (Container threads option)
+
+Usage: python benchmarks/bench_threads.py [N] [max_threads]
+"""
+import os, sys, time
+import numpy as np
+from tess import Container
+from common import uniform_points
+
+def bench(N, threads, radii=False, repeat=3):
+    rng = np.random.default_rng(0)
+    points, L = uniform_points(N, rng)
+    r = rng.random(N) * 3 if radii else None
+    cont = Container(points, limits=L, periodic=True, radii=r, cells=False)
+
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cont.arrays(threads=threads)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+if __name__ == "__main__":
+    N = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    print(f"N={N} cpus={os.cpu_count()}")
+    print(f"{'threads':>8} {'mono [s]':>10} {'speedup':>8} {'poly [s]':>10} {'speedup':>8}")
+    t1 = {}
+    threads = 1
+    while threads <= max_threads:
+        row = []
+        for radii in (False, True):
+            t = bench(N, threads, radii)
+            t1.setdefault(radii, t)
+            row += [t, t1[radii] / t]
+        print(f"{threads:>8} {row[0]:>10.3f} {row[1]:>8.2f} {row[2]:>10.3f} {row[3]:>8.2f}")
+        threads *= 2
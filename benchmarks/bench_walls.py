@@ -0,0 +1,48 @@
+""" Curved boundaries: a native voro++ curved wall against its approximation by many tangent planes
+
+Runs on the packings of examples/walls: pack_cylinder inside a cylinder of radius 6, and pack_torus
+inside the convex hull of its torus (a cylinder of radius 12.5 capped by two planes), since the
+walls only support convex domains.
+
+Usage: python benchmarks/bench_walls.py [K ...]
+"""
+import os, sys, time
+import numpy as np
+from tess import Container
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, "examples", "walls")
+
+def load(name):
+    return np.loadtxt(os.path.join(EXAMPLES, name))[:, 1:]
+
+def tangent_planes(r, K):
+    # planes around the z axis, tangent to the cylinder of radius r
+    a = np.linspace(0, 2 * np.pi, K, endpoint=False)
+    return np.c_[np.cos(a), np.sin(a), np.zeros(K), np.full(K, r)]
+
+def bench(points, limits, walls, repeat=3):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        cont = Container(points, limits=limits, walls=walls, cells=False)
+        volumes = cont.arrays(fields=("volume",)).volume
+        times.append(time.perf_counter() - t0)
+    return min(times), volumes.sum()
+
+if __name__ == "__main__":
+    Ks = [int(k) for k in sys.argv[1:]] or [32, 128, 512]
+
+    # name, points, limits, radius, capping planes, exact volume of the domain
+    cases = (
+        ("cylinder", load("pack_cylinder"), ((-6.5, -6.5, 0), (6.5, 6.5, 18.5)), 6, [], np.pi * 6**2 * 18.5),
+        ("torus", load("pack_torus"), ((-13, -13, -4), (13, 13, 4)), 12.5,
+            [(0, 0, 1, 3.5), (0, 0, -1, 3.5)], np.pi * 12.5**2 * 7),
+    )
+
+    print(f"{'input':>10} {'walls':>16} {'time [s]':>10} {'volume err':>12}")
+    for name, points, limits, r, caps, volume in cases:
+        runs = [("native", {"plane": caps, "cylinder": [(0, 0, 0, 0, 0, 1, r)]})]
+        runs += [(f"{K} planes", np.r_[np.reshape(caps, (-1, 4)), tangent_planes(r, K)]) for K in Ks]
+        for label, walls in runs:
+            t, total = bench(points, limits, walls)
+            print(f"{name:>10} {label:>16} {t:>10.3f} {total / volume - 1:>12.2e}")
@@ -0,0 +1,18 @@
+""" Shared setup of the benchmarks: uniform random particles in a cubic box
+
+The box grows with the amount of particles so that their mean spacing stays at `SPACING`, far above
+the absolute voro++ tolerance (1e-2 in this fork), and the runs of any size compute comparable cells.
+"""
+import numpy as np
+
+SPACING = 10
+
+def box_side(N):
+    """ The side of the cubic box holding N particles at a mean spacing of `SPACING` """
+    return SPACING * N ** (1 / 3)
+
+def uniform_points(N, rng=None):
+    """ The (N,3) uniform random points in the box of :func:`box_side`, and its side """
+    rng = np.random.default_rng(0) if rng is None else rng
+    L = box_side(N)
+    return rng.random((N, 3)) * L, L
@@ -23,6 +23,7 @@ made with packings of spherical particles in mind, possibly with variable sizes.
 
 """
 import importlib, sys
+from glob import glob
 from setuptools import setup, Extension
 from setuptools.command.sdist import sdist
 
@@ -44,6 +45,8 @@ if sys.platform.startswith('win'):
 extension = Extension(
             "tess._voro",
             sources=["tess/_voro.pyx", "src/voro++.cc"],
+            # voro++.cc includes the rest of the voro++ sources
+            depends=["tess/_voro_helpers.hh"] + glob("src/*.cc") + glob("src/*.hh"),
             include_dirs=["src"],
             language="c++",
             extra_compile_args=comp_args,
@@ -89,7 +92,8 @@ setup(
     ext_modules=[extension],
     use_scm_version=True,
     setup_requires=["setuptools>=40.9.0", "wheel", "setuptools_scm"],
+    install_requires=["numpy"],
     extras_require={
-        'tests': ["numpy", "scipy", "sphinx", "sphinx_rtd_theme"],
+        'tests': ["scipy", "sphinx", "sphinx_rtd_theme"],
     },
 )
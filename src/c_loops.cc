@@ -62,10 +62,12 @@ void c_loop_subset::setup_common() {
 		if(ak<0) {ak=0;if(bk<0) bk=0;}
 		if(bk>=nz) {bk=nz-1;if(ak>=nz) ak=nz-1;}
 	}
-	ci=ai;cj=aj;ck=ak;
-	di=i=step_mod(ci,nx);apx=px=step_div(ci,nx)*sx;
-	dj=j=step_mod(cj,ny);apy=py=step_div(cj,ny)*sy;
-	dk=k=step_mod(ck,nz);apz=pz=step_div(ck,nz)*sz;
+	// (i,j,k) step over the unwrapped subgrid, while (ci,cj,ck) are the
+	// wrapped block indices, as next_block() expects
+	i=ai;j=aj;k=ak;
+	di=ci=step_mod(ai,nx);apx=px=step_div(ai,nx)*sx;
+	dj=cj=step_mod(aj,ny);apy=py=step_div(aj,ny)*sy;
+	dk=ck=step_mod(ak,nz);apz=pz=step_div(ak,nz)*sz;
 	inc1=di-step_mod(bi,nx);
 	inc2=nx*(ny+dj-step_mod(bj,ny))+inc1;
 	inc1+=nx;
@@ -25,8 +25,9 @@ voronoicell_base::voronoicell_base() :
 	mec(new int[current_vertex_order]), mep(new int*[current_vertex_order]),
 	ds(new int[current_delete_size]), stacke(ds+current_delete_size),
 	ds2(new int[current_delete2_size]), stacke2(ds2+current_delete_size),
-	current_marginal(init_marginal), marg(new int[current_marginal]) {
+	current_marginal(init_marginal), marg(new int[current_marginal]), compacted(false) {
 	int i;
+	p=up=0;
 	for(i=0;i<3;i++) {
 		mem[i]=init_n_vertices;mec[i]=0;
 		mep[i]=new int[init_n_vertices*((i<<1)+1)];
@@ -100,6 +101,164 @@ void voronoicell_neighbor::operator=(voronoicell_neighbor &c) {
 	}
 }
 
+/** Computes the memory of a compacted cell for the vertices of an order,
+ * keeping the minimum of the initial shapes (the cube, the tetrahedron and the
+ * octahedron), so that the cell can be initialized again.
+ * \param[in] i the vertex order.
+ * \param[in] n the number of vertices of that order.
+ * \return The number of vertices to allocate. */
+static inline int compact_order_memory(int i,int n) {
+	if(i==3) return n>8?n:8;
+	if(i==4) return n>6?n:6;
+	return n;
+}
+
+/** Resizes the tables indexed by vertex order to a given number of orders,
+ * freeing the vertex memory of the orders past it.
+ * \param[in] vc a reference to the specialized version of the calling class.
+ * \param[in] k the new number of vertex orders. */
+template<class vc_class>
+void voronoicell_base::resize_vorder(vc_class &vc,int k) {
+	int i,*p1=new int[k],*p3=new int[k],**p2=new int*[k];
+	for(i=k;i<current_vertex_order;i++) if(mem[i]>0) {
+		delete [] mep[i];
+		vc.n_delete(i);
+	}
+	for(i=0;i<k;i++) {
+		if(i<current_vertex_order) p1[i]=mem[i],p2[i]=mep[i],p3[i]=mec[i];
+		else p1[i]=p3[i]=0;
+	}
+	delete [] mem;mem=p1;
+	delete [] mep;mep=p2;
+	delete [] mec;mec=p3;
+	vc.n_resize_vorder(k);
+	current_vertex_order=k;
+}
+
+/** Reduces the delete stacks and the marginal buffer, which are only scratch
+ * memory of the plane cuts, to compact_stack_size. */
+void voronoicell_base::compact_stacks() {
+	if(current_delete_size>compact_stack_size) {
+		delete [] ds;ds=new int[compact_stack_size];
+		current_delete_size=compact_stack_size;
+		stacke=ds+current_delete_size;
+	}
+	if(current_delete2_size>compact_stack_size) {
+		delete [] ds2;ds2=new int[compact_stack_size];
+		current_delete2_size=compact_stack_size;
+		stacke2=ds2+current_delete2_size;
+	}
+	if(current_marginal>compact_stack_size) {
+		delete [] marg;marg=new int[compact_stack_size];
+		current_marginal=compact_stack_size;
+	}
+}
+
+/** Copies the information from another voronoicell_neighbor class into this
+ * class, with its memory fitted to the copy (see fit_memory_for_copy()). The
+ * starting vertex of the plane cuts is kept, so that later cuts proceed the
+ * same as in the original cell.
+ * \param[in] c the class to copy. */
+void voronoicell_neighbor::copy_compact(voronoicell_neighbor &c) {
+	voronoicell_base *vb=((voronoicell_base*) &c);
+	fit_memory_for_copy(*this,vb);copy(vb);up=vb->up;
+	int i,j;
+	for(i=0;i<current_vertex_order;i++) {
+		for(j=0;j<c.mec[i]*i;j++) mne[i][j]=c.mne[i][j];
+		for(j=0;j<c.mec[i];j++) ne[c.mep[i][(2*i+1)*j+2*i]]=mne[i]+(j*i);
+	}
+}
+
+/** Reallocates the memory of the cell to fit its current vertices and edges,
+ * instead of the initial allocation sized for large cells. The vertex orders
+ * are trimmed to the highest one in use (see compact_order_memory()), and the
+ * scratch stacks are reduced with compact_stacks(). Any later plane cut (or
+ * recomputation) grows the memory back as needed, without printing the memory
+ * messages. If the template has been instantiated with the neighbor tracking
+ * turned on, then the mne and ne arrays are reallocated as well.
+ * \param[in] vc a reference to the specialized version of the calling class. */
+template<class vc_class>
+void voronoicell_base::compact_base(vc_class &vc) {
+	int i,j,k,m,n,q,s,*l;
+	for(k=current_vertex_order;k>5&&mec[k-1]==0;k--);
+	if(k<current_vertex_order) resize_vorder(vc,k);
+	for(i=0;i<k;i++) {
+		m=compact_order_memory(i,mec[i]);
+		if(m==mem[i]) continue;
+		if(m==0) {
+			delete [] mep[i];
+			vc.n_delete(i);
+			mem[i]=0;
+			continue;
+		}
+		s=(i<<1)+1;
+		l=new int[s*m];
+		mem[i]=m;
+		vc.n_allocate_aux1(i);
+		for(j=0,n=0;j<s*mec[i];j+=s,n+=i) {
+			ed[mep[i][j+(i<<1)]]=l+j;
+			vc.n_set_to_aux1_offset(mep[i][j+(i<<1)],n);
+			for(q=0;q<s;q++) l[j+q]=mep[i][j+q];
+			for(q=0;q<i;q++) vc.n_copy_to_aux1(i,n+q);
+		}
+		delete [] mep[i];
+		mep[i]=l;
+		vc.n_switch_to_aux1(i);
+	}
+	m=p>8?p:8;
+	if(m<current_vertices) {
+		int **pp=new int*[m],*pnu=new int[m];
+		double *ppts=new double[3*m];
+		for(i=0;i<p;i++) pp[i]=ed[i],pnu[i]=nu[i];
+		for(i=0;i<3*p;i++) ppts[i]=pts[i];
+		delete [] ed;ed=pp;
+		delete [] nu;nu=pnu;
+		delete [] pts;pts=ppts;
+		vc.n_resize_vertices(m);
+		current_vertices=m;
+	}
+	compact_stacks();
+	compacted=true;
+}
+
+/** Reallocates the memory of the cell to fit the vertices and edges of
+ * another cell, prior to copying it, the same as compacting the copy
+ * afterwards. The current contents are discarded, and the memory that is
+ * already between the fitted size and twice that is kept, so that a cell
+ * reused for many copies rarely allocates. No memory messages are printed,
+ * neither here nor when the memory grows back on later plane cuts.
+ * \param[in] vc a reference to the specialized version of the calling class.
+ * \param[in] vb a pointer to the class to be copied. */
+template<class vc_class>
+void voronoicell_base::fit_memory_for_copy(vc_class &vc,voronoicell_base* vb) {
+	int i,k,m;
+	for(k=vb->current_vertex_order;k>5&&vb->mec[k-1]==0;k--);
+	if(k<current_vertex_order||current_vertex_order<k) resize_vorder(vc,k);
+	for(i=0;i<k;i++) {
+		m=compact_order_memory(i,vb->mec[i]);
+		if(mem[i]>=m&&mem[i]<=2*m) continue;
+		if(mem[i]>0) {
+			delete [] mep[i];
+			vc.n_delete(i);
+		}
+		mem[i]=m;
+		if(m>0) {
+			mep[i]=new int[((i<<1)+1)*m];
+			vc.n_allocate(i,m);
+		}
+	}
+	m=vb->p>8?vb->p:8;
+	if(current_vertices<m||current_vertices>2*m) {
+		delete [] ed;ed=new int*[m];
+		delete [] nu;nu=new int[m];
+		delete [] pts;pts=new double[3*m];
+		vc.n_resize_vertices(m);
+		current_vertices=m;
+	}
+	compact_stacks();
+	compacted=true;
+}
+
 /** Translates the vertices of the Voronoi cell by a given vector.
  * \param[in] (x,y,z) the coordinates of the vector. */
 void voronoicell_base::translate(double x,double y,double z) {
@@ -129,14 +288,14 @@ void voronoicell_base::add_memory(vc_class &vc,int i,int *stackp2) {
 		mep[i]=new int[init_n_vertices*s];
 		mem[i]=init_n_vertices;
 #if VOROPP_VERBOSE >=2
-		fprintf(stderr,"Order %d vertex memory created\n",i);
+		if(!compacted) fprintf(stderr,"Order %d vertex memory created\n",i);
 #endif
 	} else {
 		int j=0,k,*l;
 		mem[i]<<=1;
 		if(mem[i]>max_n_vertices) voro_fatal_error("Point memory allocation exceeded absolute maximum",VOROPP_MEMORY_ERROR);
 #if VOROPP_VERBOSE >=2
-		fprintf(stderr,"Order %d vertex memory scaled up to %d\n",i,mem[i]);
+		if(!compacted) fprintf(stderr,"Order %d vertex memory scaled up to %d\n",i,mem[i]);
 #endif
 		l=new int[s*mem[i]];
 		int m=0;
@@ -157,7 +316,7 @@ void voronoicell_base::add_memory(vc_class &vc,int i,int *stackp2) {
 				}
 				if(dsp==stackp2) voro_fatal_error("Couldn't relocate dangling pointer",VOROPP_INTERNAL_ERROR);
 #if VOROPP_VERBOSE >=3
-				fputs("Relocated dangling pointer",stderr);
+				if(!compacted) fputs("Relocated dangling pointer",stderr);
 #endif
 			}
 			for(k=0;k<s;k++,j++) l[j]=mep[i][j];
@@ -179,7 +338,7 @@ void voronoicell_base::add_memory_vertices(vc_class &vc) {
 	int i=(current_vertices<<1),j,**pp,*pnu;
 	if(i>max_vertices) voro_fatal_error("Vertex memory allocation exceeded absolute maximum",VOROPP_MEMORY_ERROR);
 #if VOROPP_VERBOSE >=2
-	fprintf(stderr,"Vertex memory scaled up to %d\n",i);
+	if(!compacted) fprintf(stderr,"Vertex memory scaled up to %d\n",i);
 #endif
 	double *ppts;
 	pp=new int*[i];
@@ -205,7 +364,7 @@ void voronoicell_base::add_memory_vorder(vc_class &vc) {
 	int i=(current_vertex_order<<1),j,*p1,**p2;
 	if(i>max_vertex_order) voro_fatal_error("Vertex order memory allocation exceeded absolute maximum",VOROPP_MEMORY_ERROR);
 #if VOROPP_VERBOSE >=2
-	fprintf(stderr,"Vertex order memory scaled up to %d\n",i);
+	if(!compacted) fprintf(stderr,"Vertex order memory scaled up to %d\n",i);
 #endif
 	p1=new int[i];
 	for(j=0;j<current_vertex_order;j++) p1[j]=mem[j];while(j<i) p1[j++]=0;
@@ -227,7 +386,7 @@ void voronoicell_base::add_memory_ds(int *&stackp) {
 	current_delete_size<<=1;
 	if(current_delete_size>max_delete_size) voro_fatal_error("Delete stack 1 memory allocation exceeded absolute maximum",VOROPP_MEMORY_ERROR);
 #if VOROPP_VERBOSE >=2
-	fprintf(stderr,"Delete stack 1 memory scaled up to %d\n",current_delete_size);
+	if(!compacted) fprintf(stderr,"Delete stack 1 memory scaled up to %d\n",current_delete_size);
 #endif
 	int *dsn=new int[current_delete_size],*dsnp=dsn,*dsp=ds;
 	while(dsp<stackp) *(dsnp++)=*(dsp++);
@@ -242,7 +401,7 @@ void voronoicell_base::add_memory_ds2(int *&stackp2) {
 	current_delete2_size<<=1;
 	if(current_delete2_size>max_delete2_size) voro_fatal_error("Delete stack 2 memory allocation exceeded absolute maximum",VOROPP_MEMORY_ERROR);
 #if VOROPP_VERBOSE >=2
-	fprintf(stderr,"Delete stack 2 memory scaled up to %d\n",current_delete2_size);
+	if(!compacted) fprintf(stderr,"Delete stack 2 memory scaled up to %d\n",current_delete2_size);
 #endif
 	int *dsn=new int[current_delete2_size],*dsnp=dsn,*dsp=ds2;
 	while(dsp<stackp2) *(dsnp++)=*(dsp++);
@@ -366,11 +525,12 @@ void voronoicell_base::construct_relations() {
  * \param[in,out] up */
 template<class vc_class>
 inline bool voronoicell_base::search_for_outside_edge(vc_class &vc,int &up) {
-	int i,lp,lw,*j(ds2),*stackp2(ds2);
+	int i,lp,lw,*stackp2(ds2);
+	long j=0;
 	double l;
 	*(stackp2++)=up;
-	while(j<stackp2) {
-		up=*(j++);
+	while(ds2+j<stackp2) {
+		up=ds2[j++];
 		for(i=0;i<nu[up];i++) {
 			lp=ed[up][i];
 			lw=m_test(lp,l);
@@ -1088,7 +1248,7 @@ bool voronoicell_base::nplane(vc_class &vc,double x,double y,double z,double rsq
 			qp=*edp;
 			if(qp!=-1&&ed[qp][nu[qp]]!=-1) {
 				if(stackp==stacke) {
-					int dis=stackp-dsp;
+					int dis=dsp-ds;
 					add_memory_ds(stackp);
 					dsp=ds+dis;
 				}
@@ -1620,7 +1780,7 @@ int voronoicell_base::check_marginal(int n,double &ans) {
 		if(current_marginal>max_marginal)
 			voro_fatal_error("Marginal case buffer allocation exceeded absolute maximum",VOROPP_MEMORY_ERROR);
 #if VOROPP_VERBOSE >=2
-		fprintf(stderr,"Marginal cases buffer scaled up to %d\n",i);
+		if(!compacted) fprintf(stderr,"Marginal cases buffer scaled up to %d\n",i);
 #endif
 		int *pmarg=new int[current_marginal];
 		for(int j=0;j<n_marg;j++) pmarg[j]=marg[j];
@@ -2247,5 +2407,9 @@ template bool voronoicell_base::nplane(voronoicell&,double,double,double,double,
 template bool voronoicell_base::nplane(voronoicell_neighbor&,double,double,double,double,int);
 template void voronoicell_base::check_memory_for_copy(voronoicell&,voronoicell_base*);
 template void voronoicell_base::check_memory_for_copy(voronoicell_neighbor&,voronoicell_base*);
+template void voronoicell_base::compact_base(voronoicell&);
+template void voronoicell_base::compact_base(voronoicell_neighbor&);
+template void voronoicell_base::fit_memory_for_copy(voronoicell&,voronoicell_base*);
+template void voronoicell_base::fit_memory_for_copy(voronoicell_neighbor&,voronoicell_base*);
 
 }
@@ -238,6 +238,10 @@ class voronoicell_base {
 		inline void reset_edges();
 		template<class vc_class>
 		void check_memory_for_copy(vc_class &vc,voronoicell_base* vb);
+		template<class vc_class>
+		void compact_base(vc_class &vc);
+		template<class vc_class>
+		void fit_memory_for_copy(vc_class &vc,voronoicell_base* vb);
 		void copy(voronoicell_base* vb);
 	private:
 		/** This is the delete stack, used to store the vertices which
@@ -256,6 +260,10 @@ class voronoicell_base {
 		/** This array contains a list of the marginal points, and also
 		 * the outcomes of the marginal tests. */
 		int *marg;
+		/** Whether the memory has been fitted to the cell (see
+		 * compact_base()), in which case growing it back on later plane
+		 * cuts is expected and no memory messages are printed. */
+		bool compacted;
 		/** The x coordinate of the normal vector to the test plane. */
 		double px;
 		/** The y coordinate of the normal vector to the test plane. */
@@ -273,6 +281,9 @@ class voronoicell_base {
 		void add_memory_ds(int *&stackp);
 		void add_memory_ds2(int *&stackp2);
 		template<class vc_class>
+		void resize_vorder(vc_class &vc,int k);
+		void compact_stacks();
+		template<class vc_class>
 		inline bool collapse_order1(vc_class &vc);
 		template<class vc_class>
 		inline bool collapse_order2(vc_class &vc);
@@ -371,8 +382,16 @@ class voronoicell : public voronoicell_base {
 		inline void init_tetrahedron(double x0,double y0,double z0,double x1,double y1,double z1,double x2,double y2,double z2,double x3,double y3,double z3) {
 			init_tetrahedron_base(x0,y0,z0,x1,y1,z1,x2,y2,z2,x3,y3,z3);
 		}
+		/** Reallocates the memory of the cell to fit its current
+		 * vertices and edges. */
+		inline void compact() {
+			compact_base(*this);
+		}
 	private:
 		inline void n_allocate(int i,int m) {};
+		inline void n_delete(int i) {};
+		inline void n_resize_vertices(int i) {};
+		inline void n_resize_vorder(int i) {};
 		inline void n_add_memory_vertices(int i) {};
 		inline void n_add_memory_vorder(int i) {};
 		inline void n_set_pointer(int p,int n) {};
@@ -419,6 +438,7 @@ class voronoicell_neighbor : public voronoicell_base {
 		~voronoicell_neighbor();
 		void operator=(voronoicell &c);
 		void operator=(voronoicell_neighbor &c);
+		void copy_compact(voronoicell_neighbor &c);
 		/** Cuts the Voronoi cell by a particle whose center is at a
 		 * separation of (x,y,z) from the cell center. The value of rsq
 		 * should be initially set to \f$x^2+y^2+z^2\f$.
@@ -467,6 +487,11 @@ class voronoicell_neighbor : public voronoicell_base {
 		void init_octahedron(double l);
 		void init_tetrahedron(double x0,double y0,double z0,double x1,double y1,double z1,double x2,double y2,double z2,double x3,double y3,double z3);
 		void check_facets();
+		/** Reallocates the memory of the cell to fit its current
+		 * vertices, edges and neighbor information. */
+		inline void compact() {
+			compact_base(*this);
+		}
 		virtual void neighbors(std::vector<int> &v);
 		virtual void print_edges_neighbors(int i);
 		virtual void output_neighbors(FILE *fp=stdout) {
@@ -477,6 +502,17 @@ class voronoicell_neighbor : public voronoicell_base {
 		int *paux1;
 		int *paux2;
 		inline void n_allocate(int i,int m) {mne[i]=new int[m*i];}
+		inline void n_delete(int i) {delete [] mne[i];}
+		inline void n_resize_vertices(int i) {
+			int **pp=new int*[i];
+			for(int j=0;j<i&&j<current_vertices;j++) pp[j]=ne[j];
+			delete [] ne;ne=pp;
+		}
+		inline void n_resize_vorder(int i) {
+			int **p2=new int*[i];
+			for(int j=0;j<i&&j<current_vertex_order;j++) p2[j]=mne[j];
+			delete [] mne;mne=p2;
+		}
 		inline void n_add_memory_vertices(int i) {
 			int **pp=new int*[i];
 			for(int j=0;j<current_vertices;j++) pp[j]=ne[j];
@@ -30,6 +30,9 @@ const int init_marginal=64;
 const int init_delete_size=256;
 /** The initial size for the auxiliary delete stack. */
 const int init_delete2_size=256;
+/** The size of the delete stacks and of the marginal buffer of a compacted
+ * cell, which grow back as needed. */
+const int compact_stack_size=16;
 /** The initial size for the wall pointer array. */
 const int init_wall_size=128;
 /** The default initial size for the ordering class. */
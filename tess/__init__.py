@@ -18,6 +18,8 @@ Example
 """
 
 from ._voro import Container as _Container, ContainerPoly as _ContainerPoly, Cell
+from ._voro import ContainerPeriodic as _ContainerPeriodic, ContainerPeriodicPoly as _ContainerPeriodicPoly
+from ._voro import CELL_FIELDS, FACE_FIELDS, cell_pool, read_text as _read_text
 
 # annotation helps autocomplete (python>=3.9 already has packs them for all built-ins)
 from typing import List
@@ -38,8 +40,8 @@ class Container(list[Cell]):
 
     Parameters
     ----------
-    points : iterable of iterable of `float`
-        The coordinates of the points, size Nx3.
+    points : iterable of iterable of `float`, or array-like (N,3)
+        The coordinates of the points, size Nx3. Inserted in bulk as a contiguous float64 array.
     limits : `float`, 3-tuple of float, or two 3-tuples of float
         The box limits.
         If given a float `L`, then the box limits are [0, 0, 0] to [L, L, L].
@@ -48,14 +50,60 @@ class Container(list[Cell]):
         If given two 3-tuples `(x0, y0, z0), (x1, y1, z1)`, limits are [x0, y0, z0] to [x1, y1, z1].
     periodic : `bool` or 3-tuple of `bool`, optional
         Periodicity of the x, y, and z walls
-    radii : iterable of `float`, optional
+    radii : iterable of `float`, or array-like (N,), optional
         for unequally sized particles, for generating a Laguerre transformation.
+    blocks : `int`, 3-tuple of `int`, or "auto", optional
+        The amount of computational blocks along each axis. By default it is guessed from the
+        average density of the whole box. With "auto", it is sized from a density histogram of the
+        points instead, along with the initial memory of each block, which suits clustered inputs.
+    walls : iterable of 4-tuples of float, array-like (W,4), or `dict`, optional
+        Additional planar walls `(x, y, z, d)`, added in bulk and deduplicated, see :meth:`add_walls`.
+        A `dict` may also hold curved walls by kind, next to the `"plane"` ones: `"sphere"`
+        `(x, y, z, r)`, `"cylinder"` `(x, y, z, ax, ay, az, r)` and `"cone"`
+        `(x, y, z, ax, ay, az, angle)`, see :meth:`add_curved_walls`.
+    cells : `bool`, optional
+        Whether to compute and store the `list` of :class:`Cell` objects (default). Set to False
+        to only use the columnar :meth:`arrays`, which keeps a constant memory per cell.
+    threads : `int`, optional
+        Amount of threads computing the cells, each one over its own chunks of the container blocks.
+    cache : `bool`, optional
+        Whether the cells memoize their geometry on first access, see :attr:`Cell.cache`.
+    compact : `bool`, optional
+        Whether each cell is fitted to its vertices, edges and neighbors, see :meth:`Cell.compact`.
+        The voro++ cells start with buffers sized for large cells, so this takes the memory of a
+        typical cell from hundreds of KB to a few KB. The cells are computed into a reused scratch
+        cell and copied into cells taken from a pool of freed ones (see :func:`cell_pool`), which
+        also saves most of the allocations of each cell.
 
     Returns
     -------
     Container
         A `list` of :class:`Cell` objects
 
+    Attributes
+    ----------
+    source_mask : `numpy.ndarray` of `bool`, (N,)
+        Which of the input points were inserted, points outside the container (or its walls) are skipped.
+    source_idx : `numpy.ndarray` of `int`
+        The original source index of each inserted point, i.e. of each container id. The cells carry
+        their own one as :attr:`Cell.source_id`, and translate their neighbors with
+        ``neighbors(source=True)``. It used to be a `list`, use ``source_idx.tolist()`` where one is
+        needed (see the changelog).
+    source_skipped : `int`
+        Amount of input points skipped.
+    source_ids : `numpy.ndarray` of `int`, or None
+        The ids of the inserted particles given in a text file, see :meth:`from_file`.
+    walls : list of 4-tuples of float
+        The kept (rounded) walls, with container ids `walls_cont_idx` and source indices
+        `walls_source_idx`, see :meth:`add_walls`.
+    walls_source_cont_idx : `numpy.ndarray` of `int`, (W,)
+        The container id of each source wall, duplicates get the one of the kept wall.
+    curved_walls : `dict` of `str` to list of tuples of float
+        The curved walls of each kind, with container ids going from
+        :attr:`curved_walls_startID` of the kind to -inf.
+    blocks, init_mem : 3-tuple of `int` and `int`
+        The block grid and the initial memory (in particles) of each block.
+
     Notes
     -----
     *Voronoi Tesselation*
@@ -87,6 +135,10 @@ class Container(list[Cell]):
     """ Custom walls start at -10 instead of -7 to help readability
         * NOTE: Could be set as constant inside .pyx
     """
+    curved_walls_startID = {"sphere": -100000, "cylinder": -200000, "cone": -300000}
+    """ Curved walls get their own id range per kind, planes are limited to the ids over -100000 """
+    curved_walls_amountID = 100000
+    """ Size of the id range of each kind of curved wall """
 
     @staticmethod
     def get_conainerId_limitWalls():
@@ -105,13 +157,17 @@ class Container(list[Cell]):
         }
 
 
-    @property
-    def custom_walls_precision_default():
-        """ Fixed original precision """
-        return 4
+    custom_walls_precision_default = 4
+    """ Fixed original precision """
     custom_walls_precision = custom_walls_precision_default
     """ To avoid repeated custom walls the 4D vectors are rounded (default 4, set to <=0 to disable)"""
 
+    inside_tolerance = 1e-10
+    """ Points closer than this distance to the (non periodic) upper limits or to a planar wall are skipped, see :meth:`inside`
+        * voro++ would accept a point ON the upper limits, and then fail to put it
+        * the points ON the lower limits are kept, same as voro++
+    """
+
     @staticmethod
     def get_rounded_wall(wall: tuple[float, float, float, float]) -> tuple[float, float, float, float]:
         if Container.custom_walls_precision > 0:
@@ -120,15 +176,52 @@ class Container(list[Cell]):
             return wall
 
     def get_containerId_wall(self, n):
-        return Container.custom_walls_startID-n-self.walls_source_skipped
+        """ Get the container id of the source wall `n`, a skipped duplicate gets the one of the kept wall """
+        return int(self.walls_source_cont_idx[n])
     def get_vector4D_wall(self, containerId):
+        """ Get the (rounded) 4D vector of the wall with the container id, which are sequential """
         linearId = -containerId + Container.custom_walls_startID
         return self.walls[linearId]
+    def get_curved_wall(self, containerId):
+        """ Get the kind and the parameters of the curved wall with the container id """
+        for kind, startID in Container.curved_walls_startID.items():
+            linearId = startID - containerId
+            if 0 <= linearId < Container.curved_walls_amountID:
+                return kind, self.curved_walls[kind][linearId]
+        raise KeyError(f"{containerId} is not the id of a curved wall")
 
 
 
-    def __init__(self, points, limits=1.0, periodic=False, radii=None, blocks=None, walls=None):
+    def __init__(self, points, limits=1.0, periodic=False, radii=None, blocks=None, walls=None, cells=True, threads=1, cache=False, compact=False):
         """Get the voronoi cells for a given set of points."""
+        # contiguous (N,3) float64 positions for the bulk insertion
+        import numpy as np
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        N = points.shape[0]
+        if radii is not None:
+            radii = np.ascontiguousarray(radii, dtype=np.float64).reshape(-1)
+            assert len(radii) == N
+
+        self._init_container(N, limits, periodic, blocks, walls, radii is not None, points)
+
+        # insert the points into the container (boxed for periodic dimensions) in a single call, after
+        # rejecting the ones outside or ON the limits and planar walls with a vectorized pre-filter,
+        # the mask keeps a reference to the original source ids of the inserted points
+        accept, inside = self._prefilter(points)
+        if radii is not None:
+            self.source_mask = self._container.put_array(points, radii, accept, inside)
+        else:
+            self.source_mask = self._container.put_array(points, accept, inside)
+        self.source_idx = np.flatnonzero(self.source_mask)
+        self.source_skipped = N - len(self.source_idx)
+        self._container.set_source(self.source_idx)
+        self.source_ids = None
+        self._radii = radii[self.source_idx] if radii is not None else None
+
+        self._init_cells(cells, threads, cache, compact)
+
+    def _init_container(self, N, limits, periodic, blocks, walls, poly, points=None):
+        """Create the empty voro++ container for N points and add its walls, see :class:`Container`."""
         # OPT:: most self.stuff should be properties
 
         # make px, py, pz from periodic, whether periodic is a 3-tuple or bool
@@ -177,9 +270,16 @@ class Container(list[Cell]):
         from math import sqrt
         self.radius = sqrt(self.radiusSq)
 
+        import numpy as np
+
         # make bx, by, bz from blocks, or make it up
-        N = len(points)
-        if blocks is None:
+        init_mem = 8
+        if isinstance(blocks, str):
+            assert blocks == "auto"
+            if points is None:
+                raise ValueError("blocks='auto' requires the points in memory")
+            blocks, init_mem = _auto_blocks(points, self.min, self.dims, self.periodic)
+        elif blocks is None:
             V = Lx * Ly * Lz
             Nthird = pow(N / V, 1.0 / 3.0)
             blocks = round(Nthird * Lx), round(Nthird * Ly), round(Nthird * Lz)
@@ -191,20 +291,10 @@ class Container(list[Cell]):
         by = max(int(by), 1)
         bz = max(int(bz), 1)
         self.blocks = bx, by, bz
-
-        # If we have periodic conditions, we want to get the 'boxed' version of each position.
-        # Each coordinate (x,y,z) may or may not be periodic, so we'll deal with them separately.
-        def _roundedoff(n, lmin, l, periodic):
-            if periodic:
-                v = (float(n) - lmin) % l + lmin
-                return v
-            else:
-                return float(n)
-
+        self.init_mem = init_mem
 
         # voro has two types: Container and ContainerPoly. ContainerPoly is for unequal radii
-        if radii:
-            assert len(radii) == N
+        if poly:
             ContainerClass = _ContainerPoly
         else:
             ContainerClass = _Container
@@ -213,68 +303,360 @@ class Container(list[Cell]):
             lx0, lx, ly0, ly, lz0, lz,  # limits
             bx, by, bz,                 # block size
             px, py, pz,                 # periodicity
-            8,                          # the initial memory allocation for each block
+            init_mem,                   # the initial memory allocation for each block
         )
 
-        # additional container walls passed as a list of 4D tuples for plane specification
+        # additional container walls passed as 4D vectors for plane specification, see add_walls
         self.walls = []
         self.walls_cont_idx = []
         self.walls_source_idx = []
         self.walls_source_skipped = 0
-        if walls:
-            for n, wall in enumerate(walls):
-                # round to a certain precision
-                wall_rounded = Container.get_rounded_wall(wall)
-
-                # avoid repeated walls
-                if wall_rounded in self.walls:
-                    self.walls_source_skipped+=1
+        self.walls_source_cont_idx = np.empty(0, dtype=np.intc)
+        self.curved_walls = {kind: [] for kind in Container.curved_walls_startID}
+        if isinstance(walls, dict):
+            for kind, kind_walls in walls.items():
+                if len(kind_walls) == 0:
                     continue
-
-                # add to the container with sequential idx (going from custom_walls_startID to -inf)
-                else:
-                    idx = Container.custom_walls_startID-n-self.walls_source_skipped
-                    self.walls.append(wall_rounded)
-                    self.walls_cont_idx.append(idx)
-                    self.walls_source_idx.append(n)
-
-                    x, y, z, d = wall_rounded
-                    self._container.add_wall(x, y, z, d, idx)
-
-        # insert the points into the container, keep a reference to the original source id
-        self.source_idx = []
-        self.source_skipped = 0
-        for n, (x, y, z) in zip(range(N), points):
-            # get boxed positon for periodic containers
-            rx, ry, rz = (
-                _roundedoff(x, lx0, Lx, px),
-                _roundedoff(y, ly0, Ly, py),
-                _roundedoff(z, lz0, Lz, pz),
-            )
-
-            # skip points not inside
-            if (not self._container.point_inside(rx, ry, rz)):
-                self.source_skipped +=1
-                #print(f"Could not insert point {n} at ({rx}, {ry}, {rz}): point not inside the container.")
-
-            # insert with radii or not
-            else:
-                idx = n-self.source_skipped
-                self.source_idx.append(n)
-                if radii:
-                    self._container.put(idx, rx, ry, rz, radii[n])
+                if kind == "plane":
+                    self.add_walls(kind_walls)
                 else:
-                    self._container.put(idx, rx, ry, rz)
-
+                    self.add_curved_walls(kind, kind_walls)
+        elif walls is not None and len(walls) > 0:
+            self.add_walls(walls)
 
+    def _init_cells(self, cells, threads, cache, compact):
+        """Compute the `list` of cells of the filled container, see :class:`Container`."""
         # store produced cells as a self.list
-        cells: List[Cell] = self._container.get_cells()
+        self.threads = max(int(threads), 1)
+        self.compact = bool(compact)
+        if not cells:
+            return
+        cells: List[Cell] = self._container.get_cells(self.threads, self.compact)
         list.__init__(self, cells)
+        if cache:
+            for cell in self:
+                if cell is not None: cell.cache = True
 
         # notify when no cells are produced
         if len(self) == 0:
             print(f"Empty container, no voronoi cell was generated! Maybe all points ended OUT/ON the walls?")
 
+    @classmethod
+    def from_file(cls, path, limits=1.0, format="text", periodic=False, blocks=None, walls=None,
+                  cells=True, threads=1, cache=False, compact=False, columns=3, dtype="float64"):
+        """Create the container from the particles of a file, without building the points in Python.
+
+        Parameters
+        ----------
+        path : `str` or path-like
+            The file of particles.
+        limits, periodic, blocks, walls, cells, threads, cache, compact
+            Same as :class:`Container`.
+        format : `str`, optional
+            The `"text"` files have rows of ``id x y z``, or ``id x y z r`` with radii, same as the
+            import of voro++. The first non-blank row sets the columns of all of them, a row with other
+            columns (or longer than 1023 characters) raises ValueError. They are parsed in C without the
+            GIL into the columns to insert, and the ids of the inserted rows are kept in `source_ids`. The `"npy"` files (saved with `numpy.save`) and
+            headerless `"raw"` binary files hold rows of ``x y z`` or ``x y z r``, they are memory
+            mapped and inserted from the mapped columns.
+        columns : `int`, optional
+            Amount of values of each row of a raw file, 3 or 4 with radii.
+        dtype : `str` or `numpy.dtype`, optional
+            Type of the values of a raw file, other than float64 they are converted in memory.
+
+        Returns
+        -------
+        Container
+            Its `source_idx` are the row numbers of the inserted particles in the file.
+        """
+        import numpy as np
+
+        self = cls.__new__(cls)
+        if format == "text":
+            # the radii are given by the amount of values of the first non-blank row, every row must match it
+            cols = 3
+            with open(path, "rb") as f:
+                for n, line in enumerate(f, 1):
+                    if line.split():
+                        cols = len(line.split()) - 1
+                        break
+            if cols not in (3, 4):
+                raise ValueError(f"Could not import line {n} of {path}: expected rows of id x y z or id x y z r")
+            ids, data = _read_text(path, cols)
+        elif format in ("npy", "raw"):
+            if format == "npy":
+                data = np.load(path, mmap_mode="r")
+            else:
+                data = np.memmap(path, dtype=dtype, mode="r").reshape(-1, columns)
+            if data.ndim != 2 or data.shape[1] not in (3, 4):
+                raise ValueError(f"Expected rows of x y z or x y z r, got shape {data.shape}")
+            ids, data = None, np.asarray(data, dtype=np.float64)
+        else:
+            raise ValueError(f"Unknown format {format!r}, expected one of ['text', 'npy', 'raw']")
+
+        # every format is inserted from the columns, after the same pre-filter as the points of a Container
+        N, poly = data.shape[0], data.shape[1] == 4
+        self._init_container(N, limits, periodic, blocks, walls, poly, data[:, :3])
+        accept, inside = self._prefilter(data[:, :3])
+        if poly:
+            self.source_mask = self._container.put_array(data[:, :3], data[:, 3], accept, inside)
+            radii = np.ascontiguousarray(data[self.source_mask, 3])
+        else:
+            self.source_mask = self._container.put_array(data[:, :3], accept, inside)
+            radii = None
+        self.source_ids = ids[self.source_mask] if ids is not None else None
+
+        self.source_idx = np.flatnonzero(self.source_mask)
+        self.source_skipped = N - len(self.source_idx)
+        self._container.set_source(self.source_idx)
+        self._radii = radii
+        self._init_cells(cells, threads, cache, compact)
+        return self
+
+    def add_walls(self, walls):
+        """Add planar walls to the container, in bulk. Only effective before computing the cells.
+
+        The walls are rounded to :attr:`custom_walls_precision` decimals and deduplicated with a hash
+        index of the rounded vectors, keeping the first occurrence. The kept walls get sequential
+        container ids, going from :attr:`custom_walls_startID` to -inf.
+
+        Parameters
+        ----------
+        walls : iterable of 4-tuples of float, or array-like (W,4)
+            The planes `(x, y, z, d)`: a normal vector and a displacement along it, the positive
+            halfspace is removed.
+        """
+        import numpy as np
+
+        walls = np.asarray(walls, dtype=np.float64).reshape(-1, 4)
+        if Container.custom_walls_precision > 0:
+            walls = np.round(walls, Container.custom_walls_precision)
+
+        # map each rounded wall to the position of its first occurrence among the kept ones
+        index = {(x, y, z, d): k for k, (x, y, z, d) in enumerate(map(tuple, self.walls))}
+        kept, source_pos = [], np.empty(len(walls), dtype=np.intc)
+        for n, wall in enumerate(map(tuple, walls.tolist())):
+            k = index.setdefault(wall, len(index))
+            if k == len(self.walls) + len(kept):
+                kept.append(n)
+            source_pos[n] = k
+
+        first = len(self.walls)
+        if first + len(kept) > Container.custom_walls_startID - max(Container.curved_walls_startID.values()):
+            raise ValueError(f"Too many planar walls, their ids would reach the curved walls ones")
+        ids = (Container.custom_walls_startID - np.arange(first, first + len(kept))).astype(np.intc)
+        self._container.add_walls(np.ascontiguousarray(walls[kept]), ids)
+
+        n_sources = len(self.walls_source_cont_idx)
+        self.walls += [tuple(w) for w in walls[kept].tolist()]
+        self.walls_cont_idx += ids.tolist()
+        self.walls_source_idx += [n_sources + n for n in kept]
+        self.walls_source_skipped += len(walls) - len(kept)
+        self.walls_source_cont_idx = np.concatenate(
+            [self.walls_source_cont_idx, Container.custom_walls_startID - source_pos]).astype(np.intc)
+
+    def add_curved_walls(self, kind, walls):
+        """Add curved walls of a kind to the container, in bulk. Only effective before computing the cells.
+
+        These are the native walls of voro++, each cell is cut by the plane tangent to the wall at
+        its closest point to the particle of the cell. So a single wall replaces the many tangent
+        planes that approximate it, which were all applied to every cell. The walls get sequential
+        container ids, going from the :attr:`curved_walls_startID` of the kind to -inf.
+
+        Parameters
+        ----------
+        kind : `str`
+            One of `"sphere"`, `"cylinder"` or `"cone"`, the inside of the wall is kept.
+        walls : iterable of tuples of float, or array-like (W,4) or (W,7)
+            The spheres `(x, y, z, r)`: center and radius. The cylinders `(x, y, z, ax, ay, az, r)`:
+            a point on the axis, the direction of the axis and the radius. The cones
+            `(x, y, z, ax, ay, az, angle)`: the apex, the direction of the axis and the angle in
+            radians from the axis.
+        """
+        import numpy as np
+
+        if kind not in Container.curved_walls_startID:
+            raise ValueError(f"Unknown wall kind {kind!r}, expected one of {list(Container.curved_walls_startID)}")
+        walls = np.ascontiguousarray(walls, dtype=np.float64).reshape(-1, 4 if kind == "sphere" else 7)
+
+        first = len(self.curved_walls[kind])
+        if first + len(walls) > Container.curved_walls_amountID:
+            raise ValueError(f"Too many {kind} walls, their ids would reach the next range")
+        ids = (Container.curved_walls_startID[kind] - np.arange(first, first + len(walls))).astype(np.intc)
+        self._container.add_curved_walls(kind, walls, ids)
+        self.curved_walls[kind] += [tuple(w) for w in walls.tolist()]
+
+    def inside(self, points, tolerance=None):
+        """Test which points would be inserted, against the box limits and the planar walls at once.
+
+        The whole array is evaluated with vectorized operations, in chunks of rows to bound the
+        memory with many walls. Periodic coordinates are wrapped first. The curved walls are not
+        considered, voro++ tests them while inserting the points.
+
+        >>> c = Container([[1,1,1]], limits=2, walls=[(1,0,0,1.5)], cells=False)
+        >>> c.inside([[0.5,1,1], [1.5,1,1], [1,1,2], [0,1,1]]).tolist()
+        [True, False, False, True]
+
+        Parameters
+        ----------
+        points : iterable of iterable of `float`, or array-like (N,3)
+            The coordinates of the points.
+        tolerance : `float`, optional
+            Distance to an upper limit or a wall under which a point is considered ON it, and
+            rejected. Defaults to :attr:`inside_tolerance`. The lower limits are inclusive, same as voro++.
+
+        Returns
+        -------
+        `numpy.ndarray` of `bool`, (N,)
+            Whether each point is inside the limits and strictly inside the walls.
+        """
+        import numpy as np
+
+        tolerance = Container.inside_tolerance if tolerance is None else float(tolerance)
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        lo, hi = np.array(self.min), np.array(self.max)
+        periodic = np.array(self.periodic)
+
+        # unit normals, so the tolerance is a distance to each plane
+        walls = np.array(self.walls, dtype=np.float64).reshape(-1, 4)
+        norms = np.linalg.norm(walls[:, :3], axis=1)
+        normals, d = walls[:, :3] / norms[:, None], walls[:, 3] / norms - tolerance
+
+        mask = np.empty(len(points), dtype=bool)
+        chunk = max(1024, (1 << 22) // max(len(walls), 1))
+        for start in range(0, len(points), chunk):
+            p = points[start:start + chunk]
+            if periodic.any():
+                p = np.where(periodic, (p - lo) % (hi - lo) + lo, p)
+            # voro++ accepts the points ON the lower limits, but fails to put the ones ON the upper limits
+            ok = ((p >= lo) & (p < hi - tolerance)) | periodic
+            ok = ok.all(axis=1)
+            if len(walls):
+                ok &= (p @ normals.T < d).all(axis=1)
+            mask[start:start + chunk] = ok
+        return mask
+
+    def _prefilter(self, points):
+        """The accept mask of :meth:`inside`, and whether voro++ still has to test the curved walls."""
+        return self.inside(points), any(len(w) > 0 for w in self.curved_walls.values())
+
+    def update(self, points, radii=None):
+        """Move the points in place and recompute only the cells that changed, reusing the rest.
+
+        The particles are relocated between the container blocks without rebuilding the container.
+        The recomputed cells are those of the moved points and of their neighbors, both before and
+        after moving.
+
+        Parameters
+        ----------
+        points : iterable of iterable of `float`, or array-like (N,3)
+            The new coordinates of the points, in the same order as the original ones. The points that
+            were skipped are ignored, and the inserted ones must stay inside the container.
+        radii : iterable of `float`, or array-like (N,), optional
+            The new radii of the points, only for containers with radii. Unchanged by default.
+
+        Returns
+        -------
+        int
+            The amount of cells recomputed. Without the `list` of cells (``cells=False``) the points
+            are only moved, and :meth:`arrays` computes every cell.
+        """
+        import numpy as np
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        points = np.ascontiguousarray(points[self.source_idx])
+        if self._radii is not None:
+            if radii is None:
+                radii = self._radii
+            else:
+                radii = np.asarray(radii, dtype=np.float64).reshape(-1)
+                radii = np.ascontiguousarray(radii[self.source_idx])
+            moved = self._container.move_array(points, radii)
+            self._radii = radii
+        else:
+            assert radii is None, "radii can only be updated in a container created with radii"
+            moved = self._container.move_array(points)
+
+        if len(self) == 0:
+            return 0
+
+        def neighbors(ids):
+            return {n for i in ids if self[i] is not None for n in self[i].neighbors() if n >= 0}
+
+        ids = np.flatnonzero(moved)
+        before = neighbors(ids)
+        failed = self._container.compute_ids(self, ids, self.compact)
+        others = (before | neighbors(ids)).difference(ids.tolist())
+        others = np.array(sorted(others), dtype=np.intp)
+        failed += self._container.compute_ids(self, others, self.compact)
+
+        if failed != 0:
+            print(f"Computation incomplete: there are cells left ({failed} / {len(self)})")
+        return len(ids) + len(others)
+
+    def locate(self, points):
+        """Find the cell containing each of the given points.
+
+        The points are looked up in the container blocks by voro++, in a single loop without the GIL.
+        With radii, the cells are the Laguerre (radical) ones.
+
+        >>> c = Container([[1,1,1], [3,3,3]], limits=4)
+        >>> c.locate([[0.5, 1, 1], [3.5, 3, 2], [5, 1, 1]]).tolist()
+        [0, 1, -1]
+
+        Parameters
+        ----------
+        points : iterable of iterable of `float`, or array-like (M,3)
+            The coordinates of the query points. Periodic coordinates are wrapped.
+
+        Returns
+        -------
+        `numpy.ndarray` of `int`, (M,)
+            The original source index of the point owning each cell, or -1 when a point is outside
+            the (non periodic) container. Walls are not considered.
+        """
+        import numpy as np
+
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        ids = self._container.find_voronoi_cells(points)
+        found = ids >= 0
+        source = np.full(len(ids), -1, dtype=self.source_idx.dtype)
+        source[found] = self.source_idx[ids[found]]
+        return source
+
+    def cells_in_region(self, sphere=None, box=None):
+        """Get the cells of the points inside a sphere or a box, computing only those.
+
+        The points are looped by the container blocks overlapping the region, so the cost scales
+        with the region instead of the whole container. With periodic boundaries the region wraps.
+
+        >>> c = Container([[1,1,1], [2,2,2], [3,3,3]], limits=4, cells=False)
+        >>> [cell.id for cell in c.cells_in_region(sphere=(2.5, 2.5, 2.5, 1))]
+        [1, 2]
+
+        Parameters
+        ----------
+        sphere : 4-tuple of float, optional
+            The center `(x, y, z)` and radius `r` of the sphere.
+        box : two 3-tuples of float, optional
+            The min `(x0, y0, z0)` and max `(x1, y1, z1)` corners of the box.
+
+        Returns
+        -------
+        list of :class:`Cell`
+            Sorted by id. When the container stores its cells, those are returned instead of new ones.
+        """
+        assert (sphere is None) != (box is None), "give either a sphere or a box"
+        if sphere is not None:
+            sphere = tuple(map(float, sphere))
+            assert len(sphere) == 4 and sphere[3] >= 0
+        else:
+            (x0, y0, z0), (x1, y1, z1) = box
+            box = (float(x0), float(y0), float(z0)), (float(x1), float(y1), float(z1))
+
+        if len(self) == 0:
+            return self._container.get_cells_subset(sphere, box)
+        return [self[i] for i in self._container.subset_ids(sphere, box) if self[i] is not None]
 
     def get_limits(self):
         """
@@ -287,6 +669,263 @@ class Container(list[Cell]):
         """
         return self._container.get_limits()
 
+    def arrays(self, fields=CELL_FIELDS + FACE_FIELDS, threads=None, source=False):
+        """Compute the tessellation into flat arrays, without keeping any :class:`Cell` alive.
+
+        Parameters
+        ----------
+        fields : iterable of `str`, optional
+            Which quantities to extract, any of :data:`CELL_FIELDS` and :data:`FACE_FIELDS` (default all).
+        threads : `int`, optional
+            Amount of threads computing the cells, defaults to the one of the container.
+        source : `bool`, optional
+            Whether the `neighbors` are the source index of the points instead of their container id,
+            translated in compiled code while extracting them. The walls keep their negative ids.
+
+        Returns
+        -------
+        CellArrays
+        """
+        threads = self.threads if threads is None else max(int(threads), 1)
+        return CellArrays(self._container.get_arrays(fields, threads, False, source), self.source_idx)
+
+    def neighbor_graph(self, weights="area", include_walls=False, sparse=False, threads=None):
+        """Build the adjacency of the cells as a CSR sparse matrix, indexed by the source index of the points.
+
+        The faces of each cell are gathered into flat arrays while computing the cells (see
+        :meth:`arrays`), and only remapped in bulk, with no Python call per cell. A cell with several
+        faces towards the same neighbor (e.g. in small periodic boxes) gets repeated entries.
+
+        Parameters
+        ----------
+        weights : `str`, optional
+            The value of each entry: `"area"` of the face, `"none"` (ones), or `"distance"` between
+            the two particles (the closest periodic images).
+        include_walls : `bool`, optional
+            Whether to keep the faces on the walls, as the columns after the particles: the wall with
+            id ``-k`` gets the column ``N + k - 1``. Not available with the `"distance"` weights.
+        sparse : `bool`, optional
+            Return a `scipy.sparse.csr_matrix` instead of the arrays, requires scipy.
+        threads : `int`, optional
+            Amount of threads computing the cells, defaults to the one of the container.
+
+        Returns
+        -------
+        indptr, indices, data : (N+1,), (E,) `int` and (E,) `float`
+            The CSR arrays, with a row per source point (N is the length of :attr:`source_mask`),
+            the skipped points have empty rows.
+        """
+        import numpy as np
+
+        if weights not in ("area", "none", "distance"):
+            raise ValueError(f"Unknown weights {weights!r}, expected one of ['area', 'none', 'distance']")
+        if weights == "distance" and include_walls:
+            raise ValueError("The distance weights are only defined between particles")
+
+        threads = self.threads if threads is None else max(int(threads), 1)
+        fields = ("neighbors", "face_areas") if weights == "area" else ("neighbors",)
+        arrays = self._container.get_arrays(fields, threads)
+        face_indptr, neighbors = arrays["face_indptr"], arrays["neighbors"]
+        cells = np.repeat(np.arange(len(face_indptr) - 1), np.diff(face_indptr))
+
+        keep = np.ones(len(neighbors), dtype=bool) if include_walls else neighbors >= 0
+        cells, neighbors = cells[keep], neighbors[keep]
+        N = len(self.source_mask)
+        indices = np.where(neighbors >= 0, self.source_idx[np.maximum(neighbors, 0)], N - 1 - neighbors)
+
+        if weights == "area":
+            data = arrays["face_areas"][keep]
+        elif weights == "none":
+            data = np.ones(len(indices))
+        else:
+            pos = arrays["pos"]
+            data = np.linalg.norm(self._minimum_image(pos[neighbors] - pos[cells]), axis=1)
+
+        # the source indices are sorted, so the rows keep the order of the container ids
+        indptr = np.zeros(N + 1, dtype=np.intp)
+        indptr[self.source_idx + 1] = np.bincount(cells, minlength=len(self.source_idx))
+        np.cumsum(indptr, out=indptr)
+        if not sparse:
+            return indptr, indices, data
+
+        from scipy.sparse import csr_matrix
+        columns = max(N, int(indices.max(initial=-1)) + 1) if include_walls else N
+        return csr_matrix((data, indices, indptr), shape=(N, columns))
+
+    def _minimum_image(self, d):
+        """Wrap the (M,3) displacements along the periodic dimensions to their closest image."""
+        import numpy as np
+        for k, (L, periodic) in enumerate(zip(self.dims, self.periodic)):
+            if periodic:
+                d[:, k] -= L * np.round(d[:, k] / L)
+        return d
+
+    def iter_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, batch=1024, source=False):
+        """Compute the tessellation in a single pass, yielding the flat arrays of a batch of cells at a time.
+
+        The cells are computed serially into the same reused cell, and only the arrays of the current
+        batch are kept, so the memory does not grow with the amount of cells. See :func:`iter_cells`.
+
+        Parameters
+        ----------
+        fields : iterable of `str`, optional
+            Which quantities to extract, any of :data:`CELL_FIELDS` and :data:`FACE_FIELDS` (default all).
+        batch : `int`, optional
+            Maximum amount of cells of each batch.
+        source : `bool`, optional
+            Whether the `neighbors` are the source index of the points, see :meth:`arrays`.
+
+        Yields
+        ------
+        CellArrays
+            The rows are in computation order, with the container ids in `id`. Cells that could not
+            be computed are skipped.
+        """
+        for arrays in self._container.iter_arrays(fields, int(batch), source):
+            yield CellArrays(arrays, self.source_idx[arrays["id"]])
+
+    def to_mesh(self, weld=False, tolerance=None, threads=None):
+        """Compute a single indexed triangle mesh of all the cells.
+
+        Each face is fan triangulated in compiled code, the triangles are counter clockwise seen from
+        the outside of their cell (outward normals). The faces between two cells are present twice,
+        once for each cell with opposite orientations, the `neighbors` allow to filter them.
+
+        Parameters
+        ----------
+        weld : `bool`, optional
+            Whether to merge the vertices shared between adjacent cells, otherwise each cell has its
+            own copy. The triangles collapsed by the merge are dropped.
+        tolerance : `float`, optional
+            Distance under which the vertices are merged, by default 1e-8 of the size of the mesh.
+            The vertices are snapped to a grid of that spacing, so it should be well under the
+            length of the edges.
+        threads : `int`, optional
+            Amount of threads computing the cells, defaults to the one of the container.
+
+        Returns
+        -------
+        vertices : (V,3) `float`
+            Global position of the vertices.
+        triangles : (T,3) `int`
+            Indices of the vertices of each triangle.
+        cells : (T,) `int`
+            Container id of the cell of each triangle.
+        neighbors : (T,) `int`
+            Container id of the neighbor across the face of each triangle, negative for walls.
+        """
+        import numpy as np
+
+        threads = self.threads if threads is None else max(int(threads), 1)
+        arrays = self._container.get_arrays((), threads, True)
+        vertices, triangles = arrays["mesh_vertices"], arrays["mesh_triangles"]
+        cells, neighbors = arrays["mesh_cell"], arrays["mesh_neighbors"]
+        if not weld or len(vertices) == 0:
+            return vertices, triangles, cells, neighbors
+
+        if tolerance is None:
+            tolerance = 1e-8 * max(np.ptp(vertices, axis=0).max(), 1.0)
+        keys = np.round(vertices / tolerance).astype(np.int64)
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        triangles = inverse.reshape(-1).astype(np.intc)[triangles]
+        kept = ((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2])
+                & (triangles[:, 2] != triangles[:, 0]))
+        return vertices[first], triangles[kept], cells[kept], neighbors[kept]
+
+    def write_custom(self, file, format="%i %q %v", compress=None, source=False):
+        """Compute every cell and write a line of custom statistics for each one, same as voro++ `print_custom`.
+
+        The cells are computed and formatted in C++ without the GIL into a buffered C stream, no
+        Python object is created per cell. Writing to a python file object, or compressing, goes
+        through a temporary file which is then copied in chunks.
+
+        Parameters
+        ----------
+        file : `str`, path-like, or file object
+            The path of the output, or a file object opened for writing (binary or text). Text
+            streams without a binary buffer, e.g. `io.StringIO`, get the output decoded as UTF-8.
+        format : `str`, optional
+            The voro++ custom output format. Some of its tokens: ``%i`` the id, ``%q`` the
+            position, ``%r`` the radius, ``%v`` the volume, ``%F`` the surface area, ``%c`` / ``%C`` the
+            local / global centroid, ``%s`` the number of faces, ``%n`` the neighbors, ``%a`` the
+            face orders, ``%f`` the face areas, ``%l`` the normals, ``%t`` the face vertices and ``%p``
+            / ``%P`` the local / global vertices. Floats are printed with ``%g``.
+        compress : `bool`, optional
+            Whether to write gzip compressed output, by default only for paths ending in ``.gz``.
+        source : `bool`, optional
+            Whether ``%i`` and ``%n`` are the source indices of the points (see :attr:`source_idx`,
+            :attr:`Cell.source_id` and ``Cell.neighbors(source=True)``). By default they are the
+            container ids, same as :attr:`Cell.id` and :meth:`Cell.neighbors`, which only match the
+            source indices when no point was skipped. The walls keep their negative ids.
+        """
+        import io, os, gzip
+
+        if hasattr(file, "write"):
+            if isinstance(file, io.TextIOBase) and not hasattr(file, "buffer"):
+                # in memory text streams (e.g. io.StringIO) get the decoded chunks
+                if compress:
+                    raise ValueError("Can not write compressed output to a text stream without a binary buffer")
+                self._container.print_custom(format, None, _TextWriter(file), source)
+                return
+            if isinstance(file, io.TextIOBase):
+                file.flush()
+                file = file.buffer
+            if compress:
+                with gzip.GzipFile(fileobj=file, mode="wb") as f:
+                    self._container.print_custom(format, None, f, source)
+            else:
+                self._container.print_custom(format, None, file, source)
+            return
+
+        if compress is None:
+            compress = os.fspath(file).endswith(".gz")
+        if compress:
+            with gzip.open(file, "wb") as f:
+                self._container.print_custom(format, None, f, source)
+        else:
+            self._container.print_custom(format, file, None, source)
+
+    def ghost_cells(self, points, radii=None, fields=("volume", "n_faces", "neighbors")):
+        """Compute the cell that a new particle would have at each point, without modifying the container.
+
+        Each trial particle is computed alone against the container particles (e.g. for insertion
+        scans), reusing a single cell in a loop without the GIL. The container must not be used by
+        other threads meanwhile.
+
+        >>> c = Container([[1,1,1], [3,3,3]], limits=4, cells=False)
+        >>> ghosts = c.ghost_cells([[3,1,1], [1,3,3]])
+        >>> ghosts.volume.round(3).tolist(), ghosts.n_faces.tolist()
+        ([16.0, 16.0], [5, 5])
+
+        Parameters
+        ----------
+        points : iterable of iterable of `float`, or array-like (M,3)
+            The coordinates of the trial particles. Periodic coordinates are wrapped.
+        radii : iterable of `float`, or array-like (M,), optional
+            The radii of the trial particles, for containers with radii (default 0).
+        fields : iterable of `str`, optional
+            Which quantities to extract, any of :data:`CELL_FIELDS` and :data:`FACE_FIELDS`.
+
+        Returns
+        -------
+        CellArrays
+            A row per trial point, with its `source_idx` set to `None`. The trial points outside the
+            container are not computed. The neighbors are container ids (negative for walls).
+        """
+        import numpy as np
+
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        if self._radii is not None:
+            if radii is None:
+                radii = np.zeros(len(points))
+            radii = np.ascontiguousarray(radii, dtype=np.float64).reshape(-1)
+            assert len(radii) == len(points)
+            arrays = self._container.get_ghost_arrays(points, radii, fields)
+        else:
+            assert radii is None, "radii can only be used in a container created with radii"
+            arrays = self._container.get_ghost_arrays(points, fields)
+        return CellArrays(arrays, None)
+
     def get_bond_normals(self):
         """Returns a generator of [(dx,dy,dz,A) for each bond] for each cell.
 
@@ -303,8 +942,9 @@ class Container(list[Cell]):
 
         Parameters
         ----------
-        l : int, optional
-            Defines which :math:`Q_l` you want (6 is standard, for detecting hexagonal lattices)
+        l : int or sequence of int, optional
+            Defines which :math:`Q_l` you want (6 is standard, for detecting hexagonal lattices).
+            For several `l`, an array with a value per `l` is returned.
         local : bool, optional
             Calculate Local :math:`Q_6` (true) or Global :math:`Q_6`
         weighted : bool, optional
@@ -345,27 +985,445 @@ class Container(list[Cell]):
 
         float
 
+        See Also
+        --------
+        CellArrays.order : per cell values, without building the `list` of :class:`Cell`.
         """
         import numpy as np
 
-        bonds = self.get_bond_normals()
-        Nb = np.sum([len(blst) for blst in bonds])
+        normals = [vc.normals(array=True) for vc in self]
+        weights = np.concatenate([vc.face_areas(array=True) for vc in self]) if weighted else 1
+        counts = np.array([len(n) for n in normals])
+        xyz = np.concatenate(normals).reshape(-1, 3)
         if not local:
-            bonds = [np.concatenate(bonds)]
-
-        Qs = []
-        for blst in bonds:
-            blst = np.array(blst)
-            xyz, A = blst[:, :3], blst[:, 3]
-            Q = orderQ(l, xyz, weights=(A if weighted else 1))
-            if local:
-                Q = Q * float(np.shape(xyz)[0])
-            Qs.append(Q)
-        if local:
-            return np.sum(Qs) / Nb
+            return steinhardt(l, xyz, weights)
+
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        Q = steinhardt(l, xyz, weights, indptr=indptr)
+        return np.nansum(Q * counts, axis=-1) / np.sum(counts)
+
+def _auto_blocks(points, lmin, dims, periodic, optimal=5.6, percentile=95):
+    """Block grid and initial memory per block for the voro++ container, from a density histogram.
+
+    Starts from the uniform guess of voro++ (``pre_container::guess_optimal``, with the same
+    `optimal` particles per block), then refines it for the fraction of occupied blocks. It uses the
+    geometric mean of the box and occupied densities, as the cells next to empty space still search
+    it, and refines up to four times denser. The memory fits the `percentile` of the occupied blocks,
+    while keeping the total allocation within about twice the amount of particles.
+    """
+    import numpy as np
+
+    N = points.shape[0]
+    dims = np.asarray(dims, dtype=float)
+    V = np.prod(dims)
+
+    def grid(density):
+        return np.maximum((dims * (density / optimal) ** (1 / 3) + 1).astype(int), 1)
+
+    def histogram(n):
+        idx = np.floor((points - lmin) / dims * n).astype(np.int64)
+        for d in range(3):
+            if periodic[d]:
+                idx[:, d] %= n[d]
+            else:
+                np.clip(idx[:, d], 0, n[d] - 1, out=idx[:, d])
+        return np.bincount(np.ravel_multi_index(idx.T, n), minlength=np.prod(n))
+
+    n = grid(N / V)
+    if N == 0:
+        return tuple(n), 8
+    counts = histogram(n)
+    occupied = max(np.count_nonzero(counts) / counts.size, 1 / 16)
+    if occupied < 1:
+        n = grid(N / (V * occupied ** 0.5))
+        counts = histogram(n)
+    init_mem = int(np.percentile(counts[counts > 0], percentile)) + 1
+    init_mem = min(init_mem, max(8, 2 * N // counts.size))
+    return tuple(int(b) for b in n), init_mem
+
+class PeriodicContainer(Container):
+    r"""A container (`list`) of Voronoi cells in a triclinic periodic box.
+
+    The box is a parallelepiped periodic in all three directions, spanned by the vectors
+    :math:`(b_x, 0, 0)`, :math:`(b_{xy}, b_y, 0)` and :math:`(b_{xz}, b_{yz}, b_z)`, e.g. a sheared
+    (Lees-Edwards) simulation box. It uses the native periodic engine of voro++, which builds and
+    caches the periodic images as needed instead of requiring image particles.
+
+    >>> from tess import PeriodicContainer
+    >>> c = PeriodicContainer([[1,1,1], [2,2,2]], box=(3, 1, 3, 0, 0, 3))
+    >>> [round(v.volume(), 3) for v in c]
+    [13.5, 13.5]
+
+    Parameters
+    ----------
+    points : iterable of iterable of `float`, or array-like (N,3)
+        The coordinates of the points, size Nx3. Points outside the primary domain are remapped.
+    box : `float`, 3-tuple of float, or 6-tuple of float
+        The box vectors components.
+        If given a float `L`, then the box is a cube of side `L`.
+        If given a 3-tuple `(bx, by, bz)`, then the box is rectangular.
+        If given a 6-tuple `(bx, bxy, by, bxz, byz, bz)`, then the box is triclinic.
+    radii : iterable of `float`, or array-like (N,), optional
+        for unequally sized particles, for generating a Laguerre transformation.
+    blocks : `int` or 3-tuple of `int`, optional
+        The amount of computational blocks along each box vector.
+    cells : `bool`, optional
+        Whether to compute and store the `list` of :class:`Cell` objects, see :class:`Container`.
+    threads : `int`, optional
+        Accepted for compatibility with :class:`Container`, the cells are always computed serially.
+    cache : `bool`, optional
+        Whether to enable the memoization of the geometry of each cell, see :class:`Container`.
+    compact : `bool`, optional
+        Whether each cell is reallocated to fit right after being computed, see :class:`Container`.
+
+    Notes
+    -----
+    The periodic images are built while computing the cells, so the computation is always serial.
+    The box has no limits nor walls, so :meth:`add_walls`, :meth:`add_curved_walls`,
+    :meth:`ghost_cells`, :meth:`update`, :meth:`locate`, :meth:`cells_in_region` and :meth:`from_file`
+    are not available, and :meth:`inside` accepts every point.
+    """
+
+    def __init__(self, points, box=1.0, radii=None, blocks=None, cells=True, threads=1, cache=False, compact=False):
+        import numpy as np
+
+        # make the 6 box vector components from box, whether a float, 3-tuple or 6-tuple
+        try:
+            d = len(box)
+            assert d in (3, 6)
+            if d == 3:
+                # rectangular box
+                bx, by, bz = box
+                box = (bx, 0.0, by, 0.0, 0.0, bz)
+        except TypeError:
+            # single float
+            box = (box, 0.0, box, 0.0, 0.0, box)
+        bx, bxy, by, bxz, byz, bz = map(float, box)
+        assert bx > 0 and by > 0 and bz > 0
+        self.box = bx, bxy, by, bxz, byz, bz
+        self.periodic = True, True, True
+        self.walls = []
+        self.curved_walls = {kind: [] for kind in Container.curved_walls_startID}
+
+        points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 3)
+        N = points.shape[0]
+
+        # make nx, ny, nz from blocks, or make it up with the same heuristic as the rectangular one
+        if blocks is None:
+            V = bx * by * bz
+            Nthird = pow(N / V, 1.0 / 3.0)
+            blocks = round(Nthird * bx), round(Nthird * by), round(Nthird * bz)
+        try:
+            nx, ny, nz = blocks
+        except TypeError:
+            nx = ny = nz = blocks
+        self.blocks = max(int(nx), 1), max(int(ny), 1), max(int(nz), 1)
+
+        if radii is not None:
+            radii = np.ascontiguousarray(radii, dtype=np.float64).reshape(-1)
+            assert len(radii) == N
+            self._container = _ContainerPeriodicPoly(*self.box, *self.blocks, 8)
+            self.source_mask = self._container.put_array(points, radii)
         else:
-            assert len(Qs) == 1
-        return np.mean(Qs)
+            self._container = _ContainerPeriodic(*self.box, *self.blocks, 8)
+            self.source_mask = self._container.put_array(points)
+        self.source_idx = np.flatnonzero(self.source_mask)
+        self.source_skipped = N - len(self.source_idx)
+        self._container.set_source(self.source_idx)
+        self.source_ids = None
+        self._radii = radii
+
+        # the periodic images are built while computing, so always serially
+        self._init_cells(cells, 1, cache, compact)
+
+    @classmethod
+    def from_file(cls, path, *args, **kwargs):
+        """Not available, create it from the loaded points instead."""
+        raise NotImplementedError("PeriodicContainer does not support from_file, load the points instead")
+
+    def add_walls(self, walls):
+        """Not available, the periodic box has no walls."""
+        raise NotImplementedError("PeriodicContainer does not support walls")
+
+    def add_curved_walls(self, kind, walls):
+        """Not available, the periodic box has no walls."""
+        raise NotImplementedError("PeriodicContainer does not support walls")
+
+    def inside(self, points, tolerance=None):
+        """Every point is inserted, remapped into the primary domain of the box, see :meth:`Container.inside`."""
+        import numpy as np
+        return np.ones(len(np.asarray(points, dtype=np.float64).reshape(-1, 3)), dtype=bool)
+
+    def ghost_cells(self, points, radii=None, fields=("volume", "n_faces", "neighbors")):
+        """Not available, the periodic images of the container are built while computing the cells."""
+        raise NotImplementedError("PeriodicContainer does not support ghost_cells")
+
+    def update(self, points, radii=None):
+        """Not available, the periodic images of the container are built while computing the cells."""
+        raise NotImplementedError("PeriodicContainer does not support update, create a new one")
+
+    def locate(self, points):
+        """Not available, the periodic images of the container are built while computing the cells."""
+        raise NotImplementedError("PeriodicContainer does not support locate")
+
+    def cells_in_region(self, sphere=None, box=None):
+        """Not available, the periodic images of the container are built while computing the cells."""
+        raise NotImplementedError("PeriodicContainer does not support cells_in_region")
+
+    def get_limits(self):
+        """
+        Get the box vectors components.
+
+        Returns
+        -------
+        box : 6-tuple of float
+            The components `(bx, bxy, by, bxz, byz, bz)` of the box vectors.
+        """
+        return self._container.get_box()
+
+    def _minimum_image(self, d):
+        """Wrap the (M,3) displacements to their closest image, along the box vectors from c to a."""
+        import numpy as np
+        bx, bxy, by, bxz, byz, bz = self.box
+        for vector, k in (((bxz, byz, bz), 2), ((bxy, by, 0.0), 1), ((bx, 0.0, 0.0), 0)):
+            d -= np.outer(np.round(d[:, k] / vector[k]), vector)
+        return d
+
+class _TextWriter:
+    """Binary writer decoding the chunks into a text stream, a multibyte character may span two chunks."""
+
+    def __init__(self, file):
+        import codecs
+        self.file = file
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def write(self, chunk):
+        self.file.write(self.decoder.decode(bytes(chunk)))
+        return len(chunk)
+
+class CellArrays:
+    r"""Columnar (struct-of-arrays) tessellation, created by :meth:`Container.arrays`.
+
+    Per cell arrays have a row per container id, same as the :class:`Container` `list`. Per face
+    arrays are ragged in a CSR layout: the faces of cell ``i`` are the rows
+    ``face_indptr[i]:face_indptr[i+1]``.
+
+    Attributes
+    ----------
+    computed : (N,) `bool`
+        Whether the cell could be computed (otherwise the rest of its row is zero).
+    pos, radius : (N,3) and (N,) `float`
+        Position and radius of the particle around which the cell was created.
+    volume, surface_area, max_radius_squared : (N,) `float`
+        Same as the :class:`Cell` methods.
+    centroid : (N,3) `float`
+        Global centroid of the cell.
+    n_faces, n_edges : (N,) `int`
+        Number of faces and edges of each cell.
+    face_indptr : (N+1,) `int`
+        Offsets of the faces of each cell, present when any per face field is requested.
+    neighbors, face_areas : (F,) `int` and (F,) `float`
+        Neighbor id (negative for walls) and area of each face. The container id of the neighbor, or its
+        source index when computed with ``source=True``.
+    normals : (F,3) `float`
+        Normal of each face.
+    source_idx : (N,) `int`
+        The original source index of each cell.
+    id : (N,) `int`
+        Only for the batches of :func:`iter_cells`, the container id of each row.
+    """
+
+    def __init__(self, arrays, source_idx):
+        self.__dict__.update(arrays)
+        self.source_idx = source_idx
+
+    def __len__(self):
+        return len(self.computed)
+
+    def faces(self, i):
+        """Get the `slice` of the per face arrays corresponding to the cell ``i``."""
+        return slice(self.face_indptr[i], self.face_indptr[i + 1])
+
+    def order(self, l=6, weighted=True, wigner=False):
+        r"""Returns the local Steinhardt order parameters :math:`Q_l` of each cell.
+
+        Requires scipy, and the ``normals`` (and ``face_areas`` when `weighted`) fields.
+
+        Parameters
+        ----------
+        l : int or sequence of int, optional
+            The order :math:`l` of the parameters, several are computed at once.
+        weighted : bool, optional
+            Whether or not to weight each bond by the area of its face.
+        wigner : bool, optional
+            Also return the :math:`\hat W_l` of each cell.
+
+        Returns
+        -------
+        Q : (N,) `float`, or (L,N) for several `l`
+            NaN for the cells that were not computed. See :func:`steinhardt`.
+        W : (N,) `float`, or (L,N) for several `l`
+            Only returned when `wigner`.
+        """
+        return steinhardt(l, self.normals, self.face_areas if weighted else 1,
+                          indptr=self.face_indptr, wigner=wigner)
+
+def iter_cells(points, limits=1.0, periodic=False, radii=None, blocks=None, walls=None,
+               fields=CELL_FIELDS + FACE_FIELDS, batch=1024):
+    """Stream the tessellation of the points, a batch of cells at a time, without building the `list` of cells.
+
+    Meant for single pass (out-of-core) statistics: the cell data in memory is limited to a single
+    batch, no matter the amount of particles. Only the particles themselves are stored whole.
+
+    Parameters
+    ----------
+    points, limits, periodic, radii, blocks, walls
+        Same as :class:`Container`.
+    fields : iterable of `str`, optional
+        Which quantities to extract, any of :data:`CELL_FIELDS` and :data:`FACE_FIELDS` (default all).
+    batch : `int`, optional
+        Maximum amount of cells of each batch, 1 yields a single cell at a time.
+
+    Yields
+    ------
+    CellArrays
+        The arrays of each batch, in computation order, see :meth:`Container.iter_arrays`.
+
+    Examples
+    --------
+    >>> [b.volume.tolist() for b in iter_cells([[1,1,1], [2,2,2]], limits=(3,3,3), fields=["volume"], batch=1)]
+    [[13.5], [13.5]]
+    """
+    cont = Container(points, limits=limits, periodic=periodic, radii=radii, blocks=blocks, walls=walls, cells=False)
+    yield from cont.iter_arrays(fields, batch)
+
+def _tessellate_chunk(chunk, options, fields):
+    # the frames of a task, each one into its own container without cells
+    return [(i, Container(points, radii=radii, cells=False, **options).arrays(fields)) for i, points, radii in chunk]
+
+def _tessellate_shared(chunk, options, fields):
+    # process worker: pack every array of the chunk into a single shared memory block, only the
+    # layout goes back through the pipe. The block is handed over to the parent, which unlinks it
+    import numpy as np
+    from multiprocessing import shared_memory, resource_tracker
+
+    arrays = [(i, key, a) for i, frame in _tessellate_chunk(chunk, options, fields) for key, a in vars(frame).items()]
+    layout, offset = [], 0
+    for i, key, a in arrays:
+        layout.append((i, key, a.dtype.str, a.shape, offset))
+        offset += -(-a.nbytes // 8) * 8
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (i, key, a), (_, _, dtype, shape, start) in zip(arrays, layout):
+        np.ndarray(shape, dtype, buffer=shm.buf, offset=start)[...] = a
+    # otherwise the tracker of the worker also unlinks it (and warns) when the worker exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    shm.close()
+    return shm.name, layout
+
+def _attach_shared(result):
+    # copy the arrays of a process worker out of its shared memory block, then release it
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    name, layout = result
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        frames = {}
+        for i, key, dtype, shape, start in layout:
+            frames.setdefault(i, {})[key] = np.ndarray(shape, dtype, buffer=shm.buf, offset=start).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return [(i, CellArrays(arrays, arrays.pop("source_idx"))) for i, arrays in frames.items()]
+
+def batch_tessellate(frames, limits=1.0, periodic=False, radii=None, blocks=None, walls=None,
+                     fields=CELL_FIELDS + FACE_FIELDS, workers=None, executor="thread", chunksize=1, ordered=True):
+    r"""Tessellate many independent frames (e.g. the snapshots of a trajectory) in parallel.
+
+    Each frame is computed into its own :class:`Container` without cells, straight to
+    :class:`CellArrays` (see :meth:`Container.arrays`). The frames are lazily scheduled in tasks of
+    `chunksize` frames, keeping at most two tasks per worker in flight.
+
+    The computation of the cells releases the GIL, so the default thread pool already runs the
+    frames in parallel, sharing the arrays with no copy. A process pool instead returns the arrays
+    of each task through a single :mod:`multiprocessing.shared_memory` block (copied out and
+    released by this process as soon as it arrives), instead of pickling them. On Windows a block
+    does not outlive the worker handle, so the arrays are pickled there.
+
+    Parameters
+    ----------
+    frames : iterable of (N,3) array-like
+        The particle positions of each frame, the amount of particles may differ between frames.
+    limits, periodic, blocks, walls
+        Same as the :class:`Container` arguments, shared by all the frames.
+    radii : iterable of (N,) array-like, optional
+        The particle radii of each frame, aligned with `frames`.
+    fields : iterable of `str`, optional
+        Which quantities to extract, any of :data:`CELL_FIELDS` and :data:`FACE_FIELDS` (default all).
+    workers : `int`, optional
+        Amount of threads or processes, defaults to :func:`os.cpu_count`.
+    executor : `str`, optional
+        `"thread"` or `"process"` pool.
+    chunksize : `int`, optional
+        Amount of frames per task, larger chunks amortize the scheduling of many small frames.
+    ordered : `bool`, optional
+        Whether to yield the frames in their input order, otherwise as soon as they are computed.
+
+    Yields
+    ------
+    index : `int`
+        The position of the frame in `frames`.
+    arrays : CellArrays
+
+    Examples
+    --------
+
+    >>> from tess import batch_tessellate
+    >>> frames = [[[1,1,1], [2,2,2]], [[1,1,1], [2,2,1]]]
+    >>> [(i, a.volume.tolist()) for i, a in batch_tessellate(frames, limits=(3,3,3), fields=["volume"], workers=2)]
+    [(0, [13.5, 13.5]), (1, [13.5, 13.5])]
+    """
+    import os, sys, itertools
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    if executor not in ("thread", "process"):
+        raise ValueError(f"Unknown executor {executor!r}, expected 'thread' or 'process'")
+    workers = max(int(workers or os.cpu_count() or 1), 1)
+    chunksize = max(int(chunksize), 1)
+    options = dict(limits=limits, periodic=periodic, blocks=blocks, walls=walls)
+    fields = tuple(fields)
+
+    radii = itertools.repeat(None) if radii is None else radii
+    tasks = iter(lambda it=enumerate(zip(frames, radii)): [(i, p, r) for i, (p, r) in itertools.islice(it, chunksize)], [])
+
+    if executor == "thread":
+        pool, work, collect = ThreadPoolExecutor(workers), _tessellate_chunk, lambda result: result
+    elif sys.platform == "win32":
+        pool, work, collect = ProcessPoolExecutor(workers), _tessellate_chunk, lambda result: result
+    else:
+        pool, work, collect = ProcessPoolExecutor(workers), _tessellate_shared, _attach_shared
+
+    with pool:
+        pending = [pool.submit(work, chunk, options, fields) for chunk in itertools.islice(tasks, 2 * workers)]
+        try:
+            while pending:
+                if ordered:
+                    done = [pending.pop(0)]
+                else:
+                    finished = wait(pending, return_when=FIRST_COMPLETED).done
+                    done = [f for f in pending if f in finished]
+                    pending = [f for f in pending if f not in finished]
+                for future in done:
+                    chunk = next(tasks, None)
+                    if chunk is not None:
+                        pending.append(pool.submit(work, chunk, options, fields))
+                    yield from collect(future.result())
+        finally:
+            # stopped early (or failed): release the shared memory of the tasks still in flight
+            for future in pending:
+                if not future.cancel() and future.exception() is None:
+                    collect(future.result())
 
 def cart_to_spher(xyz):
     r"""Converts 3D cartesian coordinates to the angular portion of spherical coordinates, (theta, phi).
@@ -433,13 +1491,128 @@ def orderQ(l, xyz, weights=1):
     :math:`w_i` are the `weights`, defaulting to uniform: (:math:`\frac{1}{N_b}`)
     """
     import numpy as np
-    from scipy.special import sph_harm
 
+    return steinhardt(l, np.asarray(xyz, dtype=float), weights)
+
+def _sph_harm(l, m, theta, phi):
+    """:math:`Y_{lm}` with polar angle `theta`, for any scipy version."""
+    try:
+        from scipy.special import sph_harm_y
+    except ImportError:
+        # deprecated (and later removed) in favor of sph_harm_y, with swapped arguments
+        from scipy.special import sph_harm
+        return sph_harm(m, l, phi, theta)
+    return sph_harm_y(l, m, theta, phi)
+
+def _wigner3j(l, m1, m2, m3):
+    r"""Wigner 3-j symbol :math:`\begin{pmatrix} l & l & l \\ m_1 & m_2 & m_3 \end{pmatrix}` (Racah formula)."""
+    from math import factorial, sqrt
+
+    if m1 + m2 + m3 != 0:
+        return 0.0
+    f = factorial
+    delta = f(l) ** 3 / f(3 * l + 1)
+    norm = sqrt(delta * f(l + m1) * f(l - m1) * f(l + m2) * f(l - m2) * f(l + m3) * f(l - m3))
+    total = 0.0
+    for k in range(l + 1):
+        args = (k, k + m1, k - m2, l - k, l - k - m1, l - k + m2)
+        if min(args) < 0:
+            continue
+        denom = 1
+        for a in args:
+            denom *= f(a)
+        total += (-1) ** k / denom
+    return (-1) ** (-m3) * norm * total
+
+def steinhardt(l, xyz, weights=1, indptr=None, wigner=False):
+    r"""Returns the Steinhardt bond order parameters :math:`Q_l` (and :math:`\hat W_l`) of the bonds xyz.
+
+    Requires numpy and scipy.
+
+    All the :math:`Y_{lm}` are computed in a single vectorized pass over a flat array of bonds,
+    which are then reduced per segment, e.g. the faces of each cell in a :class:`CellArrays`.
+
+    Parameters
+    ----------
+    l : int or sequence of int
+        The order of :math:`Q_l`, several are computed at once.
+    xyz : array-like Nbx3
+        The bond vectors, e.g. the normals of the faces.
+    weights : array-like (Nb,), optional
+        How to weight the bonds; weighting by Voronoi face area is common. Uniform by default.
+    indptr : array-like (N+1,), optional
+        Offsets of the bonds of each segment, the bonds of ``i`` being ``indptr[i]:indptr[i+1]``.
+        When not given, all the bonds are a single segment.
+    wigner : bool, optional
+        Also return :math:`\hat W_l`.
+
+    Notes
+    -----
+    For each segment, with the weights normalized to :math:`\sum_i w_i = 1`,
+
+    .. math::
+        q_{lm} = \sum_{i=1}^{N_b} w_i Y_{lm}\left(\theta_i, \phi_i \right) \qquad
+        Q_l = \sqrt{\frac{4 \pi}{2 l + 1}\sum_{m=-l}^{l} \left| q_{lm} \right|^2}
+
+    .. math::
+        \hat W_l = \frac{\sum_{m_1+m_2+m_3=0} \begin{pmatrix} l & l & l \\ m_1 & m_2 & m_3 \end{pmatrix}
+            q_{lm_1} q_{lm_2} q_{lm_3}}{\left(\sum_{m=-l}^{l} \left| q_{lm} \right|^2\right)^{3/2}}
+
+    Only :math:`m \geq 0` are computed, as :math:`q_{l,-m} = (-1)^m q_{lm}^*`.
+
+    Returns
+    -------
+    Q : float, or (N,) array with `indptr`
+        With a leading axis when several `l` are given. NaN for empty segments.
+    W : same as `Q`
+        Only returned when `wigner`.
+    """
+    import numpy as np
+
+    ls = np.atleast_1d(l)
+    xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+    Nb = xyz.shape[0]
+    weights = np.broadcast_to(np.asarray(weights, dtype=float), (Nb,))
+    single = indptr is None
+    if single:
+        indptr = (0, Nb)
+    counts = np.diff(np.asarray(indptr, dtype=np.int64))
+    N = len(counts)
+    seg = np.repeat(np.arange(N), counts)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        norm = 1 / np.bincount(seg, weights, minlength=N)
     theta, phi = cart_to_spher(xyz).T
-    weights = np.ones(xyz.shape[0]) * weights
-    weights /= np.sum(weights)
-    mmeans = np.zeros(2 * l + 1, dtype=float)
-    for m in range(-l, l + 1):
-        sph_weighted = sph_harm(m, l, phi, theta).dot(weights)  # Average of Y_{6m}
-        mmeans[m] = abs(sph_weighted) ** 2
-    return np.sqrt(4 * np.pi / (2 * l + 1) * np.sum(mmeans))
+
+    Qs, Ws = np.empty((len(ls), N)), np.empty((len(ls), N))
+    for il, li in enumerate(ls):
+        li = int(li)
+        # q_lm per segment, m = 0..l
+        q = np.empty((li + 1, N), dtype=complex)
+        for m in range(li + 1):
+            Y = _sph_harm(li, m, theta, phi) * weights
+            q[m] = np.bincount(seg, Y.real, minlength=N) + 1j * np.bincount(seg, Y.imag, minlength=N)
+        q *= norm
+
+        q2 = np.abs(q) ** 2
+        sum2 = q2[0] + 2 * np.sum(q2[1:], axis=0)
+        Qs[il] = np.sqrt(4 * np.pi / (2 * li + 1) * sum2)
+        if not wigner:
+            continue
+
+        def qm(m):
+            return q[m] if m >= 0 else (-1) ** m * np.conj(q[-m])
+
+        W = np.zeros(N, dtype=complex)
+        for m1 in range(-li, li + 1):
+            for m2 in range(max(-li, -li - m1), min(li, li - m1) + 1):
+                m3 = -m1 - m2
+                W += _wigner3j(li, m1, m2, m3) * qm(m1) * qm(m2) * qm(m3)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            Ws[il] = W.real / sum2 ** 1.5
+
+    if np.ndim(l) == 0:
+        Qs, Ws = Qs[0], Ws[0]
+    if single:
+        Qs, Ws = Qs[..., 0], Ws[..., 0]
+    return (Qs, Ws) if wigner else Qs
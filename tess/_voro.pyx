@@ -6,12 +6,22 @@
 from __future__ import division
 
 from libcpp.vector cimport vector
+from libcpp.pair cimport pair
+from libcpp.algorithm cimport sort
 from libcpp cimport bool as cbool
 from cython.operator cimport dereference
+from libc.math cimport fmod, floor
+from libc.stdio cimport FILE, fopen, fclose, fgets, feof, tmpfile, setvbuf, _IOFBF, fread, rewind, fflush
+from libc.string cimport strlen
+from libc.stdlib cimport strtol, strtod
+from cpython.buffer cimport PyBUF_WRITABLE
 
 EXCECT_MISSING_CELLS = False
 
-cdef extern from "voro++.hh" namespace "voro":
+cdef extern from "voro++.hh" namespace "voro" nogil:
+    # the radius written by the custom output of the mono containers
+    const double default_radius
+
     cdef cppclass container_base:
         # declared but derived classes not actually deriving
         # atm repeating the declaration of total_particles, add_wall...
@@ -23,11 +33,21 @@ cdef extern from "voro++.hh" namespace "voro":
 
     cdef cppclass container:
         double ax, ay, az, bx, by, bz
+        double xsp, ysp, zsp
+        cbool xperiodic, yperiodic, zperiodic
+        int nx, ny, nz, nxy, nxyz, ps
+        int **id
+        double **p
+        int *co
         container(double,double,double,double,double,double,
                 int,int,int,cbool,cbool,cbool,int) except +
         cbool compute_cell(voronoicell_neighbor &c,c_loop_all &vl)
+        cbool compute_cell(voronoicell_neighbor &c, int ijk, int q)
+        cbool find_voronoi_cell(double x, double y, double z, double &rx, double &ry, double &rz, int &pid)
+        cbool compute_ghost_cell(voronoicell_neighbor &c, double x, double y, double z)
         cbool point_inside(double,double,double)
         cbool put(int, double, double, double)
+        void print_custom(const char *format, FILE *fp)
 
         int total_particles()
         # void add_wall(wall &w)
@@ -35,11 +55,22 @@ cdef extern from "voro++.hh" namespace "voro":
 
     cdef cppclass container_poly:
         double ax, ay, az, bx, by, bz
+        double xsp, ysp, zsp
+        double max_radius
+        cbool xperiodic, yperiodic, zperiodic
+        int nx, ny, nz, nxy, nxyz, ps
+        int **id
+        double **p
+        int *co
         container_poly(double,double,double,double,double,double,
                 int,int,int,cbool,cbool,cbool,int) except +
         cbool compute_cell(voronoicell_neighbor &c, c_loop_all &vl)
+        cbool compute_cell(voronoicell_neighbor &c, int ijk, int q)
+        cbool find_voronoi_cell(double x, double y, double z, double &rx, double &ry, double &rz, int &pid)
+        cbool compute_ghost_cell(voronoicell_neighbor &c, double x, double y, double z, double r)
         cbool point_inside(double,double,double)
         cbool put(int, double, double, double, double)
+        void print_custom(const char *format, FILE *fp)
 
         int total_particles()
         # void add_wall(wall &w)
@@ -72,6 +103,41 @@ cdef extern from "voro++.hh" namespace "voro":
         cbool nplane(double,double,double, double rsq, int p_id)
         # cbool plane(double,double,double)
         cbool nplane(double,double,double, int p_id)
+        void compact()
+        void copy_compact(voronoicell_neighbor &c)
+        void output_custom(const char *format, int i, double x, double y, double z, double r, FILE *fp)
+        # the vertices, their orders and the neighbor of each edge, to translate the neighbors
+        int p
+        int *nu
+        int **ne
+
+    cdef cppclass container_periodic_base:
+        # declared but derived classes not actually deriving, same as container_base
+        pass
+
+    cdef cppclass container_periodic:
+        double bx, bxy, by, bxz, byz, bz
+        container_periodic(double,double,double,double,double,double,
+                int,int,int,int) except +
+        cbool compute_cell(voronoicell_neighbor &c, c_loop_all_periodic &vl)
+        cbool put(int, double, double, double)
+        void print_custom(const char *format, FILE *fp)
+
+    cdef cppclass container_periodic_poly:
+        double bx, bxy, by, bxz, byz, bz
+        container_periodic_poly(double,double,double,double,double,double,
+                int,int,int,int) except +
+        cbool compute_cell(voronoicell_neighbor &c, c_loop_all_periodic &vl)
+        cbool put(int, double, double, double, double)
+        void print_custom(const char *format, FILE *fp)
+
+    cdef cppclass c_loop_all_periodic:
+        c_loop_all_periodic(container_periodic_base&)
+        cbool start()
+        cbool inc()
+        int pid()
+        void pos(double &x, double &y, double &z)
+        void pos(int &pid, double &x, double &y, double &z, double &r)
 
     cdef cppclass c_loop_all:
         c_loop_all(container_base&)
@@ -81,11 +147,94 @@ cdef extern from "voro++.hh" namespace "voro":
         void pos(double &x, double &y, double &z)
         void pos(int &pid, double &x, double &y, double &z, double &r)
 
+    cdef cppclass c_loop_subset:
+        int ijk, q
+        c_loop_subset(container_base&)
+        void setup_sphere(double vx, double vy, double vz, double r, cbool bounds_test)
+        void setup_box(double xmin, double xmax, double ymin, double ymax, double zmin, double zmax, cbool bounds_test)
+        cbool start()
+        cbool inc()
+        int pid()
+
     cdef cppclass wall_plane:
         int w_id
         double xc, yc, zc, ac
         wall_plane(double xc, double yc, double zc, double ac, int w_id)
 
+    # the curved walls cut each cell by the plane tangent at the closest point to its particle
+    cdef cppclass wall_sphere(wall):
+        wall_sphere(double xc, double yc, double zc, double rc, int w_id)
+    cdef cppclass wall_cylinder(wall):
+        wall_cylinder(double xc, double yc, double zc, double xa, double ya, double za, double rc, int w_id)
+    cdef cppclass wall_cone(wall):
+        wall_cone(double xc, double yc, double zc, double xa, double ya, double za, double ang, int w_id)
+
+cdef extern from "_voro_helpers.hh" namespace "voro" nogil:
+    cdef cppclass compute_worker[T]:
+        compute_worker(T &) except +
+        cbool compute_cell(voronoicell_neighbor &c, int ijk, int q)
+
+cdef inline double _wrap(double v, double lmin, double l, cbool periodic) nogil:
+    """ Get the boxed coordinate for periodic dimensions, same as python ``(v - lmin) % l + lmin`` """
+    if periodic:
+        v = fmod(v - lmin, l)
+        if v < 0: v += l
+        return v + lmin
+    return v
+
+
+cdef class _Buffer:
+    """ Owns the data of a voro++ vector, exposed through the buffer protocol as a (n,) or (n/cols, cols) array.
+
+        * arrays built from it (e.g. with ``numpy.asarray``) share its memory and keep it alive
+        * a read only buffer is shared between several arrays, e.g. when memoized by a caching cell
+    """
+    cdef vector[double] d
+    cdef vector[int] i
+    cdef cbool is_int
+    cdef cbool readonly
+    cdef Py_ssize_t cols
+    cdef Py_ssize_t shape[2]
+    cdef Py_ssize_t strides[2]
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        if self.readonly and flags & PyBUF_WRITABLE:
+            raise BufferError("Cell buffer is read only")
+
+        cdef Py_ssize_t itemsize = sizeof(int) if self.is_int else sizeof(double)
+        cdef Py_ssize_t n = self.i.size() if self.is_int else self.d.size()
+        self.shape[0] = n // self.cols
+        self.shape[1] = self.cols
+        self.strides[0] = itemsize * self.cols
+        self.strides[1] = itemsize
+
+        buffer.buf = <void *>self.i.data() if self.is_int else <void *>self.d.data()
+        buffer.format = 'i' if self.is_int else 'd'
+        buffer.internal = NULL
+        buffer.itemsize = itemsize
+        buffer.len = n * itemsize
+        buffer.ndim = 2 if self.cols > 1 else 1
+        buffer.obj = self
+        buffer.readonly = self.readonly
+        buffer.shape = self.shape
+        buffer.strides = self.strides
+        buffer.suboffsets = NULL
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        pass
+
+cdef inline _Buffer _new_buffer(cbool is_int, Py_ssize_t cols=1):
+    cdef _Buffer buf = _Buffer.__new__(_Buffer)
+    buf.is_int = is_int
+    buf.readonly = False
+    buf.cols = cols
+    return buf
+
+cdef list _tuples3(const vector[double] &v, double dx=0, double dy=0, double dz=0):
+    """ Convert a flat vector of 3D coordinates into a list of 3-tuples, displaced by (dx,dy,dz) """
+    cdef size_t i
+    return [(v[i] + dx, v[i + 1] + dy, v[i + 2] + dz) for i in range(0, v.size(), 3)]
+
 cdef class Cell:
     """A basic voronoi cell, usually created by :class:`Container`.
 
@@ -96,12 +245,38 @@ cdef class Cell:
     cdef int _id
     cdef double x,y,z
     cdef double r
+    # source index of the particle, and the map of the container ids to translate the neighbors
+    cdef int _source_id
+    cdef const int[::1] _source
+
+    # memoized geometry (in local coordinates) when caching, see the cache property
+    cdef cbool _cache
+    cdef cbool _centroid_cached
+    cdef double _cx, _cy, _cz
+    cdef _Buffer _vertices
+    cdef _Buffer _face_vertices
+    cdef _Buffer _face_areas
+    cdef _Buffer _normals
+    cdef _Buffer _neighbors
+    # compacted cells are returned to the pool when freed, see cell_pool
+    cdef cbool _compact
 
     def __cinit__(self):
+        self.thisptr = NULL
+        self._source_id = -1
+        self._source = None
+        self._cache = False
+        self._centroid_cached = False
+        self._compact = False
+
+    def __init__(self):
         self.thisptr = new voronoicell_neighbor()
 
     def __dealloc__(self):
-        del self.thisptr
+        if self._compact and _cell_pool.size() < _cell_pool_max:
+            _cell_pool.push_back(self.thisptr)
+        else:
+            del self.thisptr
 
     @property
     def pos(self):
@@ -120,6 +295,91 @@ cdef class Cell:
         """The ``id`` of the cell inside the container, not necessarily matches the input source. """
         return self._id
 
+    @property
+    def source_id(self):
+        """The source index of the point around which this cell was created, see ``Container.source_idx``.
+
+        Set by the container while computing the cell, same as :attr:`id` for a container without
+        source indices, and -1 for a cell not created by a container."""
+        return self._source_id
+
+    @property
+    def cache(self):
+        """Whether the geometry (centroid, vertices, face vertices, face areas, normals and neighbors)
+        is memoized on first access instead of recalculated on every call. Defaults to False.
+
+        The memoized data is invalidated when the cell is cut or translated."""
+        return self._cache
+
+    @cache.setter
+    def cache(self, cbool value):
+        self._cache = value
+        if not value:
+            self._invalidate()
+
+    cdef void _invalidate(self) noexcept:
+        # arrays returned from the memoized buffers keep them alive on their own
+        self._centroid_cached = False
+        self._vertices = None
+        self._face_vertices = None
+        self._face_areas = None
+        self._normals = None
+        self._neighbors = None
+
+    cdef void _centroid_buf(self, double *cx, double *cy, double *cz) noexcept:
+        if not self._cache:
+            self.thisptr.centroid(cx[0], cy[0], cz[0])
+            return
+        if not self._centroid_cached:
+            self.thisptr.centroid(self._cx, self._cy, self._cz)
+            self._centroid_cached = True
+        cx[0], cy[0], cz[0] = self._cx, self._cy, self._cz
+
+    # Each buffer accessor returns the memoized buffer when caching, otherwise a freshly extracted one
+    cdef _Buffer _vertices_buf(self):
+        if self._vertices is not None: return self._vertices
+        cdef _Buffer buf = _new_buffer(False, 3)
+        self.thisptr.vertices(buf.d)
+        if self._cache:
+            buf.readonly = True
+            self._vertices = buf
+        return buf
+
+    cdef _Buffer _face_vertices_buf(self):
+        if self._face_vertices is not None: return self._face_vertices
+        cdef _Buffer buf = _new_buffer(True)
+        self.thisptr.face_vertices(buf.i)
+        if self._cache:
+            buf.readonly = True
+            self._face_vertices = buf
+        return buf
+
+    cdef _Buffer _face_areas_buf(self):
+        if self._face_areas is not None: return self._face_areas
+        cdef _Buffer buf = _new_buffer(False)
+        self.thisptr.face_areas(buf.d)
+        if self._cache:
+            buf.readonly = True
+            self._face_areas = buf
+        return buf
+
+    cdef _Buffer _normals_buf(self):
+        if self._normals is not None: return self._normals
+        cdef _Buffer buf = _new_buffer(False, 3)
+        self.thisptr.normals(buf.d)
+        if self._cache:
+            buf.readonly = True
+            self._normals = buf
+        return buf
+
+    cdef _Buffer _neighbors_buf(self):
+        if self._neighbors is not None: return self._neighbors
+        cdef _Buffer buf = _new_buffer(True)
+        self.thisptr.neighbors(buf.i)
+        if self._cache:
+            buf.readonly = True
+            self._neighbors = buf
+        return buf
 
     def volume(self):
         "Cell volume"
@@ -136,12 +396,12 @@ cdef class Cell:
     def number_of_edges(self):
         return self.thisptr.number_of_edges()
 
-    # TODO: maybe keep stored some properties instead of recalculating
+    # NOTE: some properties can be stored instead of recalculated, see the cache property
     def centroid(self):
             cdef double cx = 0
             cdef double cy = 0
             cdef double cz = 0
-            self.thisptr.centroid(cx,cy,cz)
+            self._centroid_buf(&cx, &cy, &cz)
             x,y,z = self.pos
             return (cx+x,cy+y,cz+z)
 
@@ -149,7 +409,7 @@ cdef class Cell:
         cdef double cx = 0
         cdef double cy = 0
         cdef double cz = 0
-        self.thisptr.centroid(cx,cy,cz)
+        self._centroid_buf(&cx, &cy, &cz)
         return (cx,cy,cz)
 
     def vertex_orders(self):
@@ -157,25 +417,40 @@ cdef class Cell:
         self.thisptr.vertex_orders(v)
         return v
 
-    def vertices(self):
+    def vertices(self, cbool array=False):
         """A list of all the locations of the vertices of each face.
 
+        Parameters
+        ----------
+        array : bool, optional
+            Return a (n_vertices, 3) NumPy array instead of a list.
+
         Returns
         -------
         A list of 3-tuples of floats. Each tuple corresponds to a single vertex."""
-        cdef vector[double] v
-        self.thisptr.vertices(self.x, self.y, self.z, v)
-        return list(zip(v[::3], v[1::3], v[2::3]))
+        cdef _Buffer buf = self._vertices_buf()
+        if array:
+            import numpy as np
+            return np.asarray(buf) + (self.x, self.y, self.z)
+        return _tuples3(buf.d, self.x, self.y, self.z)
 
-    def vertices_local(self):
+    def vertices_local(self, cbool array=False):
         """A list of all the locations of the vertices of each face in local coordinates (cell pos).
 
+        Parameters
+        ----------
+        array : bool, optional
+            Return a (n_vertices, 3) NumPy array sharing the memory of the cell buffer instead of a list.
+            It is read only when the cell caches its geometry.
+
         Returns
         -------
         A list of 3-tuples of floats. Each tuple corresponds to a single vertex."""
-        cdef vector[double] v
-        self.thisptr.vertices(v)
-        return list(zip(v[::3], v[1::3], v[2::3]))
+        cdef _Buffer buf = self._vertices_buf()
+        if array:
+            import numpy as np
+            return np.asarray(buf)
+        return _tuples3(buf.d)
 
     def vertices_local_centroid(self):
         """A list of all the locations of the vertices of each face in local coordinates (cell centroid).
@@ -184,9 +459,7 @@ cdef class Cell:
         -------
         A list of 3-tuples of floats. Each tuple corresponds to a single vertex."""
         c = self.centroid_local()
-        cdef vector[double] v
-        self.thisptr.vertices(-c[0], -c[1], -c[2], v)
-        return list(zip(v[::3], v[1::3], v[2::3]))
+        return _tuples3(self._vertices_buf().d, -c[0], -c[1], -c[2])
 
     #def vertices_relative(self, x,y,z):
     #    """A list of all the locations of the vertices of each face in relative coordinates.
@@ -202,15 +475,23 @@ cdef class Cell:
     #    self.thisptr.vertices(dx, dy, dz, v)
     #    return list(zip(v[::3], v[1::3], v[2::3]))
 
-    def face_areas(self):
+    def face_areas(self, cbool array=False):
         """A list of the areas of each face.
 
+        Parameters
+        ----------
+        array : bool, optional
+            Return a (n_faces,) NumPy array sharing the memory of the cell buffer instead of a list.
+            It is read only when the cell caches its geometry.
+
         Returns
         -------
         A list of floats. Each inner list corresponds to a face."""
-        cdef vector[double] v
-        self.thisptr.face_areas(v)
-        return v
+        cdef _Buffer buf = self._face_areas_buf()
+        if array:
+            import numpy as np
+            return np.asarray(buf)
+        return buf.d
 
     def face_orders(self):
         """A list of the number of edges per face.
@@ -227,56 +508,93 @@ cdef class Cell:
         self.thisptr.face_freq_table(v)
         return v
 
-    def face_vertices(self):
+    def face_vertices(self, cbool array=False):
         """A list of the indices of the vertices of each face.
 
+        Parameters
+        ----------
+        array : bool, optional
+            Return the faces as flat NumPy arrays ``(indptr, indices)`` instead of a list of lists,
+            the vertices of face ``i`` being ``indices[indptr[i]:indptr[i+1]]``.
+
         Returns
         -------
         A list of lists of ints. Each inner list corresponds to a face, and each index corresponds
         to a vertex from :meth:`vertices`.
         """
 
-        cdef vector[int] v
-        self.thisptr.face_vertices(v)
-
-        mylist = []
-
-        it = iter(v)
-        while True:
-            try:
-                n = next(it)
-            except StopIteration:
-                break
-            mylist.append([next(it) for _ in range(n)])
-
-        return mylist
+        cdef _Buffer buf = self._face_vertices_buf()
+        cdef vector[int] *v = &buf.i
+
+        # each face is stored as its vertex count followed by the indices
+        cdef size_t i = 0, j, n
+        if not array:
+            mylist = []
+            while i < v.size():
+                n = v[0][i]
+                mylist.append([v[0][j] for j in range(i + 1, i + 1 + n)])
+                i += n + 1
+            return mylist
+
+        cdef _Buffer indptr = _new_buffer(True), indices = _new_buffer(True)
+        indptr.i.push_back(0)
+        indices.i.reserve(v.size())
+        while i < v.size():
+            n = v[0][i]
+            for j in range(i + 1, i + 1 + n):
+                indices.i.push_back(v[0][j])
+            indptr.i.push_back(indices.i.size())
+            i += n + 1
+
+        import numpy as np
+        return np.asarray(indptr), np.asarray(indices)
 
     def face_perimeters(self):
         cdef vector[double] v
         self.thisptr.face_perimeters(v)
         return v
 
-    def normals(self):
-        r"""A list of the areas of each face.
+    def normals(self, cbool array=False):
+        r"""A list of the normals of each face.
+
+        Parameters
+        ----------
+        array : bool, optional
+            Return a (n_faces, 3) NumPy array sharing the memory of the cell buffer instead of a list.
+            It is read only when the cell caches its geometry.
 
         Returns
         -------
         A list of 3-tuples of floats. Each tuple corresponds to a face."""
-        cdef vector[double] v
-        self.thisptr.normals(v)
-        return list(zip(v[::3], v[1::3], v[2::3]))
+        cdef _Buffer buf = self._normals_buf()
+        if array:
+            import numpy as np
+            return np.asarray(buf)
+        return _tuples3(buf.d)
 
-    def neighbors(self):
+    def neighbors(self, cbool source=False):
         r"""
         Return a list of the *neighbors* of the current `Cell`.
 
-        This is a list of indices, which correspond to the input points. The exception to this
-        is the walls: walls are numbered -1 to -6, so an index less than 0 in the list of
+        This is a list of indices, which correspond to the container ids of the points. The exception
+        to this is the walls: walls are numbered -1 to -6, so an index less than 0 in the list of
         `neighbors()` indicates that a `Cell` is neighbors with a wall.
+
+        Parameters
+        ----------
+        source : bool, optional
+            Translate the ids into the source index of the points, see :attr:`source_id`. The walls
+            keep their negative ids.
         """
-        cdef vector[int] v
-        self.thisptr.neighbors(v)
-        return v
+        cdef _Buffer buf = self._neighbors_buf()
+        if not source or self._source is None:
+            return buf.i
+        cdef vector[int] translated = buf.i
+        cdef size_t k
+        for k in range(translated.size()):
+            if translated[k] >= 0:
+                translated[k] = self._source[translated[k]]
+        return translated
 
 
     def translate(self, x,y,z):
@@ -284,6 +602,7 @@ cdef class Cell:
         self.y+= y #    which keeps its center at the oiginal particle point
         self.z+= z
         # self.thisptr.translate(x,y,z) # translates only the vertices, plus breaks other methods!
+        self._invalidate()
 
 
     def cut_plane(self, nx,ny,nz, n_lenSq, p_id=0):
@@ -292,13 +611,23 @@ cdef class Cell:
             * should be false when the plane removes the whole volume, but seems like it does not! instead it does nothing to the cell
         """
         # voro++ forces to cut by particle bisector, so double the distance to force the plane to cut at the expected distance
+        self._invalidate()
         assert self.thisptr.nplane(nx,ny,nz, 2.0*n_lenSq, p_id)
 
+    def compact(self):
+        """ Reallocate the memory of the cell to fit exactly its vertices, edges and neighbors
+            * the initial voro++ allocation is sized for large cells (a few hundred KB per cell)
+            * later cuts grow the memory back as needed, see :class:`Container` `compact`
+        """
+        self.thisptr.compact()
+        self._compact = True
+
     def cut_plane_particle(self, px,py,pz, p_id=0):
         """ Cuts the cell by the plane corresponding to the perpendicular bisector of a particle positioned at xyz
             * the cut face will have reference wall id==p_id as neighbour
             * should be false likewise cut_plane, but in this case it is actually trigered by other particles?
         """
+        self._invalidate()
         assert self.thisptr.nplane(px,py,pz, p_id)
 
 
@@ -309,15 +638,1169 @@ cdef class Cell:
         return '<Cell {0}>'.format(self._id)
 
 
+# freed compacted cells kept for reuse by the compute loops, instead of new/delete per cell
+cdef vector[voronoicell_neighbor *] _cell_pool
+cdef size_t _cell_pool_max = 4096
+
+def cell_pool(size=None):
+    """ Get the amount of freed compacted cells kept for reuse, and their maximum (optionally set)
+
+        * new compacted cells take their voro++ cell from the pool, which is then fitted to the
+          computed one, only reallocating the tables out of a factor 2 of their needed size
+        * returns the (pooled, maximum) amounts, before setting a new maximum
+    """
+    global _cell_pool_max
+    cdef voronoicell_neighbor *c
+    current = (_cell_pool.size(), _cell_pool_max)
+    if size is not None:
+        _cell_pool_max = max(int(size), 0)
+        while _cell_pool.size() > _cell_pool_max:
+            c = _cell_pool.back()
+            _cell_pool.pop_back()
+            del c
+    return current
+
+cdef Cell _pooled_cell():
+    """ A compacted :class:`Cell` with the voro++ cell taken from the pool, or a new one """
+    cdef Cell cell = Cell.__new__(Cell)
+    if _cell_pool.empty():
+        cell.thisptr = new voronoicell_neighbor()
+    else:
+        cell.thisptr = _cell_pool.back()
+        _cell_pool.pop_back()
+    cell._compact = True
+    return cell
+
+cdef inline void _set_source(Cell cell, const int[::1] source):
+    """ Set the source index of a computed cell from the map of the container ids, the same id without one """
+    cell._source = source
+    cell._source_id = cell._id if source is None else source[cell._id]
+
+
+CELL_FIELDS = ("volume", "surface_area", "centroid", "n_faces", "n_edges", "max_radius_squared")
+""" Per cell quantities available in the columnar arrays, each one of shape (N,) or (N,3) """
+FACE_FIELDS = ("neighbors", "face_areas", "normals")
+""" Per face quantities available in the columnar arrays, ragged in CSR layout with ``face_indptr`` """
+
+cdef cppclass _FaceBuffer:
+    # per face data gathered by a single thread in computation order, plus its scratch vectors
+    Py_ssize_t gathered
+    vector[int] neighbors
+    vector[double] face_areas
+    vector[double] normals
+    vector[int] v_int
+    vector[double] v_double
+    # triangle mesh of the cells, with vertex indices local to each cell
+    vector[double] mesh_vertices
+    vector[int] mesh_triangles
+    vector[int] mesh_neighbors
+    vector[int] v_faces
+
+cdef class _CellExtractor:
+    """ Extracts the requested quantities of each computed cell into flat arrays indexed by cell id.
+
+        * the per cell arrays are preallocated, the per face data is gathered in computation order
+          and sorted by cell id into a CSR layout on :meth:`finish`
+        * each thread adds cells using its own face buffer (rows of the per cell arrays are disjoint)
+        * with `mesh`, the faces of the cells are also fan triangulated into a single mesh, see :meth:`finish_mesh`
+        * with a `source` map, the neighbors are given by the source index of the points (walls unchanged)
+    """
+    cdef Py_ssize_t N
+    cdef cbool f_volume, f_surface_area, f_centroid, f_n_faces, f_n_edges, f_max_radius_squared
+    cdef cbool f_neighbors, f_face_areas, f_normals, f_faces, f_mesh
+    cdef object arrays
+
+    cdef unsigned char[::1] computed
+    cdef double[:, ::1] pos
+    cdef double[::1] radius
+    cdef double[::1] volume
+    cdef double[::1] surface_area
+    cdef double[:, ::1] centroid
+    cdef int[::1] n_faces
+    cdef int[::1] n_edges
+    cdef double[::1] max_radius_squared
+
+    # the container ids of the neighbors are translated by this map when given
+    cdef cbool f_source
+    cdef const int[::1] source
+
+    cdef vector[_FaceBuffer] buffers
+    cdef vector[int] face_buffer
+    cdef vector[Py_ssize_t] face_start
+    cdef vector[int] mesh_n_vertices
+    cdef vector[int] mesh_n_triangles
+    cdef vector[Py_ssize_t] mesh_vertex_start
+    cdef vector[Py_ssize_t] mesh_triangle_start
+
+    def __init__(self, Py_ssize_t N, fields, int threads=1, cbool mesh=False, const int[::1] source=None):
+        import numpy as np
+        fields = set(fields)
+        unknown = fields.difference(CELL_FIELDS + FACE_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields {sorted(unknown)}, available: {CELL_FIELDS + FACE_FIELDS}")
+
+        self.N = N
+        self.f_volume = "volume" in fields
+        self.f_surface_area = "surface_area" in fields
+        self.f_centroid = "centroid" in fields
+        self.f_n_edges = "n_edges" in fields
+        self.f_max_radius_squared = "max_radius_squared" in fields
+        self.f_neighbors = "neighbors" in fields
+        self.f_face_areas = "face_areas" in fields
+        self.f_normals = "normals" in fields
+        self.f_faces = self.f_neighbors or self.f_face_areas or self.f_normals
+        # the face count is also required to build the CSR layout
+        self.f_n_faces = "n_faces" in fields or self.f_faces
+
+        self.arrays = arrays = {}
+        arrays["computed"] = np.zeros(N, dtype=bool)
+        self.computed = arrays["computed"].view(np.uint8)
+        self.pos = arrays["pos"] = np.zeros((N, 3), dtype=np.float64)
+        self.radius = arrays["radius"] = np.zeros(N, dtype=np.float64)
+        if self.f_volume: self.volume = arrays["volume"] = np.zeros(N, dtype=np.float64)
+        if self.f_surface_area: self.surface_area = arrays["surface_area"] = np.zeros(N, dtype=np.float64)
+        if self.f_centroid: self.centroid = arrays["centroid"] = np.zeros((N, 3), dtype=np.float64)
+        if self.f_n_faces: self.n_faces = arrays["n_faces"] = np.zeros(N, dtype=np.intc)
+        if self.f_n_edges: self.n_edges = arrays["n_edges"] = np.zeros(N, dtype=np.intc)
+        if self.f_max_radius_squared: self.max_radius_squared = arrays["max_radius_squared"] = np.zeros(N, dtype=np.float64)
+
+        self.f_source = source is not None
+        self.source = source
+
+        self.buffers.resize(max(threads, 1))
+        self.f_mesh = mesh
+        if self.f_faces or self.f_mesh:
+            self.face_buffer.resize(N, 0)
+        if self.f_faces:
+            self.face_start.resize(N, 0)
+        if self.f_mesh:
+            self.mesh_n_vertices.resize(N, 0)
+            self.mesh_n_triangles.resize(N, 0)
+            self.mesh_vertex_start.resize(N, 0)
+            self.mesh_triangle_start.resize(N, 0)
+
+    cdef void add(self, voronoicell_neighbor &c, int id, double x, double y, double z, double r, int t=0) noexcept nogil:
+        cdef double cx = 0, cy = 0, cz = 0
+        cdef Py_ssize_t i
+        cdef int n
+        cdef _FaceBuffer *buf = &self.buffers[t]
+        self.computed[id] = 1
+        self.pos[id, 0] = x
+        self.pos[id, 1] = y
+        self.pos[id, 2] = z
+        self.radius[id] = r
+        if self.f_volume: self.volume[id] = c.volume()
+        if self.f_surface_area: self.surface_area[id] = c.surface_area()
+        if self.f_centroid:
+            c.centroid(cx, cy, cz)
+            self.centroid[id, 0] = cx + x
+            self.centroid[id, 1] = cy + y
+            self.centroid[id, 2] = cz + z
+        if self.f_n_edges: self.n_edges[id] = <int>c.number_of_edges()
+        if self.f_max_radius_squared: self.max_radius_squared[id] = c.max_radius_squared()
+
+        if self.f_n_faces: self.n_faces[id] = <int>c.number_of_faces()
+        if self.f_mesh: self.add_mesh(c, id, x, y, z, t)
+        if not self.f_faces: return
+        self.face_buffer[id] = t
+        self.face_start[id] = buf.gathered
+        buf.gathered += self.n_faces[id]
+        if self.f_neighbors:
+            c.neighbors(buf.v_int)
+            for i in range(<Py_ssize_t>buf.v_int.size()):
+                n = buf.v_int[i]
+                if self.f_source and n >= 0: n = self.source[n]
+                buf.neighbors.push_back(n)
+        if self.f_face_areas:
+            c.face_areas(buf.v_double)
+            for i in range(<Py_ssize_t>buf.v_double.size()): buf.face_areas.push_back(buf.v_double[i])
+        if self.f_normals:
+            c.normals(buf.v_double)
+            for i in range(<Py_ssize_t>buf.v_double.size()): buf.normals.push_back(buf.v_double[i])
+
+    cdef void add_mesh(self, voronoicell_neighbor &c, int id, double x, double y, double z, int t) noexcept nogil:
+        """ Gather the global vertices of the cell and the fan triangulation of its faces, each with the face neighbor """
+        cdef _FaceBuffer *buf = &self.buffers[t]
+        cdef Py_ssize_t i, j, n, f = 0
+        self.face_buffer[id] = t
+        self.mesh_vertex_start[id] = buf.mesh_vertices.size() // 3
+        self.mesh_triangle_start[id] = buf.mesh_neighbors.size()
+
+        c.vertices(x, y, z, buf.v_double)
+        for i in range(<Py_ssize_t>buf.v_double.size()): buf.mesh_vertices.push_back(buf.v_double[i])
+        self.mesh_n_vertices[id] = <int>(buf.v_double.size() // 3)
+
+        # each face is stored as its vertex count followed by the indices, in the order of the neighbors,
+        # clockwise seen from the outside of the cell -> reversed into counter clockwise triangles
+        c.neighbors(buf.v_int)
+        c.face_vertices(buf.v_faces)
+        i = 0
+        while i < <Py_ssize_t>buf.v_faces.size():
+            n = buf.v_faces[i]
+            for j in range(2, n):
+                buf.mesh_triangles.push_back(buf.v_faces[i + 1])
+                buf.mesh_triangles.push_back(buf.v_faces[i + j + 1])
+                buf.mesh_triangles.push_back(buf.v_faces[i + j])
+                buf.mesh_neighbors.push_back(buf.v_int[f])
+            i += n + 1
+            f += 1
+        self.mesh_n_triangles[id] = <int>(buf.mesh_neighbors.size() - self.mesh_triangle_start[id])
+
+    cdef finish_mesh(self):
+        """ Add the single triangle mesh of the cells to the arrays, with the cells sorted by id.
+
+            * ``mesh_vertices`` (V,3) and ``mesh_triangles`` (T,3), indexing the vertices
+            * ``mesh_cell`` and ``mesh_neighbors`` (T,), the cell of each triangle and its face neighbor
+        """
+        import numpy as np
+        arrays = self.arrays
+        cdef Py_ssize_t id, k, start, dst
+        vertex_offset = np.zeros(self.N + 1, dtype=np.intp)
+        triangle_offset = np.zeros(self.N + 1, dtype=np.intp)
+        cdef Py_ssize_t[::1] v_offset = vertex_offset, t_offset = triangle_offset
+        for id in range(self.N):
+            v_offset[id + 1] = v_offset[id] + self.mesh_n_vertices[id]
+            t_offset[id + 1] = t_offset[id] + self.mesh_n_triangles[id]
+
+        cdef double[:, ::1] vertices = np.empty((vertex_offset[-1], 3), dtype=np.float64)
+        cdef int[:, ::1] triangles = np.empty((triangle_offset[-1], 3), dtype=np.intc)
+        cdef int[::1] cell = np.empty(triangle_offset[-1], dtype=np.intc)
+        cdef int[::1] neighbors = np.empty(triangle_offset[-1], dtype=np.intc)
+
+        cdef _FaceBuffer *buf
+        with nogil:
+            for id in range(self.N):
+                buf = &self.buffers[self.face_buffer[id]]
+                start = self.mesh_vertex_start[id]
+                dst = v_offset[id]
+                for k in range(self.mesh_n_vertices[id]):
+                    vertices[dst + k, 0] = buf.mesh_vertices[3 * (start + k)]
+                    vertices[dst + k, 1] = buf.mesh_vertices[3 * (start + k) + 1]
+                    vertices[dst + k, 2] = buf.mesh_vertices[3 * (start + k) + 2]
+                start = self.mesh_triangle_start[id]
+                dst = t_offset[id]
+                for k in range(self.mesh_n_triangles[id]):
+                    triangles[dst + k, 0] = buf.mesh_triangles[3 * (start + k)] + <int>v_offset[id]
+                    triangles[dst + k, 1] = buf.mesh_triangles[3 * (start + k) + 1] + <int>v_offset[id]
+                    triangles[dst + k, 2] = buf.mesh_triangles[3 * (start + k) + 2] + <int>v_offset[id]
+                    cell[dst + k] = <int>id
+                    neighbors[dst + k] = buf.mesh_neighbors[start + k]
+
+        arrays["mesh_vertices"] = vertices.base
+        arrays["mesh_triangles"] = triangles.base
+        arrays["mesh_cell"] = cell.base
+        arrays["mesh_neighbors"] = neighbors.base
+
+    def finish(self):
+        """ Returns the dict of arrays, with the per face data sorted by cell id """
+        import numpy as np
+        arrays = self.arrays
+        if self.f_mesh:
+            self.finish_mesh()
+        if not self.f_faces:
+            self.buffers.clear()
+            self.buffers.shrink_to_fit()
+            return arrays
+
+        face_indptr = np.zeros(self.N + 1, dtype=np.int64)
+        np.cumsum(arrays["n_faces"], out=face_indptr[1:])
+        arrays["face_indptr"] = face_indptr
+        F = face_indptr[-1]
+
+        cdef Py_ssize_t[::1] indptr = face_indptr
+        cdef int[::1] n_faces = self.n_faces
+        cdef int[::1] neighbors
+        cdef double[::1] face_areas
+        cdef double[:, ::1] normals
+        if self.f_neighbors: neighbors = arrays["neighbors"] = np.empty(F, dtype=np.intc)
+        if self.f_face_areas: face_areas = arrays["face_areas"] = np.empty(F, dtype=np.float64)
+        if self.f_normals: normals = arrays["normals"] = np.empty((F, 3), dtype=np.float64)
+
+        cdef Py_ssize_t id, f, start, dst
+        cdef _FaceBuffer *buf
+        with nogil:
+            for id in range(self.N):
+                buf = &self.buffers[self.face_buffer[id]]
+                start = self.face_start[id]
+                dst = indptr[id]
+                for f in range(n_faces[id]):
+                    if self.f_neighbors: neighbors[dst + f] = buf.neighbors[start + f]
+                    if self.f_face_areas: face_areas[dst + f] = buf.face_areas[start + f]
+                    if self.f_normals:
+                        normals[dst + f, 0] = buf.normals[3 * (start + f)]
+                        normals[dst + f, 1] = buf.normals[3 * (start + f) + 1]
+                        normals[dst + f, 2] = buf.normals[3 * (start + f) + 2]
+
+        # release the gathered buffers
+        self.buffers.clear()
+        self.buffers.shrink_to_fit()
+        return arrays
+
+
+ctypedef fused container_t:
+    container
+    container_poly
+
+ctypedef fused any_container_t:
+    container
+    container_poly
+    container_periodic
+    container_periodic_poly
+
+cdef void _compute_blocks(container_t *con, int t, int threads, int chunk,
+                          voronoicell_neighbor **cells, _CellExtractor ext, cbool compact) noexcept nogil:
+    """ Compute the cells of the t-th of the interleaved chunks of blocks, using its own worker.
+
+        * the cells are computed into ``cells[id]`` when given, otherwise into a reused scratch
+          cell whose data is added to the extractor with the thread face buffer
+        * compacted cells are computed into the scratch cell too, then copied fitted to ``cells[id]``
+        * cells that could not be computed get a null pointer
+    """
+    cdef compute_worker[container_t] *worker = new compute_worker[container_t](dereference(con))
+    cdef voronoicell_neighbor *scratch = new voronoicell_neighbor()
+    cdef voronoicell_neighbor *c
+    cdef int b0 = t * chunk, ijk, q, pid
+    cdef double *pp
+    cdef double r = 0
+
+    while b0 < con.nxyz:
+        for ijk in range(b0, min(b0 + chunk, con.nxyz)):
+            for q in range(con.co[ijk]):
+                pid = con.id[ijk][q]
+                c = cells[pid] if cells != NULL and not compact else scratch
+                if not worker.compute_cell(dereference(c), ijk, q):
+                    if cells != NULL: cells[pid] = NULL
+                    continue
+                if cells != NULL and compact:
+                    cells[pid].copy_compact(dereference(scratch))
+                if ext is not None:
+                    pp = con.p[ijk] + con.ps * q
+                    if con.ps == 4: r = pp[3]
+                    ext.add(dereference(c), pid, pp[0], pp[1], pp[2], r, t)
+        b0 += threads * chunk
+
+    del scratch
+    del worker
+
+cdef class _BlocksTask:
+    """ Callable computing the t-th interleaved chunks of blocks of a container, see :func:`_compute_blocks` """
+    cdef void *con
+    cdef cbool poly
+    cdef int threads, chunk
+    cdef voronoicell_neighbor **cells
+    cdef _CellExtractor ext
+    cdef cbool compact
+
+    def __call__(self, int t):
+        with nogil:
+            if self.poly:
+                _compute_blocks(<container_poly *>self.con, t, self.threads, self.chunk, self.cells, self.ext, self.compact)
+            else:
+                _compute_blocks(<container *>self.con, t, self.threads, self.chunk, self.cells, self.ext, self.compact)
+
+cdef _run_threads(container_t *con, int threads, voronoicell_neighbor **cells, _CellExtractor ext,
+                  cbool compact=False):
+    """ Compute the cells over the container blocks split into interleaved chunks between threads """
+    from concurrent.futures import ThreadPoolExecutor
+
+    cdef _BlocksTask task = _BlocksTask()
+    task.con = con
+    task.poly = container_t is container_poly
+    task.threads = threads
+    # several small chunks per thread to balance the load between regions with different density
+    task.chunk = max(1, con.nxyz // (threads * 8))
+    task.cells = cells
+    task.ext = ext
+    task.compact = compact
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(task, range(threads)))
+
+
+cdef list _get_cells_threads(container_t *con, int threads, cbool compact=False, const int[::1] source=None):
+    """ Compute the list of :class:`Cell` by id using several threads, see :func:`_run_threads`
+
+        * compacted cells are taken from the pool, and fitted to each computed cell
+        * the cells get their source index from the `source` map, see :func:`_set_source`
+    """
+    cdef int N = con.total_particles()
+    cdef list cells = [_pooled_cell() if compact else Cell() for _ in range(N)]
+    cdef vector[voronoicell_neighbor *] ptrs
+    cdef Cell cell
+    for cell in cells:
+        ptrs.push_back(cell.thisptr)
+
+    _run_threads(con, threads, ptrs.data(), <_CellExtractor>None, compact)
+
+    # the cells that could not be computed have been nulled, the rest get their particle info
+    cdef int ijk, q, pid, vcells_left = 0
+    cdef double *pp
+    for ijk in range(con.nxyz):
+        for q in range(con.co[ijk]):
+            pid = con.id[ijk][q]
+            if ptrs[pid] == NULL:
+                cells[pid] = None
+                vcells_left += 1
+                continue
+            cell = cells[pid]
+            cell._id = pid
+            _set_source(cell, source)
+            pp = con.p[ijk] + con.ps * q
+            cell.x, cell.y, cell.z = pp[0], pp[1], pp[2]
+            cell.r = pp[3] if con.ps == 4 else 0
+
+    if vcells_left != 0:
+        msg = f"Computation incomplete: there are cells left ({vcells_left} / {N})"
+        if EXCECT_MISSING_CELLS: raise ValueError(msg)
+        else: print(msg)
+    return cells
+
+cdef void _locate(container_t *con, vector[int] &blk, vector[int] &idx) noexcept nogil:
+    """ Fill the block, and the index within it, of each particle id """
+    cdef int ijk, q, pid
+    blk.assign(con.total_particles(), -1)
+    idx.assign(con.total_particles(), -1)
+    for ijk in range(con.nxyz):
+        for q in range(con.co[ijk]):
+            pid = con.id[ijk][q]
+            blk[pid] = ijk
+            idx[pid] = q
+
+cdef inline int _block(double v, double a, double sp, int n, cbool periodic) noexcept nogil:
+    """ Block index along an axis like voro++ put_locate_block, -1 when outside a non periodic axis """
+    cdef int i = <int>floor((v - a) * sp)
+    if i < 0 or i >= n:
+        if not periodic: return -1
+        i = i % n
+        if i < 0: i += n
+    return i
+
+cdef Py_ssize_t _move_particles(container_t *con, const double[:, ::1] points, const double[::1] radii,
+                                unsigned char[::1] moved) noexcept nogil:
+    """ Move the particles (by id) to new positions in place, relocating them between blocks when needed.
+        * periodic coordinates are wrapped, the unchanged particles are left untouched
+        * the moved ones get flagged, radii are only used (and compared) by poly containers
+        * returns -1, or the first id outside the container or ON its upper limits (then nothing is moved),
+          or not put in its block
+    """
+    cdef Py_ssize_t N = points.shape[0], n
+    cdef double ax = con.ax, ay = con.ay, az = con.az
+    cdef double lx = con.bx - ax, ly = con.by - ay, lz = con.bz - az
+    cdef double x, y, z, r = 0
+    cdef double *pp
+    cdef int ijk, nijk, q, i, j, k, last, pid
+
+    # validate everything before modifying the blocks: a point ON an upper limit passes point_inside,
+    # but has no block to be put in
+    for n in range(N):
+        x = _wrap(points[n, 0], ax, lx, con.xperiodic)
+        y = _wrap(points[n, 1], ay, ly, con.yperiodic)
+        z = _wrap(points[n, 2], az, lz, con.zperiodic)
+        if not con.point_inside(x, y, z): return n
+        if (_block(x, ax, con.xsp, con.nx, con.xperiodic) < 0 or _block(y, ay, con.ysp, con.ny, con.yperiodic) < 0
+                or _block(z, az, con.zsp, con.nz, con.zperiodic) < 0):
+            return n
+
+    cdef vector[int] blk, idx
+    _locate(con, blk, idx)
+    for n in range(N):
+        x = _wrap(points[n, 0], ax, lx, con.xperiodic)
+        y = _wrap(points[n, 1], ay, ly, con.yperiodic)
+        z = _wrap(points[n, 2], az, lz, con.zperiodic)
+        if container_t is container_poly:
+            r = radii[n]
+
+        ijk, q = blk[n], idx[n]
+        pp = con.p[ijk] + con.ps * q
+        if pp[0] == x and pp[1] == y and pp[2] == z and (con.ps == 3 or pp[3] == r):
+            continue
+        moved[n] = 1
+
+        i = _block(x, ax, con.xsp, con.nx, con.xperiodic)
+        j = _block(y, ay, con.ysp, con.ny, con.yperiodic)
+        k = _block(z, az, con.zsp, con.nz, con.zperiodic)
+        if i < 0 or j < 0 or k < 0: return n
+        nijk = i + con.nx * j + con.nxy * k
+
+        # same block: update in place
+        if nijk == ijk:
+            pp[0], pp[1], pp[2] = x, y, z
+            if container_t is container_poly:
+                pp[3] = r
+                if r > con.max_radius: con.max_radius = r
+            continue
+
+        # other block: fill the hole with the last particle of the block and put it in the new one
+        last = con.co[ijk] - 1
+        if q != last:
+            pid = con.id[ijk][last]
+            con.id[ijk][q] = pid
+            for i in range(con.ps):
+                pp[i] = con.p[ijk][con.ps * last + i]
+            idx[pid] = q
+        con.co[ijk] -= 1
+
+        if container_t is container_poly:
+            if not con.put(n, x, y, z, r): return n
+        else:
+            if not con.put(n, x, y, z): return n
+        if con.id[nijk][con.co[nijk] - 1] != n: return n
+        blk[n], idx[n] = nijk, con.co[nijk] - 1
+    return -1
+
+cdef _compute_ids(container_t *con, cells, const Py_ssize_t[::1] ids, cbool compact=False,
+                  const int[::1] source=None):
+    """ Recompute the cells of the given ids in place into the :class:`Cell` of a list by id.
+        * missing cells (None) are created, the ones that can not be computed are set to None
+        * compacted cells are computed into a scratch cell, then copied fitted into the targets
+        * returns the amount of cells that could not be computed
+    """
+    cdef vector[int] blk, idx
+    _locate(con, blk, idx)
+
+    cdef Py_ssize_t n, N = ids.shape[0]
+    cdef vector[voronoicell_neighbor *] ptrs
+    cdef list targets = []
+    cdef Cell cell
+    for n in range(N):
+        cell = cells[ids[n]]
+        if cell is None: cell = _pooled_cell() if compact else Cell()
+        targets.append(cell)
+        ptrs.push_back(cell.thisptr)
+
+    cdef voronoicell_neighbor *scratch = new voronoicell_neighbor() if compact else NULL
+    with nogil:
+        for n in range(N):
+            if not con.compute_cell(dereference(scratch if compact else ptrs[n]), blk[ids[n]], idx[ids[n]]):
+                ptrs[n] = NULL
+            elif compact:
+                ptrs[n].copy_compact(dereference(scratch))
+    del scratch
+
+    cdef int pid, failed = 0
+    cdef double *pp
+    for n in range(N):
+        pid = ids[n]
+        if ptrs[n] == NULL:
+            cells[pid] = None
+            failed += 1
+            continue
+        cell = targets[n]
+        cell._invalidate()
+        cell._id = pid
+        _set_source(cell, source)
+        pp = con.p[blk[pid]] + con.ps * idx[pid]
+        cell.x, cell.y, cell.z = pp[0], pp[1], pp[2]
+        cell.r = pp[3] if con.ps == 4 else 0
+        cells[pid] = cell
+    return failed
+
+
+# lines of the text imports, longer ones are rejected
+cdef enum: TEXT_LINE_SIZE = 1024
+
+cdef int _read_text(FILE *fp, vector[int] &ids, vector[double] &values, int cols, Py_ssize_t *line_no) noexcept nogil:
+    """ Parse the rows ``id x y z`` (``id x y z r`` with 4 `cols`) of a file like voro++ import.
+        * the rows are parsed with strtol/strtod, faster than the fscanf of voro++, blank ones are skipped
+        * the file ids and the values of each row are appended to the vectors
+        * returns 0 when the whole file is read, otherwise `line_no` is the (1-based) line that failed with:
+          1 when it is not a particle, 2 when it has more values than `cols` and 3 when it does not fit the buffer
+    """
+    cdef int i, k
+    cdef double v
+    cdef size_t length
+    cdef char line[TEXT_LINE_SIZE]
+    cdef char *s
+    cdef char *end
+    line_no[0] = 0
+    while fgets(line, sizeof(line), fp) != NULL:
+        line_no[0] += 1
+        # a line longer than the buffer would be read as several rows
+        length = strlen(line)
+        if length == sizeof(line) - 1 and line[length - 1] != c'\n' and not feof(fp): return 3
+        s = line
+        while s[0] == c' ' or s[0] == c'\t' or s[0] == c'\r' or s[0] == c'\n': s += 1
+        if s[0] == 0: continue
+        i = <int>strtol(s, &end, 10)
+        if end == s: return 1
+        for k in range(cols):
+            s = end
+            v = strtod(s, &end)
+            if end == s: return 1
+            values.push_back(v)
+        s = end
+        while s[0] == c' ' or s[0] == c'\t' or s[0] == c'\r' or s[0] == c'\n': s += 1
+        if s[0] != 0: return 2
+        ids.push_back(i)
+    return 0
+
+def read_text(path, int cols=3):
+    """ Read the particles of a text file in the voro++ import format, see :func:`_read_text`
+        * returns the (N,) file ids and the (N,cols) values, to be inserted like any other array
+        * raises ValueError on a row that is not a particle, has more values or is too long, instead of misparsing it
+    """
+    import os
+    import numpy as np
+    assert cols in (3, 4), "the rows hold x y z, or x y z r"
+    cdef bytes fspath = os.fsencode(path)
+    cdef FILE *fp = fopen(fspath, "r")
+    if fp == NULL:
+        raise FileNotFoundError(f"Could not open {path}")
+
+    cdef _Buffer ids = _new_buffer(True), values = _new_buffer(False, cols)
+    cdef Py_ssize_t line_no
+    cdef int error
+    with nogil:
+        error = _read_text(fp, ids.i, values.d, cols, &line_no)
+        fclose(fp)
+    if error == 1:
+        raise ValueError(f"Could not import line {line_no} of {path}: not a particle")
+    if error == 2:
+        raise ValueError(f"Could not import line {line_no} of {path}: expected {cols} values after the id")
+    if error == 3:
+        raise ValueError(f"Could not import line {line_no} of {path}: longer than {TEXT_LINE_SIZE - 1} characters")
+    return np.asarray(ids), np.asarray(values).reshape(-1, cols)
+
+cdef FILE *_open_output(path) except NULL:
+    """ Open the file at `path` for writing with a large buffer, or an anonymous temporary file when None """
+    import os
+    cdef bytes fspath
+    cdef FILE *fp
+    if path is None:
+        fp = tmpfile()
+    else:
+        fspath = os.fsencode(path)
+        fp = fopen(fspath, "w")
+    if fp == NULL:
+        raise OSError(f"Could not open {'a temporary file' if path is None else path} for writing")
+    setvbuf(fp, NULL, _IOFBF, 1 << 20)
+    return fp
+
+cdef _close_output(FILE *fp, fileobj):
+    """ Close the output file, when given a binary python file object the output is copied to it in chunks first """
+    cdef bytearray chunk
+    cdef char *buf
+    cdef size_t n, size = 1 << 20
+    try:
+        if fileobj is not None:
+            fflush(fp)
+            rewind(fp)
+            chunk = bytearray(size)
+            buf = chunk
+            view = memoryview(chunk)
+            while True:
+                with nogil:
+                    n = fread(buf, 1, size, fp)
+                if n == 0: break
+                fileobj.write(view[:n])
+    finally:
+        if fclose(fp) != 0:
+            raise OSError("Could not write the custom output")
+
+cdef Py_ssize_t _stream_batch(container_t *con, c_loop_all *vl, voronoicell_neighbor *c,
+                              _CellExtractor ext, int[::1] ids, cbool *more) noexcept nogil:
+    """ Continue the walk of the loop, computing up to a batch of cells into the same reused cell.
+        * the rows of the extractor and the container ids are in computation order
+        * returns the amount of cells of the batch, `more` is cleared at the end of the loop
+    """
+    cdef Py_ssize_t k = 0
+    cdef int pid
+    cdef double x, y, z, r = 0
+    while more[0] and k < ids.shape[0]:
+        if con.compute_cell(dereference(c), dereference(vl)):
+            if container_t is container_poly:
+                vl.pos(pid, x, y, z, r)
+            else:
+                pid = vl.pid()
+                vl.pos(x, y, z)
+            ids[k] = pid
+            ext.add(dereference(c), k, x, y, z, r)
+            k += 1
+        more[0] = vl.inc()
+    return k
+
+def _batch_arrays(arrays, ids, Py_ssize_t k):
+    """ Trim the dict of arrays of a batch of cells to its first k rows, adding their container ids as "id" """
+    import numpy as np
+    for key in ("computed", "pos", "radius") + CELL_FIELDS:
+        if key in arrays: arrays[key] = arrays[key][:k]
+    if "face_indptr" in arrays:
+        arrays["face_indptr"] = arrays["face_indptr"][:k + 1]
+    arrays["id"] = np.asarray(ids)[:k]
+    return arrays
+
+cdef c_loop_subset *_new_subset_loop(container_base *con, sphere, box) except NULL:
+    """ Loop over the particles inside a sphere (x,y,z,r) or a box ((x0,y0,z0), (x1,y1,z1)) """
+    cdef c_loop_subset *vl = new c_loop_subset(dereference(con))
+    if sphere is not None:
+        x, y, z, r = sphere
+        vl.setup_sphere(x, y, z, r, True)
+    else:
+        (x0, y0, z0), (x1, y1, z1) = box
+        vl.setup_box(x0, x1, y0, y1, z0, z1, True)
+    return vl
+
+cdef vector[pair[int, pair[int, int]]] _subset(container_t *con, c_loop_subset *vl) noexcept nogil:
+    """ The (id, (block, index)) of the particles visited by a subset loop, sorted and once per id
+        * periodic regions may visit the same particle through several images
+    """
+    cdef vector[pair[int, pair[int, int]]] found
+    if vl.start():
+        while True:
+            found.push_back(pair[int, pair[int, int]](vl.pid(), pair[int, int](vl.ijk, vl.q)))
+            if not vl.inc(): break
+    sort(found.begin(), found.end())
+
+    cdef size_t i, n = 0
+    for i in range(found.size()):
+        if n == 0 or found[i].first != found[n - 1].first:
+            found[n] = found[i]
+            n += 1
+    found.resize(n)
+    return found
+
+cdef _subset_ids(container_t *con, sphere, box):
+    """ Sorted (M,) ids of the particles inside a sphere or a box, see :func:`_new_subset_loop` """
+    import numpy as np
+    cdef c_loop_subset *vl = _new_subset_loop(<container_base *>con, sphere, box)
+    cdef vector[pair[int, pair[int, int]]] found
+    with nogil:
+        found = _subset(con, vl)
+    del vl
+
+    ids = np.empty(found.size(), dtype=np.intp)
+    cdef Py_ssize_t[::1] v = ids
+    cdef size_t i
+    for i in range(found.size()):
+        v[i] = found[i].first
+    return ids
+
+cdef list _get_cells_subset(container_t *con, sphere, box, const int[::1] source=None):
+    """ Compute only the :class:`Cell` of the particles inside a sphere or a box, sorted by id
+        * the cells that can not be computed are skipped
+    """
+    cdef c_loop_subset *vl = _new_subset_loop(<container_base *>con, sphere, box)
+    cdef vector[pair[int, pair[int, int]]] found
+    with nogil:
+        found = _subset(con, vl)
+    del vl
+
+    cdef list cells = [Cell() for _ in range(found.size())]
+    cdef vector[voronoicell_neighbor *] ptrs
+    cdef Cell cell
+    for cell in cells:
+        ptrs.push_back(cell.thisptr)
+
+    cdef size_t i
+    with nogil:
+        for i in range(found.size()):
+            if not con.compute_cell(ptrs[i][0], found[i].second.first, found[i].second.second):
+                ptrs[i] = NULL
+
+    cdef list computed = []
+    cdef double *pp
+    for i in range(found.size()):
+        if ptrs[i] == NULL: continue
+        cell = cells[i]
+        cell._id = found[i].first
+        _set_source(cell, source)
+        pp = con.p[found[i].second.first] + con.ps * found[i].second.second
+        cell.x, cell.y, cell.z = pp[0], pp[1], pp[2]
+        cell.r = pp[3] if con.ps == 4 else 0
+        computed.append(cell)
+    return computed
+
+
+cdef void _find_cells(container_t *con, const double[:, ::1] points, int[::1] ids) noexcept nogil:
+    """ Fill the id of the particle whose cell contains each point, or -1 when there is none
+        * periodic coordinates are remapped by voro++, walls are not considered
+    """
+    cdef Py_ssize_t n
+    cdef double rx, ry, rz
+    cdef int pid
+    for n in range(points.shape[0]):
+        if con.find_voronoi_cell(points[n, 0], points[n, 1], points[n, 2], rx, ry, rz, pid):
+            ids[n] = pid
+        else:
+            ids[n] = -1
+
+
+cdef void _ghost_cells(container_t *con, const double[:, ::1] points, const double[::1] radii,
+                       _CellExtractor ext) noexcept nogil:
+    """ Compute the cell that a particle would have at each point into a single reused cell.
+        * each ghost is temporarily added to its block, so the container can not be used concurrently
+        * periodic coordinates are wrapped, ghosts outside the container are left as not computed
+        * radii are only used by poly containers
+    """
+    cdef voronoicell_neighbor *c = new voronoicell_neighbor()
+    cdef double ax = con.ax, ay = con.ay, az = con.az
+    cdef double lx = con.bx - ax, ly = con.by - ay, lz = con.bz - az
+    cdef double x, y, z, r = 0
+    cdef Py_ssize_t n
+    cdef cbool computed
+    for n in range(points.shape[0]):
+        x = _wrap(points[n, 0], ax, lx, con.xperiodic)
+        y = _wrap(points[n, 1], ay, ly, con.yperiodic)
+        z = _wrap(points[n, 2], az, lz, con.zperiodic)
+        if not con.point_inside(x, y, z):
+            continue
+        if container_t is container_poly:
+            r = radii[n]
+            computed = con.compute_ghost_cell(c[0], x, y, z, r)
+        else:
+            computed = con.compute_ghost_cell(c[0], x, y, z)
+        if computed:
+            ext.add(c[0], n, x, y, z, r)
+    del c
+
+
+# The compute core shared by Container and ContainerPoly: each function is specialized at compile time for
+# both containers, so the radius only differs in the few `container_t is container_poly` branches and the
+# classes are thin typed wrappers around their container
+
+cdef Py_ssize_t _put_points(container_t *con, const double[:, :] points, const double[:] radii,
+                            const unsigned char *accept, cbool inside, unsigned char[::1] inserted) noexcept nogil:
+    """ Insert the points inside the container (or its walls) with sequential ids, wrapping periodic coordinates.
+        * the inserted points get flagged, radii are only used by poly containers
+        * only the points flagged in `accept` are considered when given, and without `inside` these
+          skip the voro++ point_inside test (which evaluates every wall on every point)
+        * returns -1, or the first point that passed point_inside but failed put (e.g. ON a wall)
+    """
+    cdef double ax = con.ax, ay = con.ay, az = con.az
+    cdef double lx = con.bx - ax, ly = con.by - ay, lz = con.bz - az
+    cdef cbool px = con.xperiodic, py = con.yperiodic, pz = con.zperiodic
+    cdef double x, y, z
+    cdef Py_ssize_t n
+    cdef int idx = 0
+    cdef cbool done
+
+    for n in range(points.shape[0]):
+        x = _wrap(points[n, 0], ax, lx, px)
+        y = _wrap(points[n, 1], ay, ly, py)
+        z = _wrap(points[n, 2], az, lz, pz)
+        if accept != NULL and not accept[n]:
+            continue
+        if inside and not con.point_inside(x, y, z):
+            continue
+        if container_t is container_poly:
+            done = con.put(idx, x, y, z, radii[n])
+        else:
+            done = con.put(idx, x, y, z)
+        if not done:
+            return n
+        inserted[n] = 1
+        idx += 1
+    return -1
+
+cdef _put_array(container_t *con, const double[:, :] points, const double[:] radii, accept, cbool inside):
+    """ Insert all the (N,3) points in a single loop without the GIL, see :func:`_put_points`
+        * `accept` an optional (N,) boolean mask of the points to consider, e.g. from a vectorized pre-filter
+        * returns a (N,) boolean mask of the inserted points
+    """
+    import numpy as np
+    assert points.shape[1] == 3, "points must have shape (N,3)"
+    if container_t is container_poly:
+        assert radii.shape[0] == points.shape[0], "radii must have shape (N,)"
+
+    mask = np.zeros(points.shape[0], dtype=bool)
+    cdef unsigned char[::1] m = mask.view(np.uint8)
+    cdef const unsigned char[::1] a
+    cdef const unsigned char *accepted = NULL
+    if accept is not None:
+        a = np.ascontiguousarray(accept, dtype=bool).view(np.uint8)
+        assert a.shape[0] == points.shape[0], "accept must have shape (N,)"
+        if a.shape[0] > 0: accepted = &a[0]
+
+    cdef Py_ssize_t failed
+    with nogil:
+        failed = _put_points(con, points, radii, accepted, inside, m)
+    if failed >= 0:
+        raise AssertionError(f"Could not put point {failed} at {tuple(points[failed])}: point ON the container walls?")
+    return mask
+
+cdef _move_array(container_t *con, const double[:, ::1] points, const double[::1] radii):
+    """ Move the particles (by id, shape (N,3)) to new positions in place, see :func:`_move_particles`
+        * returns a (N,) boolean mask of the moved particles
+    """
+    import numpy as np
+    assert points.shape[0] == con.total_particles() and points.shape[1] == 3, "points must have shape (N,3)"
+    if container_t is container_poly:
+        assert radii.shape[0] == points.shape[0], "radii must have shape (N,)"
+
+    moved = np.zeros(points.shape[0], dtype=bool)
+    cdef unsigned char[::1] m = moved.view(np.uint8)
+    cdef Py_ssize_t failed
+    with nogil:
+        failed = _move_particles(con, points, radii, m)
+    if failed >= 0:
+        raise AssertionError(f"Could not move particle {failed} to {tuple(points[failed])}: point OUT/ON the container walls?")
+    return moved
+
+cdef _add_walls(container_t *con, vector[wall *] &owned, str kind, const double[:, ::1] walls, const int[::1] ids):
+    """ Add a (W,4) array of planes or spheres, or a (W,7) array of cylinders or cones, with their (W,) ids
+        * the wall objects are appended to `owned`, to be deleted along the container
+    """
+    cdef Py_ssize_t n, cols = 4 if kind in ("plane", "sphere") else 7
+    assert kind in ("plane", "sphere", "cylinder", "cone"), f"unknown wall kind {kind}"
+    assert walls.shape[1] == cols, f"{kind} walls must have shape (W,{cols})"
+    assert ids.shape[0] == walls.shape[0], "ids must have shape (W,)"
+    # only negative id, and over -6 reserved for bounding box walls -> -10 for rounding
+    for n in range(ids.shape[0]):
+        assert ids[n] <= -10
+
+    cdef wall *wall_ptr
+    owned.reserve(owned.size() + walls.shape[0])
+    for n in range(walls.shape[0]):
+        if kind == "plane":
+            # atm wall_plane is not declared as derived from wall
+            wall_ptr = <wall *>new wall_plane(walls[n, 0], walls[n, 1], walls[n, 2], walls[n, 3], ids[n])
+        elif kind == "sphere":
+            wall_ptr = new wall_sphere(walls[n, 0], walls[n, 1], walls[n, 2], walls[n, 3], ids[n])
+        elif kind == "cylinder":
+            wall_ptr = new wall_cylinder(walls[n, 0], walls[n, 1], walls[n, 2],
+                                         walls[n, 3], walls[n, 4], walls[n, 5], walls[n, 6], ids[n])
+        else:
+            wall_ptr = new wall_cone(walls[n, 0], walls[n, 1], walls[n, 2],
+                                     walls[n, 3], walls[n, 4], walls[n, 5], walls[n, 6], ids[n])
+        owned.push_back(wall_ptr)
+        con.add_wall(wall_ptr)
+
+cdef void _delete_walls(vector[wall *] &owned) noexcept:
+    """ The container only keeps pointers to the walls (virtual destructor) """
+    cdef wall *w
+    for w in owned:
+        del w
+    owned.clear()
+
+cdef inline void _loop_pos(container_t *con, c_loop_all *vl, int &pid, double &x, double &y, double &z,
+                           double &r) noexcept nogil:
+    """ The id, position and radius (0 for mono containers) of the current particle of the loop """
+    if container_t is container_poly:
+        vl.pos(pid, x, y, z, r)
+    else:
+        pid = vl.pid()
+        vl.pos(x, y, z)
+        r = 0
+
+cdef list _get_cells(container_t *con, int threads, cbool compact, const int[::1] source):
+    """ Compute the list of :class:`Cell` by id along a c_loop_all walk, see :func:`_get_cells_threads`
+        * compacted cells are computed into a scratch cell, then copied fitted into pooled cells
+        * the cells get their source index from the `source` map, see :func:`_set_source`
+    """
+    if threads > 1:
+        return _get_cells_threads(con, threads, compact, source)
+
+    cdef int total = con.total_particles()
+    cdef int vcells_left = total
+    if vcells_left == 0:
+        return []
+
+    cdef c_loop_all *vl = new c_loop_all(dereference(<container_base *>con))
+    if not vl.start():
+        del vl
+        raise ValueError("Computation failed: failed to start loop")
+
+    mylist = [None] * vcells_left
+    cdef voronoicell_neighbor *scratch = new voronoicell_neighbor() if compact else NULL
+    cdef Cell cell = None if compact else Cell()
+    while True:
+        if con.compute_cell(dereference(scratch if compact else cell.thisptr), dereference(vl)):
+            if compact:
+                cell = _pooled_cell()
+                cell.thisptr.copy_compact(dereference(scratch))
+            _loop_pos(con, vl, cell._id, cell.x, cell.y, cell.z, cell.r)
+
+            assert cell._id < total, "Cell id %s larger than total %s" % (cell._id, total)
+            _set_source(cell, source)
+            mylist[cell._id] = cell
+
+            vcells_left -= 1
+            if not compact: cell = Cell()
+        if not vl.inc(): break
+
+    del vl
+    del scratch
+
+    if vcells_left != 0:
+        msg = f"Computation incomplete: there are cells left ({vcells_left} / {total})"
+        if EXCECT_MISSING_CELLS: raise ValueError(msg)
+        else: print(msg)
+    return mylist
+
+cdef dict _get_arrays(container_t *con, fields, int threads, cbool mesh, source):
+    """ Compute every cell into a single reused cell and extract the requested fields into flat arrays.
+
+        * returns a dict of arrays indexed by cell id, see :class:`_CellExtractor`
+        * with several threads, each one computes interleaved chunks of blocks with its own cell
+        * with a `source` map, the neighbors are given by the source index of the points
+    """
+    cdef _CellExtractor ext = _CellExtractor(con.total_particles(), fields, threads, mesh, source)
+    if threads > 1:
+        _run_threads(con, threads, NULL, ext)
+        return ext.finish()
+
+    cdef c_loop_all *vl = new c_loop_all(dereference(<container_base *>con))
+    cdef voronoicell_neighbor *c = new voronoicell_neighbor()
+    cdef int pid
+    cdef double x, y, z, r
+
+    with nogil:
+        if vl.start():
+            while True:
+                if con.compute_cell(dereference(c), dereference(vl)):
+                    _loop_pos(con, vl, pid, x, y, z, r)
+                    ext.add(dereference(c), pid, x, y, z, r)
+                if not vl.inc(): break
+
+    del c
+    del vl
+    return ext.finish()
+
+cdef class _ArraysIter:
+    """ Iterator over batches of cells, computed into a single reused cell along the c_loop_all
+        (or c_loop_all_periodic) walk.
+
+        * yields the dict of arrays of each batch, see :func:`_stream_batch` and :func:`_batch_arrays`
+        * only a batch is extracted at a time, so the memory does not grow with the amount of cells
+    """
+    cdef object owner
+    cdef void *con
+    cdef cbool poly
+    cdef c_loop_all *vl
+    cdef c_loop_all_periodic *pvl
+    cdef voronoicell_neighbor *c
+    cdef object fields
+    cdef object source
+    cdef Py_ssize_t batch
+    cdef cbool more
+
+    def __dealloc__(self):
+        del self.c
+        del self.vl
+        del self.pvl
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        import numpy as np
+        cdef _CellExtractor ext
+        cdef int[::1] ids
+        cdef Py_ssize_t k
+        while self.more:
+            ext = _CellExtractor(self.batch, self.fields, 1, False, self.source)
+            ids = np.empty(self.batch, dtype=np.intc)
+            with nogil:
+                if self.pvl != NULL and self.poly:
+                    k = _stream_batch_periodic(<container_periodic_poly *>self.con, self.pvl, self.c, ext, ids, &self.more)
+                elif self.pvl != NULL:
+                    k = _stream_batch_periodic(<container_periodic *>self.con, self.pvl, self.c, ext, ids, &self.more)
+                elif self.poly:
+                    k = _stream_batch(<container_poly *>self.con, self.vl, self.c, ext, ids, &self.more)
+                else:
+                    k = _stream_batch(<container *>self.con, self.vl, self.c, ext, ids, &self.more)
+            if k > 0:
+                return _batch_arrays(ext.finish(), ids, k)
+        raise StopIteration
+
+cdef _ArraysIter _iter_arrays(container_t *con, owner, fields, Py_ssize_t batch, source):
+    """ Start the iterator over batches of cells of the container, kept alive by its `owner`
+        * with a `source` map, the neighbors are given by the source index of the points
+    """
+    assert batch > 0, "batch must be positive"
+    cdef _ArraysIter it = _ArraysIter()
+    it.owner = owner
+    it.con = con
+    it.poly = container_t is container_poly
+    it.fields = fields
+    it.source = source
+    it.batch = batch
+    it.vl = new c_loop_all(dereference(<container_base *>con))
+    it.c = new voronoicell_neighbor()
+    it.more = it.vl.start()
+    return it
+
+cdef _find_voronoi_cells(container_t *con, const double[:, ::1] points):
+    """ The (M,) ids of the particles whose cells contain the (M,3) points, see :func:`_find_cells` """
+    import numpy as np
+    assert points.shape[1] == 3, "points must have shape (M,3)"
+    ids = np.empty(points.shape[0], dtype=np.intc)
+    cdef int[::1] v = ids
+    with nogil:
+        _find_cells(con, points, v)
+    return ids
+
+cdef dict _get_ghost_arrays(container_t *con, const double[:, ::1] points, const double[::1] radii, fields):
+    """ Compute the ghost cell of each (M,3) point and extract the requested fields, see :func:`_ghost_cells`
+        * returns a dict of arrays indexed by point, see :class:`_CellExtractor`
+    """
+    assert points.shape[1] == 3, "points must have shape (M,3)"
+    if container_t is container_poly:
+        assert radii.shape[0] == points.shape[0], "radii must have shape (M,)"
+    cdef _CellExtractor ext = _CellExtractor(points.shape[0], fields)
+    with nogil:
+        _ghost_cells(con, points, radii, ext)
+    return ext.finish()
+
+cdef inline void _output_source(voronoicell_neighbor *c, const char *format, int pid, double x, double y, double z,
+                                double r, const int[::1] source, FILE *fp) noexcept nogil:
+    """ Write the custom output of a computed cell with its id and neighbors translated by the `source` map
+        * the neighbors of the edges are translated in place, the cell is initialized again by the next compute
+    """
+    cdef int i, j
+    for i in range(c.p):
+        for j in range(c.nu[i]):
+            if c.ne[i][j] >= 0: c.ne[i][j] = source[c.ne[i][j]]
+    c.output_custom(format, source[pid], x, y, z, r, fp)
+
+cdef void _print_source(container_t *con, const char *format, const int[::1] source, FILE *fp) noexcept nogil:
+    """ Same as the voro++ print_custom along a c_loop_all walk, but with the ids given by the `source` map """
+    cdef c_loop_all *vl = new c_loop_all(dereference(<container_base *>con))
+    cdef voronoicell_neighbor *c = new voronoicell_neighbor()
+    cdef int pid
+    cdef double x, y, z, r
+    if vl.start():
+        while True:
+            if con.compute_cell(dereference(c), dereference(vl)):
+                _loop_pos(con, vl, pid, x, y, z, r)
+                if container_t is container: r = default_radius
+                _output_source(c, format, pid, x, y, z, r, source, fp)
+            if not vl.inc(): break
+    del c
+    del vl
+
+cdef _print_custom(any_container_t *con, str format, path, fileobj, source=None):
+    """ Compute every cell and write the voro++ custom output of each one, see :meth:`Container.print_custom`
+        * with a `source` map, the ids and the neighbors are given by the source index of the points
+    """
+    cdef bytes fmt = format.encode()
+    cdef const char *f = fmt
+    cdef const int[::1] ids = source
+    cdef cbool translate = source is not None
+    cdef FILE *fp = _open_output(path)
+    with nogil:
+        if not translate:
+            con.print_custom(f, fp)
+        elif any_container_t is container_periodic or any_container_t is container_periodic_poly:
+            _print_source_periodic(con, f, ids, fp)
+        else:
+            _print_source(con, f, ids, fp)
+    _close_output(fp, fileobj)
+
+
 cdef class Container:
     cdef container *thisptr
+    cdef vector[wall *] walls
+    cdef const int[::1] source
     def __cinit__(self, double ax_,double bx_,double ay_,double by_,double az_,double bz_,
                 int nx_,int ny_,int nz_,cbool xperiodic_,cbool yperiodic_,cbool zperiodic_,int init_mem):
         self.thisptr = new container(ax_, bx_, ay_, by_, az_, bz_, nx_, ny_, nz_,
                 xperiodic_, yperiodic_, zperiodic_, init_mem)
+        self.source = None
 
     def __dealloc__(self):
         del self.thisptr
+        _delete_walls(self.walls)
 
     # TODO: Separate point inside from inside walls?
     # TODO: may return true with a point ON BOUNDS/WALL limit (seems like precision error) -> may lead to except in put()
@@ -328,60 +1811,103 @@ cdef class Container:
         #assert self.thisptr.point_inside(x, y, z)
         assert self.thisptr.put(n, x, y, z)
 
+    def put_array(self, const double[:, :] points, accept=None, cbool inside=True):
+        """ Insert all the (N,3) points in a single loop without the GIL, wrapping periodic coordinates.
+            * the points may be strided, e.g. the columns of a memory mapped file
+            * points not inside the container (or its walls) are skipped, the rest get sequential ids
+            * `accept` a (N,) mask of the points to consider, without `inside` these are not tested again
+            * returns a (N,) boolean mask of the inserted points
+            * NOTE: a point ON a wall may pass point_inside but fail put, raises AssertionError like put()
+        """
+        cdef const double[:] no_radii = None
+        return _put_array(self.thisptr, points, no_radii, accept, inside)
+
+    def move_array(self, const double[:, ::1] points):
+        """ Move the particles (by id, shape (N,3)) to new positions in place, see :func:`_move_particles`.
+            * returns a (N,) boolean mask of the moved particles
+        """
+        cdef const double[::1] no_radii = None
+        return _move_array(self.thisptr, points, no_radii)
+
+    def compute_ids(self, cells, const Py_ssize_t[::1] ids, cbool compact=False):
+        """ Recompute in place the cells of the given ids of a list by id, see :func:`_compute_ids` """
+        return _compute_ids(self.thisptr, cells, ids, compact, self.source)
+
+    def set_source(self, ids):
+        """ Set the (N,) source index of each container id, see :func:`_set_source`
+            * carried by the computed cells, and translating their neighbors on request
+        """
+        import numpy as np
+        ids = np.ascontiguousarray(ids, dtype=np.intc)
+        assert ids.shape == (self.thisptr.total_particles(),), "ids must have shape (N,)"
+        self.source = ids
+
     def add_wall(self, double xc_, double yc_, double zc_, double ac_, int w_id_=-10):
         """ * (xc_,yc_,zc_) a normal vector to the plane, the positive halfspace is removed.
             * ac_ a displacement along the normal vector, negative values will still remove positive halfspace.
             * w_id_ an ID number to associate with the wall for neighbor tracking, under -10 (some reserved id)
             * NOTE: a point ON a wall WONT be put into the container, and will FAIL an ASSERTION atm!
         """
-        # only negative id, and over -6 reserved for bounding box walls -> -10 for rounding
-        assert w_id_ <= -10
-
-        # atm no inheritance?
-        cdef wall_plane *wall_ptr = new wall_plane(xc_, yc_, zc_, ac_, w_id_)
-        cdef wall *wall_baseptr = (<wall *>(wall_ptr))
-
-        self.thisptr.add_wall(wall_baseptr)
-        pass
-
-    def get_cells(self):
-        cdef container_base *baseptr = (<container_base *>(self.thisptr))
-        cdef c_loop_all *vl = new c_loop_all(dereference(baseptr))
+        cdef double plane[4]
+        plane[:] = [xc_, yc_, zc_, ac_]
+        cdef const double[:, ::1] planes = <double[:1, :4]>&plane[0]
+        cdef const int[::1] ids = <int[:1]>&w_id_
+        _add_walls(self.thisptr, self.walls, "plane", planes, ids)
+
+    def add_walls(self, const double[:, ::1] walls, const int[::1] ids):
+        """ Add a (W,4) array of planes with their (W,) ids in a single loop, same as :meth:`add_wall`
+            * the wall objects are owned by this class, and deleted along the container
+        """
+        _add_walls(self.thisptr, self.walls, "plane", walls, ids)
 
-        cdef int vcells_left = self.thisptr.total_particles()
-        cdef int id
+    def add_curved_walls(self, str kind, const double[:, ::1] walls, const int[::1] ids):
+        """ Add a (W,4) array of spheres `(x,y,z,r)`, or a (W,7) array of cylinders `(x,y,z,ax,ay,az,r)`
+            or cones `(apex x,y,z, axis x,y,z, angle)`, with their (W,) ids, same as :meth:`add_walls`
+            * a cell is cut by a single plane, tangent at the closest point of the wall to its particle
+        """
+        assert kind != "plane", f"unknown wall kind {kind}"
+        _add_walls(self.thisptr, self.walls, kind, walls, ids)
 
-        if vcells_left == 0:
-            return []
+    def get_cells(self, int threads=1, cbool compact=False):
+        """ Compute the list of :class:`Cell` by id, see :func:`_get_cells` """
+        return _get_cells(self.thisptr, threads, compact, self.source)
 
-        if not vl.start():
-            del vl
-            raise ValueError("Computation failed: failed to start loop")
+    def subset_ids(self, sphere=None, box=None):
+        """ Sorted ids of the particles inside a sphere (x,y,z,r) or a box ((x0,y0,z0), (x1,y1,z1)) """
+        return _subset_ids(self.thisptr, sphere, box)
 
-        mylist = [None for _ in range(vcells_left)]
-        cell = Cell()
-        while True:
-            if(self.thisptr.compute_cell(dereference(cell.thisptr), dereference(vl))):
-                cell._id = vl.pid()
+    def get_cells_subset(self, sphere=None, box=None):
+        """ Compute only the cells of the particles inside a sphere or a box, see :func:`_get_cells_subset` """
+        return _get_cells_subset(self.thisptr, sphere, box, self.source)
 
-                assert cell._id < self.thisptr.total_particles(), (
-                    "Cell id %s larger than total %s" % (cell._id, self.thisptr.total_particles()))
+    def find_voronoi_cells(self, const double[:, ::1] points):
+        """ The (M,) ids of the particles whose cells contain the (M,3) points, see :func:`_find_cells` """
+        return _find_voronoi_cells(self.thisptr, points)
 
-                vl.pos(cell.x,cell.y,cell.z)
-                cell.r = 0
-                mylist[cell._id] = cell
+    def get_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, int threads=1, cbool mesh=False, cbool source=False):
+        """ Compute every cell and extract the requested fields into flat arrays, see :func:`_get_arrays`
+            * with `source`, the neighbors are given by the source index of the points, see :meth:`set_source`
+        """
+        return _get_arrays(self.thisptr, fields, threads, mesh, self.source if source else None)
 
-                vcells_left -= 1
-                cell = Cell()
-            if not vl.inc(): break
+    def print_custom(self, str format, path=None, fileobj=None, cbool source=False):
+        """ Compute every cell and write the voro++ custom output of each one (a line per cell, see
+            ``voronoicell_base::output_custom``) to a file, all in C++ without the GIL.
+            * without `path` it is written to a temporary file and then copied to the binary `fileobj`
+            * with `source`, the ids and the neighbors are given by the source index of the points, see :meth:`set_source`
+        """
+        _print_custom(self.thisptr, format, path, fileobj, self.source if source else None)
 
-        del vl
+    def iter_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, Py_ssize_t batch=1024, cbool source=False):
+        """ Iterator over batches of cells, computed into a single reused cell, see :class:`_ArraysIter` """
+        return _iter_arrays(self.thisptr, self, fields, batch, self.source if source else None)
 
-        if vcells_left != 0:
-            msg = f"Computation incomplete: there are cells left ({vcells_left} / {self.thisptr.total_particles()})"
-            if EXCECT_MISSING_CELLS: raise ValueError(msg)
-            else: print(msg)
-        return mylist
+    def get_ghost_arrays(self, const double[:, ::1] points, fields=CELL_FIELDS + FACE_FIELDS):
+        """ Compute the ghost cell of each (M,3) point and extract the requested fields, see :func:`_ghost_cells`
+            * returns a dict of arrays indexed by point, see :class:`_CellExtractor`
+        """
+        cdef const double[::1] no_radii = None
+        return _get_ghost_arrays(self.thisptr, points, no_radii, fields)
 
     def get_limits(self):
         return (
@@ -390,17 +1916,20 @@ cdef class Container:
         )
 
 
-# Same as container but with the addition of variable radii, just duplicate the class for performance?
-# TODO: then should use some static inlined functions instead of duplicating code
+# Same as container but with the addition of variable radii, sharing the fused compute core above
 cdef class ContainerPoly:
     cdef container_poly *thisptr
+    cdef vector[wall *] walls
+    cdef const int[::1] source
     def __cinit__(self, double ax_,double bx_,double ay_,double by_,double az_,double bz_,
                 int nx_,int ny_,int nz_,cbool xperiodic_,cbool yperiodic_,cbool zperiodic_,int init_mem):
         self.thisptr = new container_poly(ax_, bx_, ay_, by_, az_, bz_, nx_, ny_, nz_,
                 xperiodic_, yperiodic_, zperiodic_, init_mem)
+        self.source = None
 
     def __dealloc__(self):
         del self.thisptr
+        _delete_walls(self.walls)
 
     def point_inside(self, double x, double y, double z):
         return self.thisptr.point_inside(x, y, z)
@@ -409,58 +1938,359 @@ cdef class ContainerPoly:
         #assert self.thisptr.point_inside(x, y, z)
         assert self.thisptr.put(n,x,y,z,r)
 
-    def add_wall(self, double xc_, double yc_, double zc_, double ac_, int w_id_=-10):
-        """ * (xc_,yc_,zc_) a normal vector to the plane, the positive halfspace is removed.
-            * ac_ a displacement along the normal vector, negative values will still remove positive halfspace.
-            * w_id_ an ID number to associate with the wall for neighbor tracking, under -10 (some reserved id)
-            * NOTE: a point ON a wall WONT be put into the container, and will FAIL an ASSERTION atm!
+    def put_array(self, const double[:, :] points, const double[:] radii, accept=None, cbool inside=True):
+        """ Insert all the (N,3) points with their (N,) radii in a single loop without the GIL.
+            * same as :meth:`Container.put_array`, returns a (N,) boolean mask of the inserted points
         """
-        # only negative id, and over -6 reserved for bounding box walls -> -10 for rounding
-        assert w_id_ <= -10
+        return _put_array(self.thisptr, points, radii, accept, inside)
 
-        # atm no inheritance, so repeat code?
-        cdef wall_plane *wall_ptr = new wall_plane(xc_, yc_, zc_, ac_, w_id_)
-        cdef wall *wall_baseptr = (<wall *>(wall_ptr))
-
-        self.thisptr.add_wall(wall_baseptr)
-
-    def get_cells(self):
-        cdef container_base *baseptr = (<container_base *>(self.thisptr))
-        cdef c_loop_all *vl = new c_loop_all(dereference(baseptr))
+    def move_array(self, const double[:, ::1] points, const double[::1] radii):
+        """ Move the particles (by id, shape (N,3)) and update their (N,) radii in place.
+            * same as :meth:`Container.move_array`
+        """
+        return _move_array(self.thisptr, points, radii)
 
-        cdef int vcells_left = self.thisptr.total_particles()
-        cdef int id
+    def compute_ids(self, cells, const Py_ssize_t[::1] ids, cbool compact=False):
+        """ Recompute in place the cells of the given ids of a list by id, see :func:`_compute_ids` """
+        return _compute_ids(self.thisptr, cells, ids, compact, self.source)
 
-        if vcells_left == 0:
-            return []
+    def set_source(self, ids):
+        """ Set the (N,) source index of each container id, see :func:`_set_source`
+            * carried by the computed cells, and translating their neighbors on request
+        """
+        import numpy as np
+        ids = np.ascontiguousarray(ids, dtype=np.intc)
+        assert ids.shape == (self.thisptr.total_particles(),), "ids must have shape (N,)"
+        self.source = ids
 
-        if not vl.start():
-            del vl
-            raise ValueError("Computation failed: failed to start loop")
+    def add_wall(self, double xc_, double yc_, double zc_, double ac_, int w_id_=-10):
+        """ Same as :meth:`Container.add_wall` """
+        cdef double plane[4]
+        plane[:] = [xc_, yc_, zc_, ac_]
+        cdef const double[:, ::1] planes = <double[:1, :4]>&plane[0]
+        cdef const int[::1] ids = <int[:1]>&w_id_
+        _add_walls(self.thisptr, self.walls, "plane", planes, ids)
+
+    def add_walls(self, const double[:, ::1] walls, const int[::1] ids):
+        """ Same as :meth:`Container.add_walls` """
+        _add_walls(self.thisptr, self.walls, "plane", walls, ids)
+
+    def add_curved_walls(self, str kind, const double[:, ::1] walls, const int[::1] ids):
+        """ Same as :meth:`Container.add_curved_walls` """
+        assert kind != "plane", f"unknown wall kind {kind}"
+        _add_walls(self.thisptr, self.walls, kind, walls, ids)
+
+    def get_cells(self, int threads=1, cbool compact=False):
+        """ Compute the list of :class:`Cell` by id, see :func:`_get_cells` """
+        return _get_cells(self.thisptr, threads, compact, self.source)
+
+    def subset_ids(self, sphere=None, box=None):
+        """ Sorted ids of the particles inside a sphere (x,y,z,r) or a box ((x0,y0,z0), (x1,y1,z1)) """
+        return _subset_ids(self.thisptr, sphere, box)
+
+    def get_cells_subset(self, sphere=None, box=None):
+        """ Compute only the cells of the particles inside a sphere or a box, see :func:`_get_cells_subset` """
+        return _get_cells_subset(self.thisptr, sphere, box, self.source)
+
+    def find_voronoi_cells(self, const double[:, ::1] points):
+        """ The (M,) ids of the particles whose cells contain the (M,3) points, see :func:`_find_cells` """
+        return _find_voronoi_cells(self.thisptr, points)
+
+    def get_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, int threads=1, cbool mesh=False, cbool source=False):
+        """ Compute every cell and extract the requested fields into flat arrays, see :func:`_get_arrays`
+            * with `source`, the neighbors are given by the source index of the points, see :meth:`set_source`
+        """
+        return _get_arrays(self.thisptr, fields, threads, mesh, self.source if source else None)
 
-        mylist = [None for _ in range(vcells_left)]
-        cell = Cell()
-        while True:
-            if(self.thisptr.compute_cell(dereference(cell.thisptr), dereference(vl))):
-                vl.pos(cell._id, cell.x,cell.y,cell.z,cell.r)
-                assert cell._id < self.thisptr.total_particles(), (
-                    "Cell id %s larger than total %s" % (cell._id, self.thisptr.total_particles()))
-                mylist[cell._id] = cell
-
-                vcells_left -= 1
-                cell = Cell()
-            if not vl.inc(): break
+    def print_custom(self, str format, path=None, fileobj=None, cbool source=False):
+        """ Same as :meth:`Container.print_custom` """
+        _print_custom(self.thisptr, format, path, fileobj, self.source if source else None)
 
-        del vl
+    def iter_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, Py_ssize_t batch=1024, cbool source=False):
+        """ Iterator over batches of cells, same as :meth:`Container.iter_arrays` """
+        return _iter_arrays(self.thisptr, self, fields, batch, self.source if source else None)
 
-        if vcells_left != 0:
-            msg = f"Computation incomplete: there are cells left ({vcells_left} / {self.thisptr.total_particles()})"
-            if EXCECT_MISSING_CELLS: raise ValueError(msg)
-            else: print(msg)
-        return mylist
+    def get_ghost_arrays(self, const double[:, ::1] points, const double[::1] radii, fields=CELL_FIELDS + FACE_FIELDS):
+        """ Compute the ghost cell of each (M,3) point with its (M,) radius, see :meth:`Container.get_ghost_arrays` """
+        return _get_ghost_arrays(self.thisptr, points, radii, fields)
 
     def get_limits(self):
         return (
             (self.thisptr.ax, self.thisptr.ay, self.thisptr.az),
             (self.thisptr.bx, self.thisptr.by, self.thisptr.bz),
         )
+
+
+ctypedef fused periodic_t:
+    container_periodic
+    container_periodic_poly
+
+cdef Py_ssize_t _put_points_periodic(periodic_t *con, const double[:, ::1] points, const double[::1] radii,
+                                     unsigned char[::1] inserted, int &idx) noexcept nogil:
+    """ Put the points with consecutive ids from `idx`, remapped into the primary domain of the box
+        * returns the index of the first point that could not be put, or -1
+    """
+    cdef Py_ssize_t n
+    for n in range(points.shape[0]):
+        if periodic_t is container_periodic_poly:
+            if not con.put(idx, points[n, 0], points[n, 1], points[n, 2], radii[n]): return n
+        else:
+            if not con.put(idx, points[n, 0], points[n, 1], points[n, 2]): return n
+        inserted[n] = 1
+        idx += 1
+    return -1
+
+cdef _put_array_periodic(periodic_t *con, int &total, const double[:, ::1] points, const double[::1] radii):
+    """ Insert all the (N,3) points (with their (N,) radii) in a single loop without the GIL.
+        * every point is remapped into the primary domain so all of them are inserted
+        * `total` is advanced past the ids of the inserted points
+        * returns a (N,) boolean mask of the inserted points, same as :meth:`Container.put_array`
+    """
+    import numpy as np
+    assert points.shape[1] == 3, "points must have shape (N,3)"
+    if periodic_t is container_periodic_poly:
+        assert radii.shape[0] == points.shape[0], "radii must have shape (N,)"
+
+    mask = np.zeros(points.shape[0], dtype=bool)
+    cdef unsigned char[::1] m = mask.view(np.uint8)
+    cdef Py_ssize_t failed
+    with nogil:
+        failed = _put_points_periodic(con, points, radii, m, total)
+    if failed >= 0:
+        raise AssertionError(f"Could not put point {failed} at {tuple(points[failed])}")
+    return mask
+
+cdef inline void _loop_pos_periodic(periodic_t *con, c_loop_all_periodic *vl, int &pid, double &x, double &y,
+                                    double &z, double &r) noexcept nogil:
+    """ The id, position and radius (0 for mono containers) of the current particle of the loop """
+    if periodic_t is container_periodic_poly:
+        vl.pos(pid, x, y, z, r)
+    else:
+        pid = vl.pid()
+        vl.pos(x, y, z)
+        r = 0
+
+cdef list _get_cells_periodic(periodic_t *con, int total, cbool compact, const int[::1] source):
+    """ Compute the list of :class:`Cell` by id along a c_loop_all_periodic walk, see :func:`_get_cells` """
+    cdef int vcells_left = total
+    if vcells_left == 0:
+        return []
+
+    cdef c_loop_all_periodic *vl = new c_loop_all_periodic(dereference(<container_periodic_base *>con))
+    if not vl.start():
+        del vl
+        raise ValueError("Computation failed: failed to start loop")
+
+    mylist = [None] * vcells_left
+    cdef voronoicell_neighbor *scratch = new voronoicell_neighbor() if compact else NULL
+    cdef Cell cell = None if compact else Cell()
+    while True:
+        if con.compute_cell(dereference(scratch if compact else cell.thisptr), dereference(vl)):
+            if compact:
+                cell = _pooled_cell()
+                cell.thisptr.copy_compact(dereference(scratch))
+            _loop_pos_periodic(con, vl, cell._id, cell.x, cell.y, cell.z, cell.r)
+            _set_source(cell, source)
+            mylist[cell._id] = cell
+
+            vcells_left -= 1
+            if not compact: cell = Cell()
+        if not vl.inc(): break
+
+    del vl
+    del scratch
+
+    if vcells_left != 0:
+        msg = f"Computation incomplete: there are cells left ({vcells_left} / {total})"
+        if EXCECT_MISSING_CELLS: raise ValueError(msg)
+        else: print(msg)
+    return mylist
+
+cdef dict _get_arrays_periodic(periodic_t *con, int total, fields, cbool mesh, source):
+    """ Compute every cell into a single reused cell and extract the requested fields, see :func:`_get_arrays` """
+    cdef _CellExtractor ext = _CellExtractor(total, fields, 1, mesh, source)
+    cdef c_loop_all_periodic *vl = new c_loop_all_periodic(dereference(<container_periodic_base *>con))
+    cdef voronoicell_neighbor *c = new voronoicell_neighbor()
+    cdef int pid
+    cdef double x, y, z, r
+
+    with nogil:
+        if total > 0 and vl.start():
+            while True:
+                if con.compute_cell(dereference(c), dereference(vl)):
+                    _loop_pos_periodic(con, vl, pid, x, y, z, r)
+                    ext.add(dereference(c), pid, x, y, z, r)
+                if not vl.inc(): break
+
+    del c
+    del vl
+    return ext.finish()
+
+cdef Py_ssize_t _stream_batch_periodic(periodic_t *con, c_loop_all_periodic *vl, voronoicell_neighbor *c,
+                                       _CellExtractor ext, int[::1] ids, cbool *more) noexcept nogil:
+    """ Continue the walk of the periodic loop for up to a batch of cells, see :func:`_stream_batch` """
+    cdef Py_ssize_t k = 0
+    cdef int pid
+    cdef double x, y, z, r
+    while more[0] and k < ids.shape[0]:
+        if con.compute_cell(dereference(c), dereference(vl)):
+            _loop_pos_periodic(con, vl, pid, x, y, z, r)
+            ids[k] = pid
+            ext.add(dereference(c), k, x, y, z, r)
+            k += 1
+        more[0] = vl.inc()
+    return k
+
+cdef void _print_source_periodic(periodic_t *con, const char *format, const int[::1] source, FILE *fp) noexcept nogil:
+    """ Same as :func:`_print_source`, along a c_loop_all_periodic walk """
+    cdef c_loop_all_periodic *vl = new c_loop_all_periodic(dereference(<container_periodic_base *>con))
+    cdef voronoicell_neighbor *c = new voronoicell_neighbor()
+    cdef int pid
+    cdef double x, y, z, r
+    if vl.start():
+        while True:
+            if con.compute_cell(dereference(c), dereference(vl)):
+                _loop_pos_periodic(con, vl, pid, x, y, z, r)
+                if periodic_t is container_periodic: r = default_radius
+                _output_source(c, format, pid, x, y, z, r, source, fp)
+            if not vl.inc(): break
+    del c
+    del vl
+
+cdef _ArraysIter _iter_arrays_periodic(periodic_t *con, int total, owner, fields, Py_ssize_t batch, source):
+    """ Start the iterator over batches of cells of the periodic container, see :func:`_iter_arrays` """
+    assert batch > 0, "batch must be positive"
+    cdef _ArraysIter it = _ArraysIter()
+    it.owner = owner
+    it.con = con
+    it.poly = periodic_t is container_periodic_poly
+    it.fields = fields
+    it.source = source
+    it.batch = batch
+    it.pvl = new c_loop_all_periodic(dereference(<container_periodic_base *>con))
+    it.c = new voronoicell_neighbor()
+    it.more = total > 0 and it.pvl.start()
+    return it
+
+
+# Triclinic periodic containers, the box is a parallelepiped with vectors (bx,0,0), (bxy,by,0), (bxz,byz,bz)
+# NOTE: periodic images are built lazily while computing cells, so these are not computed with threads
+cdef class ContainerPeriodic:
+    cdef container_periodic *thisptr
+    cdef int total
+    cdef const int[::1] source
+    def __cinit__(self, double bx_, double bxy_, double by_, double bxz_, double byz_, double bz_,
+                int nx_, int ny_, int nz_, int init_mem):
+        self.thisptr = new container_periodic(bx_, bxy_, by_, bxz_, byz_, bz_, nx_, ny_, nz_, init_mem)
+        self.total = 0
+        self.source = None
+
+    def __dealloc__(self):
+        del self.thisptr
+
+    def put(self, int n, double x, double y, double z):
+        """ Put a particle, remapped into the primary domain of the box """
+        assert self.thisptr.put(n, x, y, z)
+        self.total = max(self.total, n + 1)
+
+    def put_array(self, const double[:, ::1] points):
+        """ Insert all the (N,3) points in a single loop without the GIL.
+            * every point is remapped into the primary domain so all of them are inserted
+            * returns a (N,) boolean mask of the inserted points, same as :meth:`Container.put_array`
+        """
+        cdef const double[::1] no_radii = None
+        return _put_array_periodic(self.thisptr, self.total, points, no_radii)
+
+    def set_source(self, ids):
+        """ Set the (N,) source index of each particle id, same as :meth:`Container.set_source` """
+        import numpy as np
+        ids = np.ascontiguousarray(ids, dtype=np.intc)
+        assert ids.shape == (self.total,), "ids must have shape (N,)"
+        self.source = ids
+
+    def get_cells(self, int threads=1, cbool compact=False):
+        return _get_cells_periodic(self.thisptr, self.total, compact, self.source)
+
+    def get_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, int threads=1, cbool mesh=False, cbool source=False):
+        """ Compute every cell into a single reused cell and extract the requested fields into flat arrays.
+
+            * same as :meth:`Container.get_arrays`, but always computed serially
+        """
+        return _get_arrays_periodic(self.thisptr, self.total, fields, mesh, self.source if source else None)
+
+    def print_custom(self, str format, path=None, fileobj=None, cbool source=False):
+        """ Compute every cell and write the voro++ custom output of each one (a line per cell, see
+            ``voronoicell_base::output_custom``) to a file, all in C++ without the GIL.
+            * without `path` it is written to a temporary file and then copied to the binary `fileobj`
+            * with `source`, the ids and the neighbors are given by the source index of the points, see :meth:`set_source`
+        """
+        _print_custom(self.thisptr, format, path, fileobj, self.source if source else None)
+
+    def iter_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, Py_ssize_t batch=1024, cbool source=False):
+        """ Iterator over batches of cells along the c_loop_all_periodic walk, see :meth:`Container.iter_arrays` """
+        return _iter_arrays_periodic(self.thisptr, self.total, self, fields, batch, self.source if source else None)
+
+    def get_box(self):
+        return (self.thisptr.bx, self.thisptr.bxy, self.thisptr.by,
+                self.thisptr.bxz, self.thisptr.byz, self.thisptr.bz)
+
+
+# Triclinic periodic containers, the box is a parallelepiped with vectors (bx,0,0), (bxy,by,0), (bxz,byz,bz)
+# NOTE: periodic images are built lazily while computing cells, so these are not computed with threads
+cdef class ContainerPeriodicPoly:
+    cdef container_periodic_poly *thisptr
+    cdef int total
+    cdef const int[::1] source
+    def __cinit__(self, double bx_, double bxy_, double by_, double bxz_, double byz_, double bz_,
+                int nx_, int ny_, int nz_, int init_mem):
+        self.thisptr = new container_periodic_poly(bx_, bxy_, by_, bxz_, byz_, bz_, nx_, ny_, nz_, init_mem)
+        self.total = 0
+        self.source = None
+
+    def __dealloc__(self):
+        del self.thisptr
+
+    def put(self, int n, double x, double y, double z, double r):
+        """ Put a particle, remapped into the primary domain of the box """
+        assert self.thisptr.put(n, x, y, z, r)
+        self.total = max(self.total, n + 1)
+
+    def put_array(self, const double[:, ::1] points, const double[::1] radii):
+        """ Insert all the (N,3) points with their (N,) radii in a single loop without the GIL.
+            * every point is remapped into the primary domain so all of them are inserted
+            * returns a (N,) boolean mask of the inserted points, same as :meth:`Container.put_array`
+        """
+        return _put_array_periodic(self.thisptr, self.total, points, radii)
+
+    def set_source(self, ids):
+        """ Set the (N,) source index of each particle id, same as :meth:`Container.set_source` """
+        import numpy as np
+        ids = np.ascontiguousarray(ids, dtype=np.intc)
+        assert ids.shape == (self.total,), "ids must have shape (N,)"
+        self.source = ids
+
+    def get_cells(self, int threads=1, cbool compact=False):
+        return _get_cells_periodic(self.thisptr, self.total, compact, self.source)
+
+    def get_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, int threads=1, cbool mesh=False, cbool source=False):
+        """ Compute every cell into a single reused cell and extract the requested fields into flat arrays.
+
+            * same as :meth:`Container.get_arrays`, but always computed serially
+        """
+        return _get_arrays_periodic(self.thisptr, self.total, fields, mesh, self.source if source else None)
+
+    def print_custom(self, str format, path=None, fileobj=None, cbool source=False):
+        """ Compute every cell and write the voro++ custom output of each one (a line per cell, see
+            ``voronoicell_base::output_custom``) to a file, all in C++ without the GIL.
+            * without `path` it is written to a temporary file and then copied to the binary `fileobj`
+            * with `source`, the ids and the neighbors are given by the source index of the points, see :meth:`set_source`
+        """
+        _print_custom(self.thisptr, format, path, fileobj, self.source if source else None)
+
+    def iter_arrays(self, fields=CELL_FIELDS + FACE_FIELDS, Py_ssize_t batch=1024, cbool source=False):
+        """ Iterator over batches of cells along the c_loop_all_periodic walk, see :meth:`Container.iter_arrays` """
+        return _iter_arrays_periodic(self.thisptr, self.total, self, fields, batch, self.source if source else None)
+
+    def get_box(self):
+        return (self.thisptr.bx, self.thisptr.bxy, self.thisptr.by,
+                self.thisptr.bxz, self.thisptr.byz, self.thisptr.bz)
@@ -0,0 +1,51 @@
+// Helpers for the tess bindings that are easier to express in C++ than in Cython
+
+#ifndef TESS_VORO_HELPERS_HH
+#define TESS_VORO_HELPERS_HH
+
+#include <new>
+
+#include "voro++.hh"
+
+namespace voro
+{
+
+/** \brief Computes cells of a container concurrently with other workers.
+ *
+ * The container classes keep per computation state (the voro_compute search
+ * mask and the radius_poly scaling) so compute_cell cannot run concurrently on
+ * a single container. A worker keeps a shallow copy of the container, sharing
+ * the particle arrays and walls read only, plus its own voro_compute.
+ * The container must not be modified while any worker is alive. */
+template <class c_class>
+class compute_worker
+{
+  public:
+	compute_worker(c_class &con_)
+		: con(*new (::operator new(sizeof(c_class))) c_class(con_)),
+		  vc(con, con.xperiodic ? 2 * con.nx + 1 : con.nx,
+			 con.yperiodic ? 2 * con.ny + 1 : con.ny,
+			 con.zperiodic ? 2 * con.nz + 1 : con.nz) {}
+	/** The shallow copy does not own any of the shared memory, so it is
+	 * released without calling the container destructor. */
+	~compute_worker() { ::operator delete(&con); }
+	/** Computes the Voronoi cell for given particle.
+	 * \param[out] c a Voronoi cell class in which to store the computed cell.
+	 * \param[in] ijk the block that the particle is within.
+	 * \param[in] q the index of the particle within the block.
+	 * \return True if the cell was computed. */
+	template <class v_cell>
+	inline bool compute_cell(v_cell &c, int ijk, int q)
+	{
+		int k = ijk / con.nxy, ijkt = ijk - con.nxy * k, j = ijkt / con.nx, i = ijkt - j * con.nx;
+		return vc.compute_cell(c, ijk, q, i, j, k);
+	}
+
+  private:
+	c_class &con;
+	voro_compute<c_class> vc;
+};
+
+} // namespace voro
+
+#endif
@@ -76,6 +76,18 @@ class LatticeTest:
             self.order, self.cells.order(l=6, weighted=False, local=False)
         )
 
+    def test_order_arrays(self):
+        if scipy is None:
+            return
+        if self.order is None:
+            return
+        arrays = self.cells.arrays()
+        for weighted in (True, False):
+            Q = arrays.order(l=(4, 6), weighted=weighted)
+            self.assertEqual(Q.shape, (2, len(self.cells)))
+            np.testing.assert_allclose(Q[1], self.order)
+            np.testing.assert_allclose(Q[0], self.cells.order(l=4, local=True))
+
 
 class CubicLattice(LatticeTest):
     n = 4
@@ -192,6 +204,14 @@ class FCC(LatticeTest, TestCase):
     def test_neighbors(self):
         self.neighbors([12])
 
+    def test_wigner(self):
+        if scipy is None:
+            return
+        Q, W = self.cells.arrays().order(l=(4, 6), wigner=True)
+        np.testing.assert_allclose(Q[0], 0.19094065, atol=1e-8)
+        np.testing.assert_allclose(W[0], -0.15931737, atol=1e-8)
+        np.testing.assert_allclose(W[1], -0.01316060, atol=1e-8)
+
 
 class FCCelongated(FCC):
     n = 4
@@ -255,6 +275,14 @@ class HCP(FCC):
     def test_neighbors(self):
         self.neighbors([12])
 
+    def test_wigner(self):
+        if scipy is None:
+            return
+        Q, W = self.cells.arrays().order(l=(4, 6), wigner=True)
+        np.testing.assert_allclose(Q[0], 0.09722222, atol=1e-8)
+        np.testing.assert_allclose(W[0], 0.13409705, atol=1e-8)
+        np.testing.assert_allclose(W[1], -0.01244196, atol=1e-8)
+
 class TestBoundaries(TestCase):
     limits = ((-50, -20, 80), (-30, -10, 120))
 
@@ -302,12 +330,13 @@ class TestBoundaries(TestCase):
             [7.17098, 8.66222, 8.68142],
         ]
 
-        # points ON LIMIT may return point_inside true and then pruduce and exception in put()
-        # so this asserts that error not really correct discard of points
-        with self.assertRaises(AssertionError):
-            Container(points, limits=limits)
-        with self.assertRaises(AssertionError):
-            Container(points, limits=limits, radii=[0.1] * len(points))
+        # points ON the upper LIMIT return point_inside true and then fail put(), so they are skipped
+        # by the pre-filter instead of raising, the ones ON the lower limit are kept like in voro++
+        inside = [1, 2, 3, 6, 7, 8, 11, 12, 13]
+        for cont in [ Container(points, limits=limits), Container(points, limits=limits, radii=[0.1] * len(points)) ]:
+            self.assertEqual(list(cont.source_idx), inside)
+            self.assertEqual(cont.source_skipped, len(points) - len(inside))
+            self.assertEqual(len(cont), len(inside))
 
         limits = 10
         cont = Container(points, limits=limits)
@@ -1,7 +1,8 @@
-from tess import Container
+from tess import Container, PeriodicContainer, Cell, CELL_FIELDS, FACE_FIELDS
 from unittest import TestCase
-from pytest import raises as assertException
+from pytest import raises as assertException, fixture
 from collections.abc import Iterable, Mapping
+import numpy as np
 
 # NOTE: there is no vector class imported for the tests, avoid deciding over Blender / numpy vectors / etc
 #       however it is recommended using one instead of working with raw tuples and lists
@@ -9,6 +10,17 @@ from collections.abc import Iterable, Mapping
 class TestCase_ext(TestCase):
     """" General asserting utilities """
 
+    @fixture(autouse=True)
+    def _capture(self, capfd):
+        """" Keep the captured stdout / stderr (C++ included) to check what gets printed """
+        self.capfd = capfd
+
+    def assertNothingPrinted(self):
+        """" Utility function to check that nothing was printed since the last check, e.g. voro++ memory messages """
+        out, err = self.capfd.readouterr()
+        self.assertEqual(out, "")
+        self.assertEqual(err, "")
+
     def assertListAlmostEqual(self, first, second, places=None, msg=None, delta=None):
         """" Utility function to compare a pair of lists such as a vector, uses assertAlmostEqual on each pair of elements """
         isinstance(first, Iterable)
@@ -278,6 +290,84 @@ class TestCell(TestCase_ext, TestCase_cubicCell):
         with assertException(Exception):
             self.assert_cubic_cell_scale(cell)
 
+    def test_cache(self):
+        cell = self.get_cubic_cell()
+        self.assertFalse(cell.cache)
+        cell.cache = True
+
+        # memoized data is the same, also when accessed again
+        for _ in range(2):
+            self.assert_cubic_cell_geo(cell)
+            self.assert_cubic_cell_scale(cell)
+            self.assert_cubic_cell_pos(cell)
+
+        # cuts and translations invalidate it
+        cell.cut_plane(0,1,0,0)
+        self.assertAlmostEqual(0.5, cell.volume())
+        self.assertEqual(len(cell.neighbors()), 6)
+        assert 0 in cell.neighbors()
+        self.assertListAlmostEqual((0, -0.25, 0), cell.centroid())
+        self.assertAlmostEqual(max(v[1] for v in cell.vertices()), 0)
+
+        cell.translate(1, 1, 1)
+        self.assertListAlmostEqual((1, 0.75, 1), cell.centroid())
+        self.assertAlmostEqual(max(v[1] for v in cell.vertices()), 1)
+
+        cell.cut_plane_particle(0, -0.5, 0)
+        self.assertAlmostEqual(0.25, cell.volume())
+        self.assertAlmostEqual(sum(cell.face_areas()), cell.surface_area())
+
+        # containers can enable it for every cell
+        cont = Container([[1,1,1], [2,2,2]], limits=3, cache=True)
+        assert all(c.cache for c in cont)
+        cell.cache = False
+        self.assertFalse(cell.cache)
+        self.assertListAlmostEqual((1, 0.875, 1), cell.centroid())
+
+    def test_compact(self):
+        cell = self.get_cubic_cell()
+        cell.compact()
+        for _ in range(2):
+            self.assert_cubic_cell_geo(cell)
+            self.assert_cubic_cell_scale(cell)
+            self.assert_cubic_cell_pos(cell)
+
+        # the memory grows back when cutting, without the voro++ memory messages
+        self.capfd.readouterr()
+        for k in range(1, 9):
+            cell.cut_plane(np.cos(k), np.sin(k), 0.3, 0.16, -k)
+        self.assertNothingPrinted()
+        cell.compact()
+        full = self.get_cubic_cell()
+        for k in range(1, 9):
+            full.cut_plane(np.cos(k), np.sin(k), 0.3, 0.16, -k)
+        self.assertAlmostEqual(full.volume(), cell.volume())
+        self.assertListEqual(full.neighbors(), cell.neighbors())
+        self.assertListEqual(full.face_vertices(), cell.face_vertices())
+
+    def test_arrays(self):
+        cell = self.get_cubic_cell()
+        cell.translate(1, 2, 3)
+
+        self.assertEqual(cell.vertices_local(array=True).shape, (8, 3))
+        self.assertNestedListAlmostEqual(cell.vertices_local(array=True).tolist(), cell.vertices_local())
+        self.assertNestedListAlmostEqual(cell.vertices(array=True).tolist(), cell.vertices())
+        self.assertNestedListAlmostEqual(cell.normals(array=True).tolist(), cell.normals())
+        self.assertListAlmostEqual(cell.face_areas(array=True).tolist(), cell.face_areas())
+
+        indptr, indices = cell.face_vertices(array=True)
+        self.assertEqual(indptr.tolist(), list(range(0, 25, 4)))
+        self.assertEqual([indices[a:b].tolist() for a, b in zip(indptr[:-1], indptr[1:])], cell.face_vertices())
+
+        # caching cells share their buffers read only, which stay valid after invalidation
+        cell.cache = True
+        normals = cell.normals(array=True)
+        assert np.shares_memory(normals, cell.normals(array=True))
+        self.assertFalse(normals.flags.writeable)
+        cell.cut_plane(0, 1, 0, 0)
+        self.assertEqual(len(cell.normals(array=True)), 6)
+        self.assertNestedListAlmostEqual(normals.tolist(), self.get_cubic_cell().normals())
+
     def test_container_bounds(self):
         r=0.5
         c=(0,0,0)
@@ -297,10 +387,25 @@ class TestCell(TestCase_ext, TestCase_cubicCell):
         self.assertNotEqual(len(contPoly), len(p_out))
         self.assertEqual(len(cont), len(contPoly))
 
-        # point ON the boundary should raise except due to point_inside returning true but put() failing
+        # point ON the boundary passes point_inside but fails put(), so it is skipped by the pre-filter
         p_out= [tuple(cc+r for cc in c)]
-        with assertException(Exception):
-            cont = Container(points=[p_out], limits=bb)
+        cont = Container(points=p_out, limits=bb)
+        self.assertEqual(len(cont), 0)
+        self.assertEqual(cont.source_skipped, 1)
+
+        # same with a tolerance, and directly ON a wall
+        cont = Container([ (0, 0, r - 1e-12), (0, 0, 0.25), (0, 0, -0.25) ], limits=bb, walls=[ (0, 0, 1, 0.25) ])
+        self.assertListEqual(list(cont.source_idx), [2])
+        self.assertListEqual(cont.inside([ (0, 0, 0.2), (0, 0, -r) ], tolerance=0.1).tolist(), [False, True])
+
+        # points ON the lower boundary are kept, same as voro++
+        cont = Container([ (-r, 0, 0), (0, -r, 0), (-r, -r, -r) ], limits=bb)
+        self.assertEqual(len(cont), 3)
+        self.assertEqual(cont.source_skipped, 0)
+        lattice = [ (i, j, k) for i in range(3) for j in range(3) for k in range(3) ]
+        cont = Container(lattice, limits=3)
+        self.assertEqual(len(cont), 27)
+        self.assertAlmostEqual(sum(c.volume() for c in cont), 27)
 
     def test_container_index(self):
         # e.g. non unit cube
@@ -711,6 +816,605 @@ class TestContainer(TestCase_ext, TestCase_container):
         self.assertEqual(cont.max, (5,6,7))
 
 
+    def test_source_mask(self):
+        import numpy as np
+        points = np.array([ (0.5, 0.5, 0.5), (1.5, 0.5, 0.5), (0.25, 0.25, 0.25), (-0.25, 0.5, 0.5) ])
+
+        # points outside are skipped and the rest keep the reference to the source id
+        cont = Container(points, limits=1)
+        self.assertListEqual(list(cont.source_mask), [True, False, True, False])
+        self.assertListEqual(list(cont.source_idx), [0, 2])
+        self.assertEqual(cont.source_skipped, 2)
+        self.assertEqual(len(cont), 2)
+
+        # periodic dimensions wrap the points inside
+        cont = Container(points, limits=1, periodic=(True, False, False), radii=[0.1] * len(points))
+        self.assertListEqual(list(cont.source_mask), [True, True, True, True])
+        self.assertEqual(cont.source_skipped, 0)
+        self.assertListAlmostEqual(cont[3].pos, (0.75, 0.5, 0.5))
+        self.assertAlmostEqual(cont[3].radius, 0.1)
+
+    def test_source_ids(self):
+        import numpy as np
+        rng = np.random.default_rng(0)
+        L = 20
+        # every other point is outside, so the container ids differ from the source ones
+        points = rng.random((200, 3)) * L
+        points[::2, 0] += L
+        radii = rng.random(200)
+
+        def source(ids):
+            return [cont.source_idx[n] if n >= 0 else n for n in ids]
+
+        for kwargs in [ dict(), dict(radii=radii), dict(threads=2), dict(compact=True) ]:
+            cont = Container(points, limits=L, **kwargs)
+            self.assertEqual(cont.source_skipped, 100)
+            for cell in cont:
+                self.assertEqual(cell.source_id, cont.source_idx[cell.id])
+                self.assertAlmostEqual(cell.radius, radii[cell.source_id] if "radii" in kwargs else 0)
+                self.assertListEqual(cell.neighbors(source=True), source(cell.neighbors()))
+            for cell in cont.cells_in_region(sphere=(10, 10, 10, 5)):
+                self.assertEqual(cell.source_id, cont.source_idx[cell.id])
+
+            arrays, translated = cont.arrays(), cont.arrays(source=True)
+            self.assertListEqual(translated.neighbors.tolist(), source(arrays.neighbors))
+            batches = list(cont.iter_arrays(batch=16, source=True))
+            self.assertListEqual(sorted(np.concatenate([b.neighbors for b in batches]).tolist()),
+                                 sorted(translated.neighbors.tolist()))
+
+        # the recomputed cells keep their source index
+        moved = points.copy()
+        moved[1::2] = np.clip(moved[1::2] + 0.3, 0, L - 1e-3)
+        cont = Container(points, limits=L)
+        cont.update(moved)
+        for cell in cont:
+            self.assertEqual(cell.source_id, cont.source_idx[cell.id])
+            self.assertListEqual(cell.neighbors(source=True), source(cell.neighbors()))
+
+        # periodic containers insert every point
+        cont = PeriodicContainer(points, box=L)
+        self.assertListEqual([cell.source_id for cell in cont], list(range(200)))
+        self.assertEqual(Cell().source_id, -1)
+
+    def test_arrays(self):
+        import numpy as np
+        rng = np.random.default_rng(0)
+        L = 40
+        points = rng.random((64, 3)) * L
+        radii = rng.random(64)
+
+        for cont in [ Container(points, limits=L, periodic=True), Container(points, limits=L, radii=radii) ]:
+            arrays = cont.arrays()
+            self.assertEqual(len(arrays), len(cont))
+            assert arrays.computed.all()
+
+            for i, cell in enumerate(cont):
+                self.assertListAlmostEqual(arrays.pos[i], cell.pos)
+                self.assertAlmostEqual(arrays.radius[i], cell.radius)
+                self.assertAlmostEqual(arrays.volume[i], cell.volume())
+                self.assertAlmostEqual(arrays.surface_area[i], cell.surface_area())
+                self.assertListAlmostEqual(arrays.centroid[i], cell.centroid())
+                self.assertEqual(arrays.n_faces[i], cell.number_of_faces())
+                self.assertListEqual(list(arrays.neighbors[arrays.faces(i)]), cell.neighbors())
+                self.assertListAlmostEqual(arrays.face_areas[arrays.faces(i)], cell.face_areas())
+                self.assertNestedListAlmostEqual(arrays.normals[arrays.faces(i)], cell.normals())
+
+        # only the requested fields are extracted, and the cells list can be skipped entirely
+        cont = Container(points, limits=L, cells=False)
+        self.assertEqual(len(cont), 0)
+        arrays = cont.arrays(fields=["volume"])
+        self.assertAlmostEqual(arrays.volume.sum(), L**3)
+        assert not hasattr(arrays, "face_indptr")
+        with assertException(ValueError):
+            cont.arrays(fields=["unknown"])
+
+    def test_iter_cells(self):
+        import numpy as np
+        from tess import iter_cells
+        rng = np.random.default_rng(0)
+        L = 40
+        points = rng.random((300, 3)) * L
+        radii = rng.random(300)
+
+        for kwargs in [ dict(periodic=True), dict(radii=radii), dict(walls=[(1,0,0, L/2)]) ]:
+            arrays = Container(points, limits=L, cells=False, **kwargs).arrays()
+            batches = list(iter_cells(points, limits=L, batch=64, **kwargs))
+            self.assertListEqual([len(b) for b in batches[:-1]], [64] * (len(batches) - 1))
+
+            # the batches cover every cell once, in computation order
+            ids = np.concatenate([b.id for b in batches])
+            self.assertListEqual(sorted(ids), list(range(len(arrays))))
+            for b in batches:
+                self.assertListEqual(list(b.source_idx), list(arrays.source_idx[b.id]))
+                np.testing.assert_allclose(b.volume, arrays.volume[b.id])
+                np.testing.assert_allclose(b.radius, arrays.radius[b.id])
+                for k, i in enumerate(b.id):
+                    self.assertListEqual(list(b.neighbors[b.faces(k)]), list(arrays.neighbors[arrays.faces(i)]))
+                    np.testing.assert_allclose(b.normals[b.faces(k)], arrays.normals[arrays.faces(i)])
+
+        # single cells, and stopping early
+        it = iter_cells(points, limits=L, fields=["volume"], batch=1)
+        self.assertEqual(len(next(it)), 1)
+        it.close()
+        self.assertListEqual(list(iter_cells(np.empty((0, 3)), limits=L)), [])
+
+    def test_batch_tessellate(self):
+        import numpy as np
+        from tess import batch_tessellate
+        rng = np.random.default_rng(0)
+        L = 40
+        frames = [rng.random((200 + 10 * i, 3)) * L for i in range(7)]
+        radii = [rng.random(len(f)) for f in frames]
+        expected = [Container(f, limits=L, radii=r, cells=False).arrays() for f, r in zip(frames, radii)]
+
+        for executor in ["thread", "process"]:
+            for ordered in [True, False]:
+                out = list(batch_tessellate(frames, limits=L, radii=radii, workers=2, executor=executor, chunksize=2, ordered=ordered))
+                if ordered: self.assertListEqual([i for i, _ in out], list(range(len(frames))))
+                else: self.assertListEqual(sorted(i for i, _ in out), list(range(len(frames))))
+                for i, arrays in out:
+                    self.assertListEqual(sorted(vars(arrays)), sorted(vars(expected[i])))
+                    for key, a in vars(expected[i]).items():
+                        np.testing.assert_array_equal(getattr(arrays, key), a)
+
+        # a subset of fields, stopping early and no frames
+        it = batch_tessellate(iter(frames), limits=L, fields=["volume"], workers=2, executor="process")
+        i, arrays = next(it)
+        np.testing.assert_allclose(arrays.volume, Container(frames[0], limits=L, cells=False).arrays(["volume"]).volume)
+        it.close()
+        self.assertListEqual(list(batch_tessellate([], limits=L)), [])
+        with assertException(ValueError):
+            next(batch_tessellate(frames, limits=L, executor="cluster"))
+
+        # the shared memory blocks are released by this process only, the workers do not report leaks at exit
+        import subprocess, sys
+        script = ("import numpy as np; from tess import batch_tessellate; "
+                  "frames = [np.random.default_rng(0).random((50, 3)) for _ in range(6)]; "
+                  "print(len(list(batch_tessellate(frames, workers=2, executor='process'))))")
+        run = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+        self.assertEqual(run.stdout.strip(), "6")
+        self.assertNotIn("resource_tracker", run.stderr)
+
+    def test_from_file(self):
+        import os, tempfile
+        import numpy as np
+        rng = np.random.default_rng(0)
+        L = 40
+        points = rng.random((200, 3)) * L
+        points[0] = (L + 1, 0, 0)
+        # ON the upper limit, skipped by the same pre-filter in every format
+        points[1] = (L, 5, 5)
+        radii = rng.random(200)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for rows in [ points, np.c_[points, radii] ]:
+                cont = Container(rows[:, :3], limits=L, radii=rows[:, 3] if rows.shape[1] == 4 else None)
+
+                # voro++ import format, the first column are the particle ids
+                path = os.path.join(tmp, "points.dat")
+                np.savetxt(path, np.c_[np.arange(len(rows)) + 100, rows], fmt=["%d"] + ["%.17g"] * rows.shape[1])
+                text = Container.from_file(path, limits=L)
+                self.assertListEqual(list(text.source_ids), list(text.source_idx + 100))
+
+                np.save(os.path.join(tmp, "points.npy"), rows)
+                npy = Container.from_file(os.path.join(tmp, "points.npy"), limits=L, format="npy")
+                rows.tofile(os.path.join(tmp, "points.raw"))
+                raw = Container.from_file(os.path.join(tmp, "points.raw"), limits=L, format="raw", columns=rows.shape[1])
+
+                self.assertListEqual(list(cont.source_mask[:2]), [False, False])
+                for other in [ text, npy, raw ]:
+                    self.assertListEqual(list(other.source_mask), list(cont.source_mask))
+                    self.assertListEqual(list(other.source_idx), list(cont.source_idx))
+                    self.assertListAlmostEqual([c.volume() for c in other], [c.volume() for c in cont])
+                    self.assertListAlmostEqual([c.radius for c in other], [c.radius for c in cont])
+
+            # the radii are detected from the first non-blank row
+            with open(path, "w") as f:
+                f.write("\n  \n0 1 2 3 0.5\n\n1 3 2 1 0.25\n")
+            text = Container.from_file(path, limits=L)
+            self.assertListEqual([c.radius for c in text], [0.5, 0.25])
+
+            # rows that are not particles, have other columns or are too long are rejected
+            for content in [ "0 1 2 3\n1 1 a 3\n", "0 1 2 3\n1 1 2 3 0.5\n", "0 1 2 3 0.5\n1 1 2 3\n",
+                             "0 1 2\n1 1 2\n", "0 1 2 3\n1 1 2 3" + " " * 2000 + "\n2 1 2 3\n" ]:
+                with open(path, "w") as f:
+                    f.write(content)
+                with assertException(ValueError):
+                    Container.from_file(path, limits=L)
+            with assertException(ValueError):
+                Container.from_file(path, limits=L, format="csv")
+
+    def test_to_mesh(self):
+        import numpy as np
+        rng = np.random.default_rng(0)
+        L = 40
+        points = rng.random((200, 3)) * L
+
+        for cont in [ Container(points, limits=L, threads=2), Container(points, limits=L, radii=rng.random(200), periodic=True) ]:
+            vertices, triangles, cells, neighbors = cont.to_mesh()
+            arrays = cont.arrays()
+            self.assertEqual(len(vertices), sum(len(c.vertices()) for c in cont))
+
+            # the triangles cover the faces of each cell, with outward normals
+            cross = np.cross(vertices[triangles[:, 1]] - vertices[triangles[:, 0]],
+                             vertices[triangles[:, 2]] - vertices[triangles[:, 0]])
+            areas = np.linalg.norm(cross, axis=1) / 2
+            np.testing.assert_allclose(np.bincount(cells, areas, minlength=len(cont)), arrays.surface_area)
+            centers = vertices[triangles].mean(axis=1)
+            assert (np.einsum("ij,ij->i", cross, centers - arrays.pos[cells]) > 0).all()
+            for i, cell in enumerate(cont):
+                self.assertSetEqual(set(neighbors[cells == i]), set(cell.neighbors()))
+
+            # the welded vertices are shared between the cells
+            welded, welded_triangles, welded_cells, _ = cont.to_mesh(weld=True)
+            self.assertLess(len(welded), len(vertices) / 2)
+            np.testing.assert_allclose(welded[welded_triangles], vertices[triangles], atol=1e-6)
+            self.assertListEqual(list(welded_cells), list(cells))
+
+    def test_neighbor_graph(self):
+        import numpy as np
+        rng = np.random.default_rng(0)
+        L = 40
+        points = rng.random((200, 3)) * L
+        points[0] = (L + 1, 0, 0)
+
+        for kwargs in [ dict(), dict(periodic=True) ]:
+            cont = Container(points, limits=L, **kwargs)
+
+            # rows by source index, the skipped point has an empty one
+            indptr, indices, areas = cont.neighbor_graph()
+            self.assertEqual(len(indptr), len(points) + 1)
+            for i, cell in enumerate(cont):
+                s = cont.source_idx[i]
+                faces = [ (cont.source_idx[n], a) for n, a in zip(cell.neighbors(), cell.face_areas()) if n >= 0 ]
+                self.assertListEqual(list(indices[indptr[s]:indptr[s+1]]), [ n for n, _ in faces ])
+                self.assertListAlmostEqual(areas[indptr[s]:indptr[s+1]], [ a for _, a in faces ])
+            self.assertEqual(indptr[1] == indptr[0], not cont.source_mask[0])
+            matrix = cont.neighbor_graph(sparse=True)
+            self.assertEqual(matrix.shape, (len(points), len(points)))
+            np.testing.assert_allclose(matrix.data, areas)
+
+            # distances between the closest images
+            _, _, distances = cont.neighbor_graph("distance")
+            rows = np.repeat(np.arange(len(points)), np.diff(indptr))
+            d = points[indices] - points[rows]
+            if cont.periodic[0]:
+                d -= L * np.round(d / L)
+            np.testing.assert_allclose(distances, np.linalg.norm(d, axis=1))
+
+            # the walls go after the particles
+            indptr_walls, indices_walls, ones = cont.neighbor_graph("none", include_walls=True)
+            self.assertEqual(len(indices_walls), sum(c.number_of_faces() for c in cont))
+            self.assertListEqual(sorted(set(indices_walls[indices_walls >= len(points)])),
+                                 [] if cont.periodic[0] else [ len(points) + k for k in range(6) ])
+            assert (ones == 1).all()
+
+        with assertException(ValueError):
+            cont.neighbor_graph("volume")
+
+    def test_write_custom(self):
+        import gzip, io, os, tempfile
+        import numpy as np
+        rng = np.random.default_rng(0)
+        L = 40
+        points = rng.random((100, 3)) * L
+
+        for cont in [ Container(points, limits=L), Container(points, limits=L, radii=rng.random(100), periodic=True),
+                      PeriodicContainer(points, box=L) ]:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "cells.txt")
+                cont.write_custom(path, "%i %v %s %n")
+                with open(path) as f:
+                    lines = f.read().splitlines()
+
+                # a line per cell, in computation order
+                self.assertEqual(len(lines), len(cont))
+                for line in lines:
+                    i, volume, n_faces, *neighbors = line.split()
+                    cell = cont[int(i)]
+                    self.assertAlmostEqual(float(volume), cell.volume(), delta=1e-5 * cell.volume())
+                    self.assertEqual(int(n_faces), cell.number_of_faces())
+                    self.assertListEqual([int(n) for n in neighbors], cell.neighbors())
+
+                # compressed by the suffix, or to file objects
+                cont.write_custom(path + ".gz", "%i %v %s %n")
+                with gzip.open(path + ".gz", "rt") as f:
+                    self.assertListEqual(f.read().splitlines(), lines)
+                for file, compress in [ (io.BytesIO(), False), (io.BytesIO(), True) ]:
+                    cont.write_custom(file, "%i %v %s %n", compress=compress)
+                    data = file.getvalue()
+                    self.assertListEqual((gzip.decompress(data) if compress else data).decode().splitlines(), lines)
+
+                # text streams, with a binary buffer or in memory
+                with open(path, "w") as f:
+                    cont.write_custom(f, "%i %v %s %n")
+                with open(path) as f:
+                    self.assertListEqual(f.read().splitlines(), lines)
+                file = io.StringIO()
+                cont.write_custom(file, "%i %v %s %n")
+                self.assertListEqual(file.getvalue().splitlines(), lines)
+                with assertException(ValueError):
+                    cont.write_custom(io.StringIO(), compress=True)
+
+                # the same output by source index, when no point was skipped
+                file = io.StringIO()
+                cont.write_custom(file, "%i %q %r %v %s %n", source=True)
+                other = io.StringIO()
+                cont.write_custom(other, "%i %q %r %v %s %n")
+                self.assertListEqual(file.getvalue().splitlines(), other.getvalue().splitlines())
+
+        # with skipped points, the source ids match the source_id and neighbors of the cells
+        points[:10] += L
+        for cont in [ Container(points, limits=L), Container(points, limits=L, radii=rng.random(100)) ]:
+            self.assertEqual(cont.source_skipped, 10)
+            file = io.StringIO()
+            cont.write_custom(file, "%i %n", source=True)
+            cells = {cell.source_id: cell for cell in cont}
+            lines = file.getvalue().splitlines()
+            self.assertEqual(len(lines), len(cells))
+            for line in lines:
+                i, *neighbors = map(int, line.split())
+                self.assertListEqual(neighbors, cells[i].neighbors(source=True))
+
+    def test_compact(self):
+        rng = np.random.default_rng(0)
+        L = 40
+        points = rng.random((300, 3)) * L
+        radii = rng.random(300)
+
+        for kwargs in [ dict(), dict(radii=radii), dict(threads=3), dict(periodic=True, threads=2) ]:
+            full = Container(points, limits=L, **kwargs)
+            cont = Container(points, limits=L, compact=True, **kwargs)
+            self.assertTrue(cont.compact)
+            for a, b in zip(full, cont):
+                self.assertAlmostEqual(a.volume(), b.volume())
+                self.assertListEqual(a.neighbors(), b.neighbors())
+                self.assertListEqual(a.face_vertices(), b.face_vertices())
+                np.testing.assert_allclose(a.vertices(), b.vertices())
+
+            # compacted cells are cut like the full ones
+            for a, b in zip(full[:50], cont[:50]):
+                for c in (a, b):
+                    c.cut_plane(0.3, 0.2, 0.1, 0.2, -77)
+                    c.cut_plane_particle(0.5, -0.5, 0.5)
+                self.assertAlmostEqual(a.volume(), b.volume())
+                self.assertListEqual(a.neighbors(), b.neighbors())
+
+        # recomputed cells
+        moved = points.copy()
+        moved[:20] = np.clip(moved[:20] + 0.5, 0, L - 1e-3)
+        full, cont = Container(points, limits=L), Container(points, limits=L, compact=True)
+        full.update(moved)
+        cont.update(moved)
+        for a, b in zip(full, cont):
+            self.assertAlmostEqual(a.volume(), b.volume())
+            self.assertListEqual(a.neighbors(), b.neighbors())
+
+        cont = PeriodicContainer(points, box=L, compact=True)
+        for a, b in zip(PeriodicContainer(points, box=L), cont):
+            self.assertAlmostEqual(a.volume(), b.volume())
+            self.assertListEqual(a.neighbors(), b.neighbors())
+
+    def test_cell_pool(self):
+        import gc
+        from tess import cell_pool
+        rng = np.random.default_rng(0)
+        L = 40
+        points = rng.random((1000, 3)) * L
+        cont = Container(points, limits=L, cells=False)
+        previous = cell_pool(2000)
+        try:
+            # freed compacted cells go to the pool, and are taken back by the next ones
+            pooled = cell_pool()[0]
+            cells = cont._container.get_cells(1, True)
+            self.assertEqual(cell_pool()[0], max(pooled - len(cells), 0))
+            del cells
+            gc.collect()
+            pooled = cell_pool()[0]
+            self.assertGreaterEqual(pooled, len(cont.source_idx))
+
+            # the maximum trims the pool
+            self.assertEqual(cell_pool(500), (pooled, 2000))
+            self.assertEqual(cell_pool(), (500, 500))
+            Container(points, limits=L, compact=True, threads=2)
+            self.assertEqual(cell_pool()[0], 500)
+
+            # pooled cells are reused compacted, cutting them grows the memory back silently
+            cells = cont._container.get_cells(1, True)
+            self.capfd.readouterr()
+            for cell in cells[:50]:
+                for k in range(1, 9):
+                    cell.cut_plane(np.cos(k), np.sin(k), 0.3, 0.16, -k)
+                cell.cut_plane_particle(0.5, -0.5, 0.5)
+            self.assertNothingPrinted()
+            del cells
+
+            # pooled cells are the same as the unpooled ones
+            cell_pool(2000)
+            for full, pooled in zip(cont._container.get_cells(1, False), cont._container.get_cells(1, True)):
+                self.assertAlmostEqual(full.volume(), pooled.volume())
+                self.assertListEqual(full.neighbors(), pooled.neighbors())
+                self.assertListEqual(full.face_vertices(), pooled.face_vertices())
+                np.testing.assert_allclose(full.vertices(), pooled.vertices())
+        finally:
+            cell_pool(previous[1])
+
+    def test_threads(self):
+        import numpy as np
+        rng = np.random.default_rng(1)
+        L = 40
+        points = rng.random((200, 3)) * L
+        radii = rng.random(200)
+
+        for kwargs in [ dict(periodic=True), dict(radii=radii) ]:
+            cont1 = Container(points, limits=L, blocks=4, **kwargs)
+            cont3 = Container(points, limits=L, threads=3, blocks=4, **kwargs)
+            self.assertEqual(len(cont1), len(cont3))
+            for c1, c3 in zip(cont1, cont3):
+                self.assertEqual(c1.id, c3.id)
+                self.assertEqual(c1.pos, c3.pos)
+                self.assertEqual(c1.radius, c3.radius)
+                self.assertAlmostEqual(c1.volume(), c3.volume())
+                self.assertListEqual(c1.neighbors(), c3.neighbors())
+
+            arrays1 = cont1.arrays()
+            arrays3 = cont3.arrays()
+            for key in ["computed", "pos", "volume", "centroid", "face_indptr", "neighbors", "face_areas"]:
+                np.testing.assert_allclose(getattr(arrays1, key), getattr(arrays3, key))
+
+    def test_blocks_auto(self):
+        rng = np.random.default_rng(2)
+        L = 40
+        uniform = rng.random((400, 3)) * L
+        clustered = rng.random((400, 3)) * L / 4
+
+        # uniform points keep the voro++ guess, clustered ones get a finer grid
+        cont = Container(uniform, limits=L, blocks="auto")
+        self.assertEqual(cont.blocks, (5, 5, 5))
+        cont_clustered = Container(clustered, limits=L, blocks="auto")
+        assert all(b > 5 for b in cont_clustered.blocks)
+        assert cont_clustered.init_mem >= 8
+
+        # same cells in any case (up to the absolute tolerance of voro++ cuts)
+        for points in (uniform, clustered):
+            auto = Container(points, limits=L, periodic=True, blocks="auto").arrays(fields=["volume"])
+            default = Container(points, limits=L, periodic=True).arrays(fields=["volume"])
+            np.testing.assert_allclose(auto.volume, default.volume, rtol=1e-4)
+
+        with assertException(AssertionError):
+            Container(uniform, limits=L, blocks="unknown")
+
+    def test_update(self):
+        rng = np.random.default_rng(3)
+        L = 40
+        points = rng.random((200, 3)) * L
+        radii = rng.random(200)
+        moved = points.copy()
+        moved[:5] = (moved[:5] + rng.normal(scale=3, size=(5, 3))) % L
+
+        for kwargs in [ dict(periodic=True), dict(radii=radii), dict(cache=True) ]:
+            cont = Container(points, limits=L, **kwargs)
+            cells = list(cont)
+            self.assertEqual(cont.update(points), 0)
+
+            # only the moved cells and their neighbors are recomputed, in place
+            recomputed = cont.update(moved)
+            assert 5 < recomputed < 100
+            assert all(c1 is c2 for c1, c2 in zip(cells, cont))
+
+            fresh = Container(moved, limits=L, **kwargs)
+            for c1, c2 in zip(cont, fresh):
+                self.assertListAlmostEqual(c1.pos, c2.pos)
+                self.assertAlmostEqual(c1.volume(), c2.volume())
+                self.assertListEqual(sorted(c1.neighbors()), sorted(c2.neighbors()))
+
+        # radii can change too, points can not leave the container
+        cont = Container(points, limits=L, radii=radii)
+        cont.update(points, radii=radii * 2)
+        self.assertAlmostEqual(cont[0].radius, radii[0] * 2)
+        with assertException(AssertionError):
+            cont.update(points + L)
+
+        # a rejected update leaves the container unchanged, even with a point ON the upper limit
+        for kwargs in [ dict(), dict(radii=radii) ]:
+            cont = Container(points, limits=L, **kwargs)
+            volumes = [c.volume() for c in cont]
+            rejected = moved.copy()
+            rejected[150] = (L, 20, 20)
+            with assertException(AssertionError):
+                cont.update(rejected)
+            self.assertListAlmostEqual([c.volume() for c in cont], volumes)
+            self.assertListAlmostEqual(cont.arrays(fields=["volume"]).volume, volumes)
+            self.assertListAlmostEqual(cont.arrays().pos.ravel(), points.ravel())
+
+    def test_cells_in_region(self):
+        rng = np.random.default_rng(4)
+        L = 40
+        points = rng.random((300, 3)) * L
+        radii = rng.random(300)
+
+        for kwargs in [ dict(), dict(periodic=True), dict(radii=radii, periodic=(True, False, False)) ]:
+            full = Container(points, limits=L, **kwargs)
+            lazy = Container(points, limits=L, cells=False, **kwargs)
+            for region in [ dict(sphere=(1, 2, 3, 12)), dict(box=((-5, 10, 30), (15, 20, 45))) ]:
+                cells = lazy.cells_in_region(**region)
+                stored = full.cells_in_region(**region)
+                assert 0 < len(cells) < len(full)
+                self.assertListEqual([c.id for c in cells], [c.id for c in stored])
+                for c in cells:
+                    assert c is not full[c.id]
+                    self.assertAlmostEqual(c.volume(), full[c.id].volume())
+                    self.assertListEqual(c.neighbors(), full[c.id].neighbors())
+                assert all(c is full[c.id] for c in stored)
+
+        # periodic regions wrap around
+        cont = Container([[1, 1, 1], [39, 39, 39], [20, 20, 20]], limits=L, periodic=True)
+        self.assertListEqual([c.id for c in cont.cells_in_region(sphere=(0, 0, 0, 2))], [0, 1])
+        cont = Container([[1, 1, 1], [39, 39, 39], [20, 20, 20]], limits=L)
+        self.assertListEqual([c.id for c in cont.cells_in_region(sphere=(0, 0, 0, 2))], [0])
+
+        with assertException(AssertionError):
+            cont.cells_in_region()
+
+    def test_locate(self):
+        rng = np.random.default_rng(5)
+        L = 40
+        # some points are skipped, so the source indices differ from the container ids
+        points = rng.random((300, 3)) * L * 1.1
+        radii = rng.random(300) * 2
+        probes = rng.random((500, 3)) * L
+
+        for kwargs in [ dict(), dict(periodic=True), dict(radii=radii) ]:
+            cont = Container(points, limits=L, **kwargs)
+            owners = cont.locate(probes)
+            inserted = cont.source_idx
+            d2 = ((probes[:, None, :] - points[inserted][None, :, :]) ** 2).sum(-1)
+            if "periodic" in kwargs:
+                d = np.abs(probes[:, None, :] - points[inserted][None, :, :])
+                d2 = (np.minimum(d, L - d) ** 2).sum(-1)
+            if "radii" in kwargs:
+                d2 -= radii[inserted][None, :] ** 2
+            np.testing.assert_array_equal(owners, inserted[d2.argmin(axis=1)])
+
+        # periodic wrap, and outside points
+        cont = Container([[1, 1, 1], [39, 39, 39]], limits=L, periodic=True)
+        self.assertListEqual(cont.locate([[41, 41, 41], [-1.5, -1.5, -1.5]]).tolist(), [0, 1])
+        cont = Container([[1, 1, 1], [39, 39, 39]], limits=L)
+        self.assertListEqual(cont.locate([[41, 41, 41], [-1, 0, 0]]).tolist(), [-1, -1])
+
+    def test_ghost_cells(self):
+        rng = np.random.default_rng(6)
+        L = 40
+        points = rng.random((200, 3)) * L
+        radii = rng.random(200)
+        probes = np.concatenate([rng.random((20, 3)) * L, [[L + 1, 1, 1]]])
+        probe_radii = rng.random(21)
+
+        for kwargs, probe_kwargs in [ (dict(), dict()), (dict(periodic=True), dict()), (dict(radii=radii), dict(radii=probe_radii)) ]:
+            cont = Container(points, limits=L, cells=False, **kwargs)
+            volumes = cont.arrays(fields=["volume"]).volume
+            ghosts = cont.ghost_cells(probes, fields=CELL_FIELDS + FACE_FIELDS, **probe_kwargs)
+            self.assertEqual(len(ghosts), len(probes))
+
+            # same as a container with the particle added, which is left untouched
+            for i, probe in enumerate(probes):
+                extended = dict(kwargs)
+                if "radii" in kwargs:
+                    extended["radii"] = np.append(radii, probe_radii[i])
+                with_probe = Container(np.vstack([points, probe]), limits=L, **extended)
+                if len(with_probe) == len(points):
+                    assert not ghosts.computed[i]
+                    continue
+                assert ghosts.computed[i]
+                cell = with_probe[-1]
+                self.assertAlmostEqual(ghosts.volume[i], cell.volume())
+                self.assertEqual(ghosts.n_faces[i], cell.number_of_faces())
+                self.assertListEqual(ghosts.neighbors[ghosts.faces(i)].tolist(), cell.neighbors())
+            np.testing.assert_array_equal(cont.arrays(fields=["volume"]).volume, volumes)
+
+        # the outside probe is only computed in the periodic container
+        assert not ghosts.computed[-1]
+
     def test_wall_basic(self):
         # atm the walls must be defined before constructing the container
         walls = [ (0,1,0, 0.25) ]
@@ -747,7 +1451,8 @@ class TestContainer(TestCase_ext, TestCase_container):
         def _gen_cont_cell(walls):
             cont = self.get_cubic_cont(walls=walls)
             cell = cont[0]
-            self.assertAlmostEqual(cell.volume(), 0.75)
+            # a plane closer to a face than the voro++ tolerance (1e-2 in this fork) relabels it without moving it
+            self.assertAlmostEqual(cell.volume(), 0.75, delta=1e-5)
             return cont, cell
 
         # the wall id should be the one from the closer plane
@@ -763,25 +1468,29 @@ class TestContainer(TestCase_ext, TestCase_container):
         # the wall id should be the one from the closer plane
         assert -10 in cell.neighbors()
 
-        # precision can be edited
-        Container.custom_walls_precision = 6
-        cont, cell = _gen_cont_cell([ (0,1,0, 0.250005), (0,1,0, 0.25) ])
-        self.assertEqual(len(cont.walls), 2)
-        self.assertEqual(cont.walls_source_skipped, 0)
-        assert -11 in cell.neighbors()
-
-        # precision can be unbounded
-        Container.custom_walls_precision = 0
-        cont, cell = _gen_cont_cell([ (0,1,0, 0.2500000005), (0,1,0, 0.25) ])
-        self.assertEqual(len(cont.walls), 2)
-        self.assertEqual(cont.walls_source_skipped, 0)
-        assert -11 in cell.neighbors()
-
-        Container.custom_walls_precision = -1
-        cont, cell = _gen_cont_cell([ (0,1,0, 0.2500000005), (0,1,0, 0.25) ])
-        self.assertEqual(len(cont.walls), 2)
-        self.assertEqual(cont.walls_source_skipped, 0)
-        assert -11 in cell.neighbors()
+        precision = Container.custom_walls_precision
+        try:
+            # precision can be edited
+            Container.custom_walls_precision = 6
+            cont, cell = _gen_cont_cell([ (0,1,0, 0.250005), (0,1,0, 0.25) ])
+            self.assertEqual(len(cont.walls), 2)
+            self.assertEqual(cont.walls_source_skipped, 0)
+            assert -11 in cell.neighbors()
+
+            # precision can be unbounded
+            Container.custom_walls_precision = 0
+            cont, cell = _gen_cont_cell([ (0,1,0, 0.2500000005), (0,1,0, 0.25) ])
+            self.assertEqual(len(cont.walls), 2)
+            self.assertEqual(cont.walls_source_skipped, 0)
+            assert -11 in cell.neighbors()
+
+            Container.custom_walls_precision = -1
+            cont, cell = _gen_cont_cell([ (0,1,0, 0.2500000005), (0,1,0, 0.25) ])
+            self.assertEqual(len(cont.walls), 2)
+            self.assertEqual(cont.walls_source_skipped, 0)
+            assert -11 in cell.neighbors()
+        finally:
+            Container.custom_walls_precision = precision
 
     def test_wall_basic_duplicated(self):
         # atm the walls must be defined before constructing the container
@@ -792,6 +1501,50 @@ class TestContainer(TestCase_ext, TestCase_container):
         assert -10 in cell.neighbors()
         self.assertAlmostEqual(cell.volume(), 0.75)
 
+    def test_wall_bulk(self):
+        walls = np.array([ (0,1,0, 0.25), (0,1,0, 0.25), (0,-1,0, 0.25), (0,1,0, 0.25000001) ])
+        cont = self.get_cubic_cont(walls=walls)
+        cell = cont[0]
+        self.assertAlmostEqual(cell.volume(), 0.5)
+
+        # duplicates are skipped, the kept walls get sequential ids
+        self.assertEqual(len(cont.walls), 2)
+        self.assertEqual(cont.walls_source_skipped, 2)
+        self.assertListEqual(cont.walls_cont_idx, [-10, -11])
+        self.assertListEqual(cont.walls_source_idx, [0, 2])
+        self.assertListEqual(sorted(n for n in cell.neighbors() if n <= -10), [-11, -10])
+        self.assertListEqual([cont.get_containerId_wall(n) for n in range(4)], [-10, -10, -11, -10])
+        self.assertEqual(cont.get_vector4D_wall(-11), (0, -1, 0, 0.25))
+
+        # same as a list of tuples
+        cont_list = self.get_cubic_cont(walls=[tuple(w) for w in walls])
+        self.assertListEqual(cont.walls, cont_list.walls)
+        self.assertAlmostEqual(cont_list[0].volume(), 0.5)
+
+    def test_wall_curved(self):
+        # the cell is cut by the plane tangent at the closest point of the wall, here x=-0.25
+        cont = self.get_cubic_cont(walls={"sphere": [(0.25,0,0, 0.5)]})
+        self.assertAlmostEqual(cont[0].volume(), 0.75)
+        self.assertIn(Container.curved_walls_startID["sphere"], cont[0].neighbors())
+
+        # each kind gets its own id range, mixed with the planes
+        walls = {"plane": [(0,1,0, 0.25)], "cylinder": [(0.25,0,0, 0,0,1, 0.5)], "sphere": [(0,0,0.25, 0.5)]}
+        cont = self.get_cubic_cont(walls=walls)
+        self.assertAlmostEqual(cont[0].volume(), 0.75 * 0.75 * 0.75)
+        self.assertListEqual(sorted(n for n in cont[0].neighbors() if n <= -10), [-200000, -100000, -10])
+        self.assertEqual(cont.get_curved_wall(-200000), ("cylinder", (0.25, 0, 0, 0, 0, 1, 0.5)))
+        self.assertEqual(cont.get_vector4D_wall(-10), (0, 1, 0, 0.25))
+
+        # points outside the cone are skipped
+        cont = Container(points=[(0,0,0), (-0.45,0.45,0)], limits=[(-0.5,)*3, (0.5,)*3],
+                         walls={"cone": [(0.25,0,-0.5, 0,0,1, np.pi/4)]})
+        self.assertListEqual(cont.source_mask.tolist(), [True, False])
+        self.assertLess(cont[0].volume(), 1)
+        self.assertIn(-300000, cont[0].neighbors())
+
+        with assertException(ValueError):
+            self.get_cubic_cont(walls={"torus": [(0,0,0, 1)]})
+
     def test_wall_basic_offcenter(self):
         # atm the walls must be defined before constructing the container
         walls = [ (0,1,0, 0) ]
@@ -908,3 +1661,58 @@ class TestContainer(TestCase_ext, TestCase_container):
         volume = 8 / 3.0
         cell_volume = cell.volume()
         self.assertAlmostEqual(volume, cell_volume)
+
+
+class TestPeriodicContainer(TestCase_ext):
+    def test_rectangular(self):
+        import numpy as np
+        rng = np.random.default_rng(2)
+        L = 40
+        points = rng.random((100, 3)) * L
+
+        # same tessellation as the rectangular periodic container
+        cont = Container(points, limits=L, periodic=True)
+        for box in [ L, (L, L, L), (L, 0, L, 0, 0, L) ]:
+            pcont = PeriodicContainer(points, box=box)
+            self.assertEqual(len(pcont), len(cont))
+            self.assertEqual(pcont.get_limits(), (L, 0, L, 0, 0, L))
+            self.assertListAlmostEqual(sorted(c.volume() for c in pcont), sorted(c.volume() for c in cont))
+
+    def test_sheared(self):
+        import numpy as np
+        n = 4
+        points = np.array([ (i + 0.5, j + 0.5, k + 0.5) for i in range(n) for j in range(n) for k in range(n) ])
+
+        # shearing a cubic lattice by a lattice spacing leaves the same unit cells
+        for box in [ (n, 1, n, 0, 0, n), (n, 1, n, 2, -1, n) ]:
+            for radii in [ None, [0.5] * len(points) ]:
+                cont = PeriodicContainer(points, box=box, radii=radii)
+                self.assertEqual(len(cont), len(points))
+                for cell in cont:
+                    self.assertAlmostEqual(cell.volume(), 1.0)
+                    self.assertEqual(len(cell.neighbors()), 6)
+
+                arrays = cont.arrays()
+                assert arrays.computed.all()
+                self.assertAlmostEqual(arrays.volume.sum(), n**3)
+
+    def test_remapped(self):
+        # points outside the primary domain are remapped
+        cont = PeriodicContainer([ (1, 1, 1), (2, 2, 2), (4, 5, -1) ], box=(3, 1, 3, 0, 0, 3))
+        assert cont.source_mask.all()
+        self.assertAlmostEqual(sum(c.volume() for c in cont), 27)
+
+    def test_unsupported(self):
+        points = [ (1, 1, 1), (2, 2, 2), (4, 5, -1) ]
+        cont = PeriodicContainer(points, box=3, radii=[0.5] * 3, threads=2, cache=True)
+        assert all(c.cache for c in cont)
+        self.assertEqual(cont.threads, 1)
+        self.assertListEqual(cont.inside(points).tolist(), [True] * 3)
+        self.assertEqual(cont.walls, [])
+
+        # the rectilinear-only API raises a clear error instead of an AttributeError
+        for call in [ lambda: cont.add_walls([(1, 0, 0, 1)]), lambda: cont.add_curved_walls("sphere", [(1, 1, 1, 1)]),
+                      lambda: cont.ghost_cells([(1, 2, 1)]), lambda: cont.update(points), lambda: cont.locate(points),
+                      lambda: cont.cells_in_region(sphere=(1, 1, 1, 1)) ]:
+            with assertException(NotImplementedError):
+                call()